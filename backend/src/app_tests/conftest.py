@@ -1,15 +1,42 @@
 import pytest
 import tempfile
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from config.celery import app as celery_app
+from stock.models import clear_compiled_conditions, clear_industry_names
 
 @pytest.fixture(scope='session', autouse=True)
 def django_db_setup(django_db_setup):
   pass
 
+@pytest.fixture(scope='session', autouse=True)
+def setup_cache():
+  # Use local memory cache instead of redis
+  caches = {
+    'default': {
+      'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+  }
+
+  with override_settings(CACHES=caches):
+    yield
+
+@pytest.fixture(scope='session', autouse=True)
+def setup_celery():
+  # Execute tasks locally instead of sending them to the broker
+  celery_app.conf.task_always_eager = True
+  yield
+  celery_app.conf.task_always_eager = False
+
 @pytest.fixture(autouse=True)
 def setup_django(settings):
   settings.TIME_ZONE = 'UTC'
   settings.LANGUAGE_CODE = 'en'
+  # Discard the data stored by the other tests
+  cache.clear()
+  clear_compiled_conditions()
+  clear_industry_names()
 
 @pytest.fixture
 def csrf_exempt_django_app(django_app_factory):
@@ -0,0 +1,137 @@
+import pytest
+import gzip
+import json
+from stock import models, catalog
+from app_tests import factories, BaseTestUtils
+
+@pytest.fixture
+def get_stocks(mocker):
+  existing_pks = list(models.Stock.objects.values_list('pk', flat=True))
+  stocks = [factories.StockFactory(code=code, skip_task=False) for code in ['K010', 'K020', 'K030']]
+  _ = [
+    factories.LocalizedStockFactory(stock=stocks[0], name='alpha-en', language_code='en'),
+    factories.LocalizedStockFactory(stock=stocks[0], name='alpha-ja', language_code='ja'),
+    factories.LocalizedStockFactory(stock=stocks[1], name='beta-en', language_code='en'),
+  ]
+  _ = factories.StockFactory(code='K999', skip_task=True)
+  # Exclude the existing stocks to include the ones which are added in each test
+  queryset = models.Stock.objects.exclude(pk__in=existing_pks)
+  mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+  return stocks
+
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestStockCatalog(BaseTestUtils):
+  @pytest.mark.parametrize([
+    'language',
+    'expected',
+  ], [
+    ('en', ['alpha-en', 'beta-en', None]),
+    ('ja', ['alpha-ja', 'beta-en', None]),
+  ], ids=lambda val: str(val))
+  def test_build_catalog(self, get_stocks, language, expected):
+    stock_catalog = catalog.get_catalog(language=language)
+    data = stock_catalog.get_data()
+
+    assert stock_catalog.version == models.get_stock_data_version()
+    assert not data['is_delta']
+    assert [item['pk'] for item in data['qs']] == [obj.pk for obj in get_stocks]
+    assert [item['name'] for item in data['qs']] == expected
+    assert [item['code'] for item in data['qs']] == ['K010', 'K020', 'K030']
+    assert json.loads(stock_catalog.content) == data
+    assert json.loads(gzip.decompress(stock_catalog.compressed_content)) == data
+
+  def test_catalog_is_reused(self, mocker, get_stocks):
+    _ = catalog.get_catalog(language='en')
+    init_mock = mocker.patch('stock.catalog.StockCatalog.__init__')
+    _ = catalog.get_catalog(language='en')
+
+    assert init_mock.call_count == 0
+
+  def test_version_is_kept_without_changes(self, get_stocks):
+    stock_catalog = catalog.get_catalog(language='en')
+    instance = models.Stock.objects.get(pk=get_stocks[0].pk)
+    instance.price = instance.price + 1
+    instance.save()
+    new_catalog = catalog.get_catalog(language='en')
+
+    assert new_catalog.source != stock_catalog.source
+    assert new_catalog.version == stock_catalog.version
+    assert new_catalog.get_etag() == stock_catalog.get_etag()
+
+  def test_get_delta(self, get_stocks):
+    old_catalog = catalog.get_catalog(language='en')
+    since = old_catalog.version
+    # Rename, add, and remove the stocks
+    localized = models.LocalizedStock.objects.get(stock__pk=get_stocks[1].pk, language_code='en')
+    localized.name = 'new-beta-en'
+    localized.save()
+    added = factories.StockFactory(code='K040', skip_task=False)
+    models.Stock.objects.filter(pk=get_stocks[2].pk).update(skip_task=True)
+    models.bump_stock_data_version()
+    new_catalog = catalog.get_catalog(language='en')
+    data = new_catalog.get_data(since=since)
+    content = new_catalog.get_content(since=since)
+
+    assert new_catalog.version > since
+    assert data['is_delta']
+    assert data['version'] == new_catalog.version
+    assert [(item['pk'], item['name']) for item in data['qs']] == [(get_stocks[1].pk, 'new-beta-en'), (added.pk, None)]
+    assert data['removed'] == [get_stocks[2].pk]
+    assert json.loads(content) == data
+    assert new_catalog.get_data(since=new_catalog.version)['qs'] == []
+
+  @pytest.mark.parametrize([
+    'offset',
+    'is_delta',
+  ], [
+    (0, True),
+    (-1, False),
+  ], ids=[
+    'same-as-base-version',
+    'older-than-base-version',
+  ])
+  def test_delta_is_available_only_after_base_version(self, get_stocks, offset, is_delta):
+    stock_catalog = catalog.get_catalog(language='en')
+    data = stock_catalog.get_data(since=stock_catalog.base_version + offset)
+
+    assert data['is_delta'] == is_delta
+    assert len(data['qs']) == (0 if is_delta else len(get_stocks))
+
+  def test_compressed_delta(self, get_stocks):
+    stock_catalog = catalog.get_catalog(language='en')
+    since = stock_catalog.base_version
+    content = stock_catalog.get_content(since=since, is_compressed=True)
+
+    assert json.loads(gzip.decompress(content)) == stock_catalog.get_data(since=since)
+
+  @pytest.mark.parametrize([
+    'since',
+    'is_compressed',
+    'expected',
+  ], [
+    (None, False, '"en-all-{version}"'),
+    (None, True, '"en-all-{version}-gzip"'),
+    (0, False, '"en-all-{version}"'),
+    ('base', False, '"en-{base}-{version}"'),
+  ], ids=[
+    'whole-catalog',
+    'compressed-catalog',
+    'too-old-version',
+    'delta',
+  ])
+  def test_get_etag(self, get_stocks, since, is_compressed, expected):
+    stock_catalog = catalog.get_catalog(language='en')
+    since = stock_catalog.base_version if since == 'base' else since
+    etag = stock_catalog.get_etag(since=since, is_compressed=is_compressed)
+
+    assert etag == expected.format(version=stock_catalog.version, base=stock_catalog.base_version)
+
+  def test_refresh_catalogs(self, get_stocks):
+    count = catalog.refresh_catalogs()
+    languages = [catalog.get_catalog(language=code).language for code in ['en', 'ja']]
+
+    assert count == 2
+    assert languages == ['en', 'ja']
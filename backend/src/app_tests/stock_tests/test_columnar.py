@@ -0,0 +1,207 @@
+import pytest
+from decimal import Decimal
+from stock import models, columnar
+from app_tests import factories, BaseTestUtils
+
+@pytest.fixture(scope='module')
+def columnar_stock_data(django_db_blocker):
+  with django_db_blocker.unblock():
+    industries = [factories.IndustryFactory() for _ in range(3)]
+    _ = [
+      factories.LocalizedIndustryFactory(industry=industries[0], name='foo-bar'),
+      factories.LocalizedIndustryFactory(industry=industries[1], name='foo'),
+      factories.LocalizedIndustryFactory(industry=industries[2], name='hogehoge'),
+    ]
+    stock_params = [
+      {'code': 'C010', 'name': 'sampel1', 'industry': 0, 'price': '1200', 'dividend': '15', 'per': '0.2', 'pbr': '1.3'},
+      {'code': 'C012', 'name': 'alpha01', 'industry': 0, 'price': '800', 'dividend': '5', 'per': '1.3', 'pbr': '2.5'},
+      {'code': 'C033', 'name': 'beta20', 'industry': 1, 'price': '2000', 'dividend': '15.1', 'per': '2.2', 'pbr': '4.3'},
+      {'code': 'C05A', 'name': 'kappa88', 'industry': 1, 'price': '1500', 'dividend': '5.2', 'per': '5.7', 'pbr': '1.3'},
+      {'code': 'C40a', 'name': 'gamma_c', 'industry': 2, 'price': '1000', 'dividend': '9', 'per': '1.7', 'pbr': '0'},
+      {'code': 'C500', 'name': None, 'industry': 2, 'price': '0', 'dividend': '0', 'per': '0', 'pbr': '0.5'},
+    ]
+    stocks = []
+
+    for kwargs in stock_params:
+      stock = factories.StockFactory(
+        code=kwargs['code'], industry=industries[kwargs['industry']], price=Decimal(kwargs['price']),
+        dividend=Decimal(kwargs['dividend']), per=Decimal(kwargs['per']), pbr=Decimal(kwargs['pbr']),
+        skip_task=False,
+      )
+      # Create a stock which does not have its localized name
+      if kwargs['name'] is not None:
+        factories.LocalizedStockFactory(stock=stock, name=kwargs['name'])
+      stocks += [stock]
+    # Give the percentile ranks only to a part of stocks
+    models.Stock.objects.filter(pk__in=[obj.pk for obj in stocks[:3]]).update(price_rank=0.5, per_rank=0.1)
+    # Create a stock which is not screened
+    ignored = factories.StockFactory(code='C999', industry=industries[0], skip_task=True)
+
+  return stocks, ignored
+
+@pytest.fixture(autouse=True)
+def clear_columnar_stores():
+  columnar.clear_stores()
+  yield
+  columnar.clear_stores()
+
+@pytest.fixture
+def get_stocks(mocker, columnar_stock_data):
+  stocks, ignored = columnar_stock_data
+  queryset = models.Stock.objects.filter(pk__in=[obj.pk for obj in stocks + [ignored]])
+  mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+  return stocks
+
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestColumnStore(BaseTestUtils):
+  def test_build_store(self, get_stocks):
+    store = columnar.ColumnStore(version=3)
+    codes = store.columns[models.StockMembers.CODE.value]
+
+    assert store.version == 3
+    assert len(store) == len(get_stocks)
+    assert list(codes) == sorted(codes)
+    assert all([store.index[code] == idx for idx, code in enumerate(codes)])
+    assert store.nulls[models.StockMembers.NAME.value].sum() == 1
+
+  @pytest.mark.parametrize([
+    'condition',
+  ], [
+    ('', ),
+    ('price > 1000', ),
+    ('1000 <= price < 2000', ),
+    ('div_yield > 0.8 and per < 3', ),
+    ('multi_pp == 0 or pbr < 2', ),
+    ('name in "a"', ),
+    ('name not in "a"', ),
+    ('name != "beta20"', ),
+    ('industry_name == "foo"', ),
+    ('code in "0" and (industry_name not in "foo" or price > 1200)', ),
+    ('per < pbr * 2', ),
+    ('dividend / price * 100 > 1', ),
+    ('price / pbr > 500', ),
+    ('name == industry_name or code != name', ),
+    ('code in ["C010", "C05A", "C999"]', ),
+    ('industry_name not in ["foo", "foo-bar"]', ),
+    ('price in [800, 2000] or name in ["gamma_c"]', ),
+    ('price_rank != 0.5', ),
+    ('per_rank not in [0.2, 0.3]', ),
+    ('price_rank != per_rank', ),
+    ('per_vs_industry != 1', ),
+  ], ids=[
+    'no-condition',
+    'single-compare',
+    'multi-compare',
+    'and-operator',
+    'or-operator',
+    'include-name',
+    'not-include-name',
+    'not-equal-name',
+    'equal-industry',
+    'nested-boolop',
+    'compare-fields',
+    'compare-division',
+    'division-by-zero',
+    'compare-str-fields',
+    'code-in-list',
+    'industry-not-in-list',
+    'number-in-list',
+    'not-equal-nullable-field',
+    'not-in-list-of-nullable-field',
+    'not-equal-nullable-fields',
+    'not-equal-annotation',
+  ])
+  @pytest.mark.parametrize([
+    'ordering',
+  ], [
+    (['code'], ),
+    (['-price', 'code'], ),
+    (['-div_yield'], ),
+    (['industry_name', '-name'], ),
+    (['name'], ),
+    (['-name'], ),
+    (['-price_rank', 'name'], ),
+  ], ids=lambda xs: ','.join(xs))
+  def test_same_result_as_database(self, get_stocks, condition, ordering):
+    compiled = models.compile_condition(condition)
+    store = columnar.ColumnStore()
+    estimated = store.select(tree=compiled.tree, ordering=ordering)
+    expected = list(
+      models.Stock.objects.select_targets(condition=compiled.condition).order_by(*ordering, 'code').values_list('pk', flat=True)
+    )
+
+    assert estimated == expected
+
+  def test_string_constant_for_number_field(self, get_stocks):
+    store = columnar.ColumnStore()
+    tree = models.get_tree('price == "800"')
+    pks = store.select(tree=tree)
+
+    assert pks == [get_stocks[1].pk]
+
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestColumnarEngine(BaseTestUtils):
+  @pytest.mark.parametrize([
+    'use_columnar',
+    'has_numpy',
+    'expected',
+  ], [
+    (True, True, True),
+    (True, False, False),
+    (False, True, False),
+  ], ids=[
+    'enabled',
+    'without-numpy',
+    'disabled',
+  ])
+  def test_is_enabled(self, mocker, settings, use_columnar, has_numpy, expected):
+    settings.USE_COLUMNAR_SCREENER = use_columnar
+
+    if not has_numpy:
+      mocker.patch('stock.columnar.np', None)
+
+    assert columnar.is_enabled() == expected
+
+  def test_store_is_reused(self, get_stocks):
+    store_1st = columnar.get_store()
+    store_2nd = columnar.get_store()
+
+    assert store_1st is store_2nd
+
+  def test_store_is_rebuilt_after_update(self, get_stocks):
+    store = columnar.get_store()
+    instance = models.Stock.objects.get(pk=get_stocks[0].pk)
+    instance.price = Decimal('3000')
+    instance.save()
+    new_store = columnar.get_store()
+    compiled = models.compile_condition('price > 2500')
+
+    assert store is not new_store
+    assert new_store.select(tree=compiled.tree) == [instance.pk]
+
+  def test_store_is_rebuilt_after_updating_localized_name(self, get_stocks):
+    store = columnar.get_store()
+    instance = models.LocalizedStock.objects.get(stock__pk=get_stocks[1].pk)
+    instance.name = 'zeta'
+    instance.save()
+    new_store = columnar.get_store()
+    compiled = models.compile_condition('name == "zeta"')
+
+    assert store is not new_store
+    assert new_store.select(tree=compiled.tree) == [get_stocks[1].pk]
+
+  def test_screen(self, get_stocks):
+    compiled = models.compile_condition('price >= 1000')
+    screened = columnar.screen(compiled, ['-price'])
+    records = screened[0:2]
+
+    assert isinstance(screened, models.ScreenedStockList)
+    assert len(screened) == 4
+    assert [obj.code for obj in records] == ['C033', 'C05A']
+    assert records[0].name == 'beta20'
+    assert [obj.code for obj in screened] == ['C033', 'C05A', 'C010', 'C40a']
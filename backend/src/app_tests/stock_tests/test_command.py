@@ -37,6 +37,16 @@ class TestInitProcess(BaseTestUtils):
     assert kwargs.get('pk') == pk
     assert kwargs.get('code') == code
     assert kwargs.get('total') == 123
+    assert 'run_id' not in kwargs
+
+  def test_run_stock_task_with_run_id(self, mocker):
+    instance = DummyStock(2, '1234')
+    func_mock = mocker.patch('stock.management.commands.update_stock_records.apply_async', return_value=None)
+    run_stock_task(1, 1, instance, run_id='abc')
+    _, actual_kwargs = func_mock.call_args
+    kwargs = actual_kwargs['kwargs']
+
+    assert kwargs.get('run_id') == 'abc'
 
 @pytest.mark.stock
 @pytest.mark.django_db
@@ -143,4 +153,107 @@ class TestManualUpdate(BaseTestUtils):
 
     assert func_mock.call_count == 0
     assert 'Error: No valid code has been specified.' in output
-    assert 'All jobs have been started' not in output
\ No newline at end of file
+    assert 'All jobs have been started' not in output
+@pytest.mark.stock
+@pytest.mark.django_db
+class TestBenchmarkScreener(BaseTestUtils):
+  @pytest.fixture(scope='class')
+  def get_dummy_stock_data(self, django_db_blocker):
+    with django_db_blocker.unblock():
+      industry = factories.IndustryFactory()
+      stocks = [
+        factories.StockFactory(code='1001', price=100, industry=industry),
+        factories.StockFactory(code='1002', price=250, industry=industry),
+        factories.StockFactory(code='1003', price=300, industry=industry),
+      ]
+
+    return stocks
+
+  @pytest.fixture
+  def run_process(self, mocker, get_dummy_stock_data):
+    def inner(*args):
+      instances = get_dummy_stock_data
+      queryset = models.Stock.objects.filter(pk__in=self.get_pks(instances))
+      mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+      out = io.StringIO()
+      call_command('benchmark_screener', *args, stdout=out)
+      output = out.getvalue()
+
+      return output
+
+    return inner
+
+  @pytest.mark.parametrize([
+    'args',
+    'count',
+  ], [
+    ([], 3),
+    (['--condition', 'price > 200', '--ordering=-price,code', '--repeat', '2'], 2),
+    (['--condition', 'price > 1000', '--repeat', '0'], 0),
+  ], ids=[
+    'default-arguments',
+    'set-all-arguments',
+    'no-matched-stocks',
+  ])
+  def test_valid_arguments(self, run_process, args, count):
+    output = run_process(*args)
+
+    assert 'Rows in store: 3' in output
+    assert f'SQL:   {count} rows' in output
+    assert f'NumPy: {count} rows' in output
+    assert 'Both engines return the same stocks' in output
+
+  def test_different_results(self, mocker, run_process):
+    mocker.patch('stock.columnar.ColumnStore.select', return_value=[])
+    output = run_process('--condition', 'price > 200')
+
+    assert 'Warning: The screened stocks are different between the engines.' in output
+
+  @pytest.mark.parametrize([
+    'args',
+    'err_msg',
+  ], [
+    (['--condition', 'price in 200'], 'Invalid operator'),
+    (['--condition', 'hoge > 200'], 'Invalid variable'),
+    (['--ordering', 'hoge'], 'Invalid data'),
+  ], ids=[
+    'invalid-operator',
+    'invalid-variable',
+    'invalid-ordering',
+  ])
+  def test_invalid_arguments(self, run_process, args, err_msg):
+    with pytest.raises(CommandError) as ex:
+      run_process(*args)
+
+    assert err_msg in str(ex.value)
+
+  def test_numpy_is_not_installed(self, mocker, run_process):
+    mocker.patch('stock.columnar.np', None)
+
+    with pytest.raises(CommandError) as ex:
+      run_process()
+
+    assert 'Error: numpy is not installed.' in str(ex.value)
+
+@pytest.mark.stock
+class TestBenchmarkValidator:
+  @pytest.mark.parametrize([
+    'args',
+    'length',
+  ], [
+    (['--conditions', '2', '--repeat', '1'], 1024),
+    (['--length', '128', '--conditions', '3', '--repeat', '0', '--seed', '3'], 128),
+  ], ids=[
+    'default-length',
+    'set-all-arguments',
+  ])
+  def test_valid_arguments(self, args, length):
+    out = io.StringIO()
+    call_command('benchmark_validator', *args, stdout=out)
+    output = out.getvalue()
+    average = int(output.split('(')[1].split()[0])
+
+    assert 'Legacy:' in output
+    assert 'Precompiled:' in output
+    assert 'Speedup: x' in output
+    assert length - 64 < average <= length
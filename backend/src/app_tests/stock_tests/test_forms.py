@@ -6,9 +6,11 @@ import sys
 from functools import wraps
 from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
 from django.db.utils import IntegrityError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django_celery_beat.models import PeriodicTask
-from stock import forms, models
+from stock import forms, models, columnar
 from app_tests import factories, get_date, BaseTestUtils
 
 UserModel = get_user_model()
@@ -1029,7 +1031,7 @@ class TestStockSearchForm(BaseTestUtils):
     ({}, [0, 2, 4, 1, 3], True),
     ({'condition': ''}, [0, 2, 4, 1, 3], True),
     ({'ordering': ''}, [0, 2, 4, 1, 3], True),
-    ({'condition': 'price + 100 < 5000', 'ordering': 'price'}, [0, 1, 2, 3, 4], False),
+    ({'condition': 'price ** 2 < 5000', 'ordering': 'price'}, [0, 1, 2, 3, 4], False),
   ], ids=[
     'set-condition-and-order',
     'set-condition',
@@ -1053,6 +1055,52 @@ class TestStockSearchForm(BaseTestUtils):
     assert len(expected) == qs.count()
     assert all([record.pk == exact.pk for record, exact in zip(qs, expected)])
 
+  @pytest.mark.parametrize([
+    'params',
+    'indices',
+  ], [
+    ({'condition': 'price < 500', 'ordering': 'price'}, [0, 1, 2]),
+    ({'condition': 'price < 500', 'ordering': '-price'}, [2, 1, 0]),
+    ({'condition': 'price < 500 and code == "600"'}, [1]),
+    ({}, [0, 2, 4, 1, 3]),
+    ({'condition': 'price ** 2 < 5000', 'ordering': 'price'}, [0, 1, 2, 3, 4]),
+  ], ids=[
+    'set-condition-and-order',
+    'set-condition-and-desc-order',
+    'set-multi-conditions',
+    'set-no-fields',
+    'invalid-condition',
+  ])
+  def test_get_queryset_with_columnar_engine(self, get_pseudo_stocks, mocker, settings, params, indices):
+    settings.USE_COLUMNAR_SCREENER = True
+    columnar.clear_stores()
+    stocks = get_pseudo_stocks
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    form = forms.StockSearchForm(data=params)
+    qs = form.get_queryset_with_condition()
+    expected = [stocks[idx] for idx in indices]
+    columnar.clear_stores()
+
+    assert qs.count() == len(expected)
+    assert [record.pk for record in qs] == self.get_pks(expected)
+
+  def test_get_queryset_from_shared_cache(self, get_pseudo_stocks, mocker):
+    stocks = get_pseudo_stocks
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    # Store the result of the other view in advance
+    pks = models.get_screened_pks('price < 500', [models.StockOrderingTypes.CODE_ASC], loader=lambda condition, ordering: self.get_pks(stocks[1:3]))
+    form = forms.StockSearchForm(data={'condition': 'price < 500'})
+    qs = form.get_queryset_with_condition()
+
+    with CaptureQueriesContext(connection) as ctx:
+      outputs = [record.pk for record in qs]
+
+    assert outputs == sorted(pks, key=lambda pk: models.Stock.objects.get(pk=pk).code)
+    assert len(ctx.captured_queries) == 1
+    assert 'price' not in ctx.captured_queries[0]['sql'].split('WHERE')[1]
+
 # ===========================
 # PurchasedStockFilteringForm
 # ===========================
@@ -1158,7 +1206,7 @@ class TestPurchasedStockFilteringForm(BaseTestUtils):
     ({'condition': 'count == 1\n and\n diff < 0'}, [1, 3], True),
     ({}, [1, 4, 0, 3, 2], True),
     ({'condition': ''}, [1, 4, 0, 3, 2], True),
-    ({'condition': 'price + 100 < 5000'}, [1, 4, 0, 3, 2], False),
+    ({'condition': 'price ** 2 < 5000'}, [1, 4, 0, 3, 2], False),
   ], ids=[
     'set-condition-with-single-match',
     'set-condition-with-multiple-matches',
@@ -1293,6 +1341,7 @@ class TestStockDownloadForm:
   ])
   def test_check_create_response_kwargs(self, mocker, params, arg_fname, arg_tree, arg_order):
     kwargs_mock = mocker.patch('stock.models.Stock.create_response_kwargs', return_value={})
+    mocker.patch('stock.models.get_screened_pks', return_value=[])
     form = forms.StockDownloadForm(data=params)
     is_valid = form.is_valid()
     _ = form.create_response_kwargs()
@@ -1318,6 +1367,7 @@ class TestStockDownloadForm:
   ])
   def test_specific_patterns_in_create_response_kwargs(self, mocker, params, expected_fname):
     kwargs_mock = mocker.patch('stock.models.Stock.create_response_kwargs', return_value={})
+    mocker.patch('stock.models.get_screened_pks', return_value=[])
     form = forms.StockDownloadForm(data=params)
     is_valid = form.is_valid()
     _ = form.create_response_kwargs()
@@ -1328,6 +1378,42 @@ class TestStockDownloadForm:
     assert tree is None
     assert order == [models.StockOrderingTypes.CODE_ASC.value]
 
+  @pytest.mark.parametrize([
+    'condition',
+    'ordering',
+    'is_refreshed',
+    'use_result',
+  ], [
+    ('price > 1000', '-code', True, True),
+    ('price > 1000\n', '-code', True, True),
+    ('price > 1000', '-code', False, False),
+    ('price > 2000', '-code', True, False),
+    ('price > 1000', 'code', True, False),
+  ], ids=[
+    'same-parameters',
+    'same-condition-with-newline',
+    'not-refreshed',
+    'different-condition',
+    'different-ordering',
+  ])
+  @pytest.mark.django_db
+  def test_stored_result_in_create_response_kwargs(self, mocker, condition, ordering, is_refreshed, use_result):
+    kwargs_mock = mocker.patch('stock.models.Stock.create_response_kwargs', return_value={})
+    mocker.patch('stock.models.get_screened_pks', return_value=[5, 4])
+    screener = factories.StockScreenerFactory(condition='price > 1000', ordering='-code')
+
+    if is_refreshed:
+      screener.update_result([3, 1, 2])
+      screener.save()
+    params = {'filename': 'hoge', 'condition': condition, 'ordering': ordering, 'screener': screener.pk}
+    form = forms.StockDownloadForm(data=params)
+    is_valid = form.is_valid()
+    _ = form.create_response_kwargs()
+    _, kwargs = kwargs_mock.call_args
+
+    assert is_valid
+    assert kwargs['pks'] == ([3, 1, 2] if use_result else [5, 4])
+
 # =================
 # StockScreenerForm
 # =================
@@ -1379,6 +1465,8 @@ class TestStockScreenerForm:
     ({'title': 'hoge', 'priority': -1, 'condition': 'price < 1000', 'ordering': '-price'}, False),
     ({'title': 'hoge', 'priority':  1, 'condition': 'price < 1000', 'ordering': 'code-price'}, False),
     ({'title': 'hoge', 'priority':  1, 'condition': 'price < 1000', 'ordering': 'hogehoge'}, False),
+    ({'title': 'hoge', 'priority':  1, 'top_n': 10, 'condition': 'price < 1000', 'ordering': 'code'}, True),
+    ({'title': 'hoge', 'priority':  1, 'top_n': -1, 'condition': 'price < 1000', 'ordering': 'code'}, False),
   ], ids=[
     'normal-input',
     'normal-input-with-multiple-orderings',
@@ -1392,9 +1480,12 @@ class TestStockScreenerForm:
     'has-priority-error',
     'has-ordering-error',
     'include-invalid-ordering',
+    'top-n-is-set',
+    'has-top-n-error',
   ])
   def test_check_stock_screener_form(self, get_user, params, is_valid):
     user = get_user
     form = forms.StockScreenerForm(user=user, data=params)
 
-    assert form.is_valid() == is_valid
\ No newline at end of file
+    assert form.is_valid() == is_valid
+    assert not is_valid or form.cleaned_data['top_n'] == params.get('top_n', 0)
\ No newline at end of file
@@ -4,15 +4,20 @@ import json
 import re
 import urllib.parse
 import itertools
-from django.db.models import Q
+from django.db import connection
+from django.db.models import Q, IntegerField
+from django.db.models.functions import Cast
 from django.db.utils import IntegrityError, DataError
+from django.test.utils import CaptureQueriesContext
 from django.core.validators import ValidationError
 from django.utils import timezone as djangoTimeZone
+from django.utils import translation
 from django.utils.safestring import mark_safe
 from django.contrib.auth import get_user_model
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from decimal import Decimal
+from utils.models import bump_data_version
 from stock import models
 from app_tests import factories, get_date, BaseTestUtils
 
@@ -497,6 +502,7 @@ class TestValidateCondition:
     ('er == 10.0', ), ('er != 10.0', ), ('er < 10.0', ), ('er <= 10.0', ), ('er > 10.0', ), ('er >= 10.0', ),
     ('market_cap == 10.0', ), ('market_cap != 10.0', ), ('market_cap < 10.0', ), ('market_cap <= 10.0', ), ('market_cap > 10.0', ), ('market_cap >= 10.0', ),
     ('operating_cashflow == 10.0', ), ('operating_cashflow != 10.0', ), ('operating_cashflow < 10.0', ), ('operating_cashflow <= 10.0', ), ('operating_cashflow > 10.0', ), ('operating_cashflow >= 10.0', ),
+    ('code in ["1301", "7203"]', ), ('code not in ["1301"]', ), ('industry_name in ["foo", "bar"]', ), ('price in [100, 200.5]', ),
   ], ids=[
     'check-code-with-eq', 'check-code-with-not-eq', 'check-code-with-in', 'check-code-with-not-in',
     'check-name-with-eq', 'check-name-with-not-eq', 'check-name-with-in', 'check-name-with-not-in',
@@ -512,6 +518,7 @@ class TestValidateCondition:
     'check-er-with-eq', 'check-er-with-not-eq', 'check-er-with-lt', 'check-er-with-lte', 'check-er-with-gt', 'check-er-with-gte',
     'check-marketcap-with-eq', 'check-marketcap-with-not-eq', 'check-marketcap-with-lt', 'check-marketcap-with-lte', 'check-marketcap-with-gt', 'check-marketcap-with-gte',
     'check-operatingcf-with-eq', 'check-operatingcf-with-not-eq', 'check-operatingcf-with-lt', 'check-operatingcf-with-lte', 'check-operatingcf-with-gt', 'check-operatingcf-with-gte',
+    'check-code-with-list', 'check-code-with-not-in-list', 'check-industry-with-list', 'check-price-with-list',
   ])
   def test_valid_validate_method(self, condition):
     field_types, comp_ops = self.get_stock_validator_config()
@@ -528,29 +535,23 @@ class TestValidateCondition:
     'condition',
     'err_msg',
   ], [
-    ('a + b',  'cannot use BinOp in this application'),
-    ('a - b',  'cannot use BinOp in this application'),
-    ('a * b',  'cannot use BinOp in this application'),
-    ('a ** b', 'cannot use BinOp in this application'),
-    ('a / b',  'cannot use BinOp in this application'),
-    ('a % 3',  'cannot use BinOp in this application'),
-    ('a // b', 'cannot use BinOp in this application'),
-    ('a >> b', 'cannot use BinOp in this application'),
-    ('a << b', 'cannot use BinOp in this application'),
+    ('a ** b', 'cannot use Pow in this application'),
+    ('a % 3',  'cannot use Mod in this application'),
+    ('a // b', 'cannot use FloorDiv in this application'),
+    ('a >> b', 'cannot use RShift in this application'),
+    ('a << b', 'cannot use LShift in this application'),
     ('price < f(3)', 'cannot use Call in this application'),
     ('price.dummy < 10', 'cannot use Attribute in this application'),
+    ('per < pbr ** 2', 'cannot use Pow in this application'),
   ], ids=[
-    'use-add-op',
-    'use-sub-op',
-    'use-mult-op',
     'use-pow-op',
-    'use-div-op',
     'use-mod-op',
     'use-floor-div-op',
     'use-right-shift-op',
     'use-left-shift-op',
     'use-call',
     'use-attribute',
+    'use-pow-op-in-comparison',
   ])
   def test_invalid_operator(self, condition, err_msg):
     field_types, comp_ops = self.get_stock_validator_config()
@@ -572,12 +573,20 @@ class TestValidateCondition:
     ('price < 10.001', ValidationError, 'Invalid data (price, 10.001): '),
     ('code < "1200"', ValidationError, 'Invalid operator between code and 1200'),
     ('price in 1200', ValidationError, 'Invalid operator between price and 1200'),
+    ('code == ["1301"]', ValidationError, "Invalid operator between code and ['1301']"),
+    ('code in []', ValidationError, 'Empty list is not available for code'),
+    ('code in ["1301", "12-3"]', ValidationError, 'Invalid data (code, 12-3): '),
+    ('code in [name]', ValueError, 'Invalid inputs exist.'),
   ], ids=[
     'invalid-value',
     'invalid-keyname',
     'invalid-field-value',
     'invalid-operator-for-str',
     'invalid-operator-for-number',
+    'invalid-operator-for-list',
+    'empty-list',
+    'invalid-item-in-list',
+    'list-of-fields',
   ])
   def test_invalid_validation_method_patterns(self, condition, exception_type, err_msg):
     field_types, comp_ops = self.get_stock_validator_config()
@@ -590,6 +599,103 @@ class TestValidateCondition:
 
     assert err_msg in str(ex.value)
 
+  @pytest.mark.parametrize([
+    'condition',
+  ], [
+    ('per < pbr', ),
+    ('per < pbr * 10', ),
+    ('eps / bps > 0.1', ),
+    ('0.1 < eps / bps', ),
+    ('price - dividend * 2 >= 100 + er', ),
+    ('(eps + bps) / 2 != per', ),
+    ('name == industry_name', ),
+    ('code != name', ),
+    ('1 < per < pbr * 2 < 10', ),
+    ('per < pbr and price > 100', ),
+  ], ids=[
+    'compare-fields',
+    'compare-field-with-mult',
+    'compare-div-with-constant',
+    'swapped-constant-and-div',
+    'complex-arithmetic',
+    'bracketed-arithmetic',
+    'compare-str-fields-with-eq',
+    'compare-str-fields-with-not-eq',
+    'chained-comparison',
+    'combined-with-simple-comparison',
+  ])
+  def test_valid_expression(self, condition):
+    field_types, comp_ops = self.get_stock_validator_config()
+    visitor = models._ValidateCondition(field_types, comp_ops, attr_types=models.StockMembers.get_attribute_types())
+    tree = ast.parse(condition, mode='eval')
+    visitor.visit(tree)
+
+    try:
+      visitor.validate()
+    except Exception as ex:
+      pytest.fail(f'Unexpected Error: {ex}')
+
+  @pytest.mark.parametrize([
+    'condition',
+    'exception_type',
+    'err_msg',
+  ], [
+    ('a + b', ValueError, 'Invalid inputs exist.'),
+    ('1 < 2', ValueError, 'Invalid inputs exist.'),
+    ('1 < 2 * 3', ValueError, 'Invalid inputs exist.'),
+    ('per < (pbr < 2)', ValueError, 'Invalid inputs exist.'),
+    ('per < hoge * 2', KeyError, 'hoge does not exist'),
+    ('per < name', ValidationError, 'Invalid operator in per < name'),
+    ('name < industry_name', ValidationError, 'Invalid operator in name < industry_name'),
+    ('name in industry_name', ValidationError, 'Invalid operator in name in industry_name'),
+    ('per * name > 3', ValidationError, 'Arithmetic operations are available only for numbers: per * name'),
+    ('per * "3" > 3', ValidationError, 'Arithmetic operations are available only for numbers: per * '),
+    ('code == name + "a"', ValidationError, 'Arithmetic operations are available only for numbers: name + '),
+  ], ids=[
+    'no-comparison',
+    'only-constants',
+    'only-constants-with-arithmetic',
+    'nested-comparison',
+    'invalid-keyname',
+    'compare-number-with-str',
+    'compare-str-fields-with-lt',
+    'compare-str-fields-with-in',
+    'arithmetic-with-str-field',
+    'arithmetic-with-str-constant',
+    'concatenate-str',
+  ])
+  def test_invalid_expression(self, condition, exception_type, err_msg):
+    field_types, comp_ops = self.get_stock_validator_config()
+    visitor = models._ValidateCondition(field_types, comp_ops, attr_types=models.StockMembers.get_attribute_types())
+    tree = ast.parse(condition, mode='eval')
+    visitor.visit(tree)
+
+    with pytest.raises(exception_type) as ex:
+      visitor.validate()
+
+    assert err_msg in str(ex.value)
+
+  @pytest.mark.parametrize([
+    'condition',
+    'is_valid',
+  ], [
+    ('price < count * 10', True),
+    ('purchase_date > purchase_date', True),
+    ('purchase_date < price', False),
+    ('purchase_date + 1 > price', False),
+  ], ids=[
+    'compare-with-arithmetic',
+    'compare-dates',
+    'compare-date-with-number',
+    'arithmetic-with-date',
+  ])
+  def test_expression_for_purchased_stock(self, condition, is_valid):
+    if is_valid:
+      models.purchased_stock_validator(condition)
+    else:
+      with pytest.raises(ValidationError):
+        models.purchased_stock_validator(condition)
+
   def test_call_twice_and_get_same_answer(self):
     condition = 'price < 1000 and code in "3"'
     field_types, comp_ops = self.get_stock_validator_config()
@@ -612,6 +718,54 @@ class TestValidateCondition:
     assert ops_1st == ops_2nd
     assert len_1st == len_2nd == 0
 
+  @pytest.mark.parametrize([
+    'key',
+    'value',
+  ], [
+    ('price', '1200'),
+    ('price', '-10.25'),
+    ('price', '10.001'),
+    ('price', '123456789'),
+    ('price', '1e3'),
+    ('price', '1e9'),
+    ('price', 'nan'),
+    ('price', 'abc'),
+    ('price', ''),
+    ('er', '0.0001e4'),
+    ('er', '0E-5'),
+    ('name', 'hoge'),
+    ('name', ''),
+    ('name', 'a' * 255),
+    ('name', 'a' * 256),
+    ('code', '1234'),
+    ('code', '12-3'),
+    ('div_yield', 'anything'),
+  ], ids=lambda val: val if len(val) < 16 else f'{val[:8]}...')
+  def test_schema_has_same_result_as_field_clean(self, key, value):
+    field_types, comp_ops = self.get_stock_validator_config()
+    schema = models._ValidationSchema(field_types, comp_ops)
+
+    try:
+      field_types[key].clean(value, None)
+      expected = None
+    except ValidationError as ex:
+      expected = ex.messages
+
+    try:
+      schema.clean(key, value)
+      estimated = None
+    except ValidationError as ex:
+      estimated = ex.messages
+
+    assert estimated == expected
+
+  def test_schema_is_shared(self):
+    visitors = [models.stock_validator.__wrapped__() for _ in range(2)]
+
+    assert visitors[0] is not visitors[1]
+    assert visitors[0]._schema is visitors[1]._schema
+    assert visitors[0]._fields is visitors[1]._fields
+
 # ==================
 # TestWrapValidation
 # ==================
@@ -693,6 +847,168 @@ class TestWrapValidation:
     assert all([key in field_keys for key in expected_fields.keys()])
     assert all([key in op_keys for key in expected_ops.keys()])
 
+# =================
+# CompiledCondition
+# =================
+@pytest.mark.stock
+@pytest.mark.model
+class TestCompiledCondition:
+  @pytest.mark.parametrize([
+    'first',
+    'second',
+  ], [
+    ('price < 10', 'price < 10'),
+    ('price < 10\n and bps > 10', 'price < 10  and bps > 10'),
+    (' er > 2 ', 'er > 2'),
+  ], ids=[
+    'same-condition',
+    'with-return-code',
+    'with-blanks',
+  ])
+  def test_same_instance_for_normalized_condition(self, first, second):
+    compiled_1st = models.compile_condition(first)
+    compiled_2nd = models.compile_condition(second)
+
+    assert compiled_1st is compiled_2nd
+    assert ast.dump(compiled_1st.tree) == ast.dump(models.get_tree(first))
+
+  def test_empty_condition(self):
+    compiled = models.compile_condition(' \n ')
+
+    assert compiled.tree is None
+    assert compiled.condition is None
+
+  def test_invalid_syntax_is_not_cached(self):
+    with pytest.raises(SyntaxError):
+      models.compile_condition('price <')
+    assert len(models._compiled_conditions) == 0
+
+  def test_condition_is_built_once(self, mocker):
+    compiled = models.compile_condition('price > 2 and er < 5')
+    visitor_mock = mocker.patch('stock.models._AnalyzeAndCreateQmodelCondition', wraps=models._AnalyzeAndCreateQmodelCondition)
+    q_1st = compiled.condition
+    q_2nd = compiled.condition
+
+    assert q_1st is q_2nd
+    assert str(q_1st) == str(Q() & Q(er__lt=5) & Q(price__gt=2))
+    assert visitor_mock.call_count == 1
+
+  @pytest.mark.parametrize([
+    'condition',
+    'expected',
+  ], [
+    ('', set()),
+    ('price > 2', {'price'}),
+    ('1 < pbr < 3 and (name in "a" or per > pbr)', {'pbr', 'name', 'per'}),
+  ], ids=[
+    'empty-condition',
+    'single-field',
+    'multiple-fields',
+  ])
+  def test_referenced_fields(self, condition, expected):
+    compiled = models.compile_condition(condition)
+
+    assert compiled.fields == expected
+
+  def test_least_recently_used_entry_is_discarded(self, settings):
+    settings.SCREENER_CONDITION_CACHE_SIZE = 2
+    compiled_a = models.compile_condition('price < 1')
+    compiled_b = models.compile_condition('price < 2')
+    # Refer to the 1st condition again
+    _ = models.compile_condition('price < 1')
+    _ = models.compile_condition('price < 3')
+
+    assert len(models._compiled_conditions) == 2
+    assert models.compile_condition('price < 1') is compiled_a
+    assert models.compile_condition('price < 2') is not compiled_b
+
+  def test_validation_result_is_reused(self, mocker):
+    visitor_mock = mocker.patch('stock.models._ValidateCondition', wraps=models._ValidateCondition)
+    models.stock_validator('price < 100')
+    models.stock_validator('price < 100\n')
+
+    assert visitor_mock.call_count == 1
+
+  def test_validation_result_depends_on_validator(self):
+    models.purchased_stock_validator('count > 0')
+
+    with pytest.raises(ValidationError) as ex:
+      models.stock_validator('count > 0')
+
+    assert 'Invalid variable' in str(ex.value)
+
+  def test_invalid_condition_is_validated_every_time(self, mocker):
+    visitor_mock = mocker.patch('stock.models._ValidateCondition', wraps=models._ValidateCondition)
+
+    for _ in range(2):
+      with pytest.raises(ValidationError):
+        models.stock_validator('price < "abc"')
+
+    assert visitor_mock.call_count == 2
+
+  @pytest.fixture
+  def get_snapshot_records(self):
+    params = [
+      {'code': '1301', 'name': 'alpha', 'industry': 'foo', 'price': 100.0, 'dividend': 5.0, 'per': 10.0, 'pbr': 1.0, 'count': 2, 'purchased_value': 150.0},
+      {'code': '7203', 'name': 'beta', 'industry': 'bar', 'price': 0.0, 'dividend': 0.0, 'per': 20.0, 'pbr': 3.0},
+      {'code': '9984', 'name': 'gamma', 'industry': 'foo-bar', 'price': 2000.0, 'dividend': 50.0, 'per': 15.0, 'pbr': 2.0, 'count': 1, 'purchased_value': 2500.0},
+    ]
+    defaults = {'payout_ratio': 1.0, 'eps': 1.0, 'bps': 1.0, 'roe': 1.0, 'er': 1.0, 'market_cap': 1.0, 'operating_cashflow': 1.0}
+    records = [models._SnapshotRecord(**kwargs, **defaults) for kwargs in params]
+
+    return records
+
+  @pytest.mark.parametrize([
+    'condition',
+    'expected',
+  ], [
+    ('price > 50', [True, False, True]),
+    ('10 < per <= 15', [False, False, True]),
+    ('code == 7203', [False, True, False]),
+    ('name in "a"', [True, True, True]),
+    ('industry not in "bar"', [True, False, False]),
+    ('code in ["1301", "9984"]', [True, False, True]),
+    ('industry not in ["foo", "bar"]', [False, False, True]),
+    ('per < pbr * 8', [False, True, True]),
+    ('dividend / price > 0.02', [True, False, True]),
+    ('div_yield > 3 or diff < 0', [True, False, True]),
+    ('per > 12 and (name == "alpha" or count >= 1)', [False, False, True]),
+    ('price > 10 and price < 5', [False, False, False]),
+  ], ids=[
+    'single-compare',
+    'multi-compare',
+    'number-for-str-field',
+    'include-name',
+    'not-include-industry',
+    'code-in-list',
+    'industry-not-in-list',
+    'compare-fields',
+    'division-by-zero',
+    'computed-properties',
+    'nested-boolop',
+    'unsatisfiable',
+  ])
+  def test_predicate(self, get_snapshot_records, condition, expected):
+    models.snapshot_record_validator(condition)
+    predicate = models.compile_condition(condition).predicate
+    results = [predicate(record) for record in get_snapshot_records]
+
+    assert results == expected
+
+  def test_predicate_is_built_once(self, mocker):
+    compiled = models.compile_condition('price > 2 or name == "abc"')
+    visitor_mock = mocker.patch('stock.models._CreatePredicate', wraps=models._CreatePredicate)
+    predicate_1st = compiled.predicate
+    predicate_2nd = compiled.predicate
+
+    assert predicate_1st is predicate_2nd
+    assert visitor_mock.call_count == 1
+
+  def test_predicate_of_empty_condition(self):
+    compiled = models.compile_condition('')
+
+    assert compiled.predicate is None
+
 # ===============
 # QmodelCondition
 # ===============
@@ -719,6 +1035,8 @@ class TestQmodelCondition:
     ('2 < er < 3 < bps < 5',                   Q(bps__lt=5) & Q(bps__gt=3) & Q(er__lt=3) & Q(er__gt=2)),
     ('2<er<3',                                 Q(er__lt=3) & Q(er__gt=2)),
     ('(price<5 or name in "001") and 2<er<3',  "(AND: ('er__lt', 3), ('er__gt', 2), (OR: (AND: ), (AND: ('name__contains', '001')), ('price__lt', 5)))"),
+    ('code in ["0010", "0012"]',               Q(code__in=["0010", "0012"])),
+    ('code not in ["0010", "0012"]',          ~Q(code__in=["0010", "0012"])),
   ], ids=[
     'check-eq-expr',
     'check-not-eq-expr',
@@ -736,6 +1054,8 @@ class TestQmodelCondition:
     'check-python-specific-expr-for-multi-version',
     'check-python-specific-without-spaces-expr',
     'check-complex-expr',
+    'check-include-list-expr',
+    'check-not-include-list-expr',
   ])
   def test_q_model_condition(self, expression, expected):
     tree = ast.parse(expression, mode='eval')
@@ -745,6 +1065,79 @@ class TestQmodelCondition:
 
     assert str(estimated) == str(expected)
 
+  @pytest.mark.parametrize([
+    'expression',
+    'lookup',
+  ], [
+    ('name in "foo"', 'name__contains'),
+    ('name not in "foo"', 'name__contains'),
+    ('industry_name in "foo"', 'industry_name__contains'),
+    ('industry_name not in "foo"', 'industry_name__contains'),
+    ('name == "foo"', 'name__exact'),
+    ('code in "001"', 'code__contains'),
+    ('industry_name in ["foo", "bar"]', 'industry_name__in'),
+    ('code in ["0010"]', 'code__in'),
+  ], ids=[
+    'include-name',
+    'not-include-name',
+    'include-industry',
+    'not-include-industry',
+    'equal-name',
+    'include-code',
+    'industry-list',
+    'code-list',
+  ])
+  def test_q_model_condition_for_names(self, expression, lookup):
+    tree = ast.parse(expression, mode='eval')
+    visitor = models._AnalyzeAndCreateQmodelCondition()
+    visitor.visit(tree)
+    estimated = visitor.condition
+    key, _ = estimated.children[0]
+
+    assert estimated.negated == ('not in' in expression)
+    assert key == lookup
+
+  @pytest.mark.parametrize([
+    'expression',
+    'lookup',
+    'negated',
+  ], [
+    ('per < pbr', 'LessThan(F(per), F(pbr))', False),
+    ('per <= pbr * 10', 'LessThanOrEqual(F(per), ExpressionWrapper(F(pbr) * Value(10)))', False),
+    ('eps / bps > 0.1', 'GreaterThan(ExpressionWrapper(F(eps) / NullIf(F(bps), Value(0))), Value(0.1))', False),
+    ('0.1 <= eps - bps', 'LessThanOrEqual(Value(0.1), ExpressionWrapper(F(eps) - F(bps)))', False),
+    ('name == industry_name', 'Exact(F(name), F(industry_name))', False),
+    ('per + 1 != pbr', 'Exact(ExpressionWrapper(F(per) + Value(1)), F(pbr))', True),
+  ], ids=[
+    'compare-fields',
+    'compare-field-with-mult',
+    'compare-div-with-constant',
+    'constant-and-sub',
+    'compare-str-fields',
+    'not-equal-with-add',
+  ])
+  def test_q_model_condition_with_expression(self, expression, lookup, negated):
+    tree = ast.parse(expression, mode='eval')
+    visitor = models._AnalyzeAndCreateQmodelCondition()
+    visitor.visit(tree)
+    estimated = visitor.condition
+
+    assert estimated.negated == negated
+    assert repr(estimated.children[0]).replace("'", '') == lookup
+
+  def test_condition_for_each_language(self):
+    compiled = models.compile_condition('name in "foo"')
+
+    with translation.override('en'):
+      sql_en = str(models.Stock.objects.select_targets(condition=compiled.condition).query)
+    with translation.override('ja'):
+      sql_ja = str(models.Stock.objects.select_targets(condition=compiled.condition).query)
+
+    assert '->> ja' not in sql_en
+    assert '->> ja' in sql_ja
+    # The name of the default language is used as a fallback
+    assert '->> en' in sql_ja
+
   @pytest.mark.parametrize([
     'condition',
   ], [
@@ -763,6 +1156,107 @@ class TestQmodelCondition:
     with pytest.raises(IndexError):
       visitor.visit(tree)
 
+@pytest.mark.stock
+@pytest.mark.model
+class TestOptimizeCondition:
+  @pytest.mark.parametrize([
+    'expression',
+    'expected',
+  ], [
+    ('price > 100 and price > 200',            'price > 200'),
+    ('price >= 100 and price > 100',           'price > 100'),
+    ('price < 100 and price <= 50',            'price <= 50'),
+    ('price > 100 or price > 200',             'price > 100'),
+    ('price < 100 or price <= 100',            'price <= 100'),
+    ('2 < er < 3',                             'er > 2 and er < 3'),
+    ('3 > er',                                 'er < 3'),
+    ('price >= 3 and price <= 3',              'price == 3'),
+    ('price == 5 and price >= 5',              'price == 5'),
+    ('price > 1 and price != 0',               'price > 1'),
+    ('price > 1 and price != 2',               'price > 1 and price != 2'),
+    ('per < 2 and (pbr > 1 and per < 1)',      'per < 1 and pbr > 1'),
+    ('er > 1 or (er > 1 or bps < 2)',          'er > 1 or bps < 2'),
+    ('name in "a" or name in "a"',             "name in 'a'"),
+    ('(er > 1 and bps < 2) or (bps < 2 and er > 1)', 'er > 1 and bps < 2 or (bps < 2 and er > 1)'),
+    ('price == "800" and price == "800.0"',    "price == '800' and price == '800.0'"),
+    ('er > 1 or (price > 5 and price < 3)',    'er > 1'),
+    ('code == "1" or code == "2" or er > 1',   "code in ['1', '2'] or er > 1"),
+    ('code in ["1", "2"] or code == "2"',      "code in ['1', '2']"),
+    ('price == 1 or price == 2 or price > 5',  'price in [1, 2] or price > 5'),
+    ('code == "1" and code in ["1", "2"]',     "code == '1' and code in ['1', '2']"),
+  ], ids=[
+    'merge-lower-bounds',
+    'merge-inclusive-and-exclusive',
+    'merge-upper-bounds',
+    'merge-or-lower-bounds',
+    'merge-or-upper-bounds',
+    'split-chained-comparison',
+    'swap-name-and-constant',
+    'narrow-to-single-value',
+    'equal-in-range',
+    'ignore-not-equal-out-of-range',
+    'keep-not-equal-in-range',
+    'flatten-nested-and',
+    'flatten-nested-or',
+    'remove-duplicated-items',
+    'keep-different-order',
+    'keep-string-constants',
+    'remove-always-false-branch',
+    'merge-equalities-into-list',
+    'merge-list-and-equality',
+    'merge-number-equalities',
+    'keep-equality-in-and',
+  ])
+  def test_optimize_tree(self, expression, expected):
+    tree = ast.parse(expression, mode='eval')
+    estimated = models.optimize_tree(tree)
+
+    assert ast.unparse(estimated) == expected
+    assert ast.unparse(tree) == ast.unparse(ast.parse(expression, mode='eval'))
+
+  @pytest.mark.parametrize([
+    'expression',
+  ], [
+    ('price > 5 and price < 3', ),
+    ('price > 3 and price < 3', ),
+    ('price >= 3 and price < 3', ),
+    ('price == 5 and price == 6', ),
+    ('price == 5 and price > 10', ),
+    ('price == 5 and price != 5', ),
+    ('er > 1 and (price > 5 and price < 3)', ),
+    ('(price > 5 and price < 3) or (er > 2 and er < 1)', ),
+  ], ids=[
+    'disjoint-range',
+    'exclusive-same-value',
+    'half-inclusive-same-value',
+    'different-equal-values',
+    'equal-out-of-range',
+    'equal-and-not-equal',
+    'nested-and',
+    'all-or-branches',
+  ])
+  def test_always_false_condition(self, expression):
+    compiled = models.compile_condition(expression)
+
+    assert compiled.is_unsatisfiable
+    assert compiled.condition is models.EMPTY_CONDITION
+
+  @pytest.mark.django_db
+  def test_no_query_for_always_false_condition(self, django_assert_num_queries):
+    compiled = models.compile_condition('price > 5 and price < 3')
+
+    with django_assert_num_queries(0):
+      queryset = models.Stock.objects.select_targets(tree=compiled.tree, condition=compiled.condition)
+      records = list(queryset)
+
+    assert records == []
+
+  def test_optimized_condition(self):
+    compiled = models.compile_condition('price > 100 and price > 200 and er < 5')
+
+    assert not compiled.is_unsatisfiable
+    assert str(compiled.condition) == str(Q() & Q(er__lt=5) & Q(price__gt=200))
+
 # ========
 # Industry
 # ========
@@ -822,11 +1316,13 @@ class TestIndustry(SharedFixtures):
     assert records.count() == exact_counts
     assert all([instance.name == exact_name for instance in records])
 
-  def test_check_get_dict(self):
+  def test_check_get_dict(self, django_assert_num_queries):
     instance = factories.IndustryFactory()
     en_lang = factories.LocalizedIndustryFactory(language_code='en', industry=instance)
     ja_lang = factories.LocalizedIndustryFactory(language_code='ja', industry=instance)
-    out_dict = instance.get_dict()
+
+    with django_assert_num_queries(0):
+      out_dict = instance.get_dict()
 
     assert all([key in ['names', 'is_defensive'] for key in out_dict.keys()])
     assert out_dict['is_defensive'] == instance.is_defensive
@@ -855,6 +1351,57 @@ class TestIndustry(SharedFixtures):
 
     assert out == exact_name
 
+  def test_industry_names_are_reused(self, django_assert_num_queries):
+    instance = factories.IndustryFactory()
+    _ = factories.LocalizedIndustryFactory(name='industry-en', language_code='en', industry=instance)
+    _ = models.get_industry_name(instance.pk)
+
+    with translation.override('en'):
+      with django_assert_num_queries(0):
+        names = [str(instance) for _ in range(3)]
+
+    assert names == ['industry-en'] * 3
+
+  def test_industry_names_are_updated(self):
+    instance = factories.IndustryFactory()
+    localized = factories.LocalizedIndustryFactory(name='industry-en', language_code='en', industry=instance)
+
+    with translation.override('en'):
+      created = str(instance)
+      localized.name = 'new-industry-en'
+      localized.save()
+      updated = str(instance)
+      localized.delete()
+      deleted = str(instance)
+
+    assert created == 'industry-en'
+    assert updated == 'new-industry-en'
+    assert deleted == ''
+
+  @pytest.mark.parametrize([
+    'interval',
+    'expected',
+  ], [
+    (0, 'new-industry-en'),
+    (3600, 'industry-en'),
+  ], ids=[
+    'check-version',
+    'within-interval',
+  ])
+  def test_industry_names_are_updated_by_other_process(self, settings, interval, expected):
+    settings.INDUSTRY_NAME_CHECK_INTERVAL = interval
+    instance = factories.IndustryFactory()
+    _ = factories.LocalizedIndustryFactory(name='industry-en', language_code='en', industry=instance)
+
+    with translation.override('en'):
+      _ = str(instance)
+      # Emulate the update by the other process
+      models.Industry.objects.filter(pk=instance.pk).update(names={'en': 'new-industry-en'})
+      bump_data_version(models.INDUSTRY_NAMES_LABEL)
+      out = str(instance)
+
+    assert out == expected
+
 # =====
 # Stock
 # =====
@@ -1059,6 +1606,36 @@ class TestStock(SharedFixtures):
       )
     assert err_msg in str(ex.value)
 
+  @pytest.mark.parametrize([
+    'options',
+    'div_yield',
+    'multi_pp',
+  ], [
+    ({'price': Decimal('800'), 'dividend': Decimal('20'), 'per': Decimal('1.5'), 'pbr': Decimal('3')}, 2.5, 4.5),
+    ({'price': Decimal('0'), 'dividend': Decimal('20'), 'per': Decimal('1.5'), 'pbr': Decimal('3')}, 0, 4.5),
+    ({'price': Decimal('800'), 'dividend': Decimal('20'), 'per': Decimal('0'), 'pbr': Decimal('3')}, 2.5, 0),
+    ({'price': Decimal('800'), 'dividend': Decimal('20'), 'per': Decimal('1.5'), 'pbr': Decimal('0')}, 2.5, 0),
+  ], ids=[
+    'normal-values',
+    'price-is-zero',
+    'per-is-zero',
+    'pbr-is-zero',
+  ])
+  def test_derived_metrics(self, options, div_yield, multi_pp):
+    instance = factories.StockFactory(**options)
+    instance.refresh_from_db()
+
+    assert abs(instance.div_yield - div_yield) < 1e-6
+    assert abs(instance.multi_pp - multi_pp) < 1e-6
+
+  def test_derived_metrics_are_updated(self):
+    instance = factories.StockFactory(price=Decimal('800'), dividend=Decimal('20'))
+    instance.price = Decimal('400')
+    instance.save()
+    instance.refresh_from_db()
+
+    assert abs(instance.div_yield - 5.0) < 1e-6
+
   def test_default_select_targets_queryset(self, mocker):
     stocks = [
       *factories.StockFactory.create_batch(3, skip_task=True),
@@ -1079,6 +1656,9 @@ class TestStock(SharedFixtures):
     ('code in "001"', [0, 1]),
     ('name == "gamma_c"', [4]),
     ('industry_name not in "foo"', [4]),
+    ('industry_name in "foo"', [0, 1, 2, 3]),
+    ('name in "ta"', [2]),
+    ('name not in "pp"', [0, 1, 2, 4]),
     ('price <= 1000', [1, 4]),
     ('dividend > 6', [0, 2, 4]),
     ('payout_ratio > 100.5', [0, 2]),
@@ -1090,11 +1670,26 @@ class TestStock(SharedFixtures):
     ('8 <= er and er <= 16', [1, 2, 3]),
     ('market_cap < 1000.0', [0, 1, 4]),
     ('1000 < operating_cashflow < 2100', [1, 3]),
+    ('div_yield > 0.8', [0, 4]),
+    ('multi_pp < 1', [0, 4]),
     ('code in "1" and price < 1000 or name in "_" or industry_name == "foo" or price > 1000', [0,1,2,3,4]),
+    ('per < pbr', [0, 1, 2]),
+    ('per < pbr * 0.5', [0]),
+    ('eps / bps > 1', [2]),
+    ('eps / (bps - 1.1) > 1.4', [0, 2]),
+    ('price - dividend * 100 < 0', [0]),
+    ('per * pbr < multi_pp + 0.1', [0, 1, 2, 3, 4]),
+    ('code in ["0010", "005A"]', [0, 3]),
+    ('industry_name in ["foo", "hogehoge"]', [2, 3, 4]),
+    ('name not in ["alpha01", "beta20"]', [0, 3, 4]),
+    ('code == "0012" or code == "040a"', [1, 4]),
   ], ids=[
     'based-on-code',
     'based-on-name',
     'based-on-industry',
+    'include-industry',
+    'include-name',
+    'not-include-name',
     'based-on-price',
     'based-on-dividend',
     'based-on-payoutratio',
@@ -1106,7 +1701,19 @@ class TestStock(SharedFixtures):
     'based-on-er',
     'based-on-marketcap',
     'based-on-operatingcf',
+    'based-on-div-yield',
+    'based-on-multi-pp',
     'complex-expression-by-using-several-columns',
+    'compare-fields',
+    'compare-field-with-arithmetic',
+    'compare-division',
+    'division-by-zero',
+    'compare-multiple-arithmetic',
+    'compare-with-generated-field',
+    'code-in-list',
+    'industry-in-list',
+    'name-not-in-list',
+    'chain-of-equalities',
   ])
   def test_select_targets_with_tree(self, mocker, pseudo_stock_data, expression, indices):
     stocks = pseudo_stock_data
@@ -1119,13 +1726,16 @@ class TestStock(SharedFixtures):
     assert qs.count() == len(expected)
     assert all([record.pk == pk for record, pk in zip(qs, expected)])
 
-  def test_check_get_dict(self, get_judgement_funcs):
+  def test_check_get_dict(self, django_assert_num_queries, get_judgement_funcs):
     collector, compare_keys, compare_values = get_judgement_funcs
     instance = factories.StockFactory()
     en_lang = factories.LocalizedStockFactory(language_code='en', stock=instance)
     ja_lang = factories.LocalizedStockFactory(language_code='ja', stock=instance)
-    out_dict = instance.get_dict()
-    fields = list(sorted(collector(models.Stock, exclude=['industry', 'skip_task'])))
+
+    with django_assert_num_queries(0):
+      out_dict = instance.get_dict()
+    derived_fields = ['div_yield', 'multi_pp'] + models.StockMembers.get_rank_members()
+    fields = list(sorted(collector(models.Stock, exclude=['industry', 'skip_task', 'names'] + derived_fields)))
     industry = out_dict.pop('industry', None)
     skip_task = out_dict.pop('skip_task', None)
     names = out_dict.pop('names', None)
@@ -1161,6 +1771,161 @@ class TestStock(SharedFixtures):
 
     assert out == expected
 
+  @pytest.mark.parametrize([
+    'language_codes',
+    'current_lang',
+    'expected',
+  ], [
+    (['en', 'ja'], 'ja', 'name-ja'),
+    (['en', 'ja'], 'en', 'name-en'),
+    (['en'], 'ja', 'name-en'),
+    (['fr'], 'ja', ''),
+  ], ids=[
+    'current-language',
+    'default-language',
+    'fallback-to-default-language',
+    'no-localized-name',
+  ])
+  def test_get_name_without_queries(self, django_assert_num_queries, language_codes, current_lang, expected):
+    stock = factories.StockFactory()
+
+    for language_code in language_codes:
+      _ = factories.LocalizedStockFactory(name=f'name-{language_code}', language_code=language_code, stock=stock)
+      _ = factories.LocalizedIndustryFactory(name=f'name-{language_code}', language_code=language_code, industry=stock.industry)
+    instance = models.Stock.objects.get(pk=stock.pk)
+    # Load the industry names in advance
+    _ = models.get_industry_name(stock.industry.pk)
+
+    with translation.override(current_lang):
+      with django_assert_num_queries(0):
+        names = [instance.get_name(), str(instance.industry)]
+
+    assert names == [expected, expected]
+
+  def test_names_are_synchronized(self):
+    stock = factories.StockFactory()
+    en_lang = factories.LocalizedStockFactory(name='name-en', language_code='en', stock=stock)
+    ja_lang = factories.LocalizedStockFactory(name='name-ja', language_code='ja', stock=stock)
+    _ = factories.LocalizedIndustryFactory(name='industry-en', language_code='en', industry=stock.industry)
+    created = models.Stock.objects.get(pk=stock.pk).names
+    ja_lang.name = 'new-name-ja'
+    ja_lang.save()
+    updated = models.Stock.objects.get(pk=stock.pk).names
+    en_lang.delete()
+    deleted = models.Stock.objects.get(pk=stock.pk).names
+
+    assert created == {'en': 'name-en', 'ja': 'name-ja'}
+    assert updated == {'en': 'name-en', 'ja': 'new-name-ja'}
+    assert deleted == {'ja': 'new-name-ja'}
+    assert stock.names == deleted
+    assert models.Industry.objects.get(pk=stock.industry.pk).names == {'en': 'industry-en'}
+
+  def test_save_does_not_overwrite_names(self):
+    stock = factories.StockFactory()
+    instance = models.Stock.objects.get(pk=stock.pk)
+    _ = factories.LocalizedStockFactory(name='name-en', language_code='en', stock=stock)
+    instance.price = Decimal('123')
+    instance.save()
+    estimated = models.Stock.objects.get(pk=stock.pk)
+
+    assert instance.names == {}
+    assert estimated.names == {'en': 'name-en'}
+    assert estimated.price == Decimal('123')
+
+  def test_save_does_not_overwrite_ranks(self):
+    stock = factories.StockFactory()
+    instance = models.Stock.objects.get(pk=stock.pk)
+    models.Stock.objects.filter(pk=stock.pk).update(price_rank=12.5, per_rank=34.5)
+    instance.price = Decimal('123')
+    instance.save()
+    estimated = models.Stock.objects.get(pk=stock.pk)
+
+    assert instance.price_rank is None
+    assert estimated.price_rank == pytest.approx(12.5)
+    assert estimated.per_rank == pytest.approx(34.5)
+    assert estimated.price == Decimal('123')
+
+  def test_refresh_names(self):
+    stock = factories.StockFactory()
+    _ = factories.LocalizedStockFactory(name='name-en', language_code='en', stock=stock)
+    other = factories.StockFactory()
+    models.Stock.objects.filter(pk__in=[stock.pk, other.pk]).update(names={'fr': 'hoge'})
+    count = models.Stock.refresh_names()
+
+    assert count >= 2
+    assert models.Stock.objects.get(pk=stock.pk).names == {'en': 'name-en'}
+    assert models.Stock.objects.get(pk=other.pk).names == {}
+
+  @pytest.mark.parametrize([
+    'language_codes',
+    'current_lang',
+    'expected',
+  ], [
+    (['en', 'ja'], 'ja', 'name-ja'),
+    (['en'], 'ja', 'name-en'),
+    (['fr'], 'ja', None),
+  ], ids=[
+    'current-language',
+    'fallback-to-default-language',
+    'no-localized-name',
+  ])
+  def test_annotated_names_with_fallback(self, language_codes, current_lang, expected):
+    stock = factories.StockFactory(skip_task=False)
+
+    for language_code in language_codes:
+      _ = factories.LocalizedStockFactory(name=f'name-{language_code}', language_code=language_code, stock=stock)
+      _ = factories.LocalizedIndustryFactory(name=f'name-{language_code}', language_code=language_code, industry=stock.industry)
+
+    with translation.override(current_lang):
+      instance = models.Stock.objects.select_targets().get(pk=stock.pk)
+      matched = models.Stock.objects.select_targets(condition=Q(name=expected or '')).filter(pk=stock.pk).exists()
+
+    assert instance.name == expected
+    assert instance.industry_name == expected
+    assert matched == (expected is not None)
+
+  @pytest.mark.parametrize([
+    'language',
+    'suffix',
+  ], [
+    ('en', 'en'),
+    ('ja', 'ja_en'),
+  ], ids=lambda value: value)
+  def test_name_condition_and_ordering_use_indexes(self, mocker, language, suffix):
+    mocker.patch('stock.models.get_language', return_value=language)
+    compiled = models.compile_condition('name in "abc"')
+    filtered = models.Stock.objects.select_targets(tree=compiled.tree, condition=compiled.condition)
+    ordered = models.Stock.objects.select_targets().order_by('name')[:10]
+
+    with connection.cursor() as cursor:
+      # Force the planner to search by the indexes because the table is too small to choose them
+      cursor.execute('SET LOCAL enable_seqscan = off')
+      ordered_plan = ordered.explain()
+      cursor.execute('SET LOCAL enable_indexscan = off')
+      filtered_plan = filtered.explain()
+
+    assert f'names_{suffix}_trgm_idx_in_stock' in filtered_plan
+    assert f'names_{suffix}_idx_in_stock' in ordered_plan
+
+  def test_get_name_from_annotation(self, mocker, django_assert_num_queries):
+    mocker.patch('stock.models.get_language', return_value='en')
+    stock = factories.StockFactory(skip_task=False)
+    _ = factories.LocalizedStockFactory(name='annotated', language_code='en', stock=stock)
+    instance = models.Stock.objects.select_targets().prefetch_related(None).get(pk=stock.pk)
+
+    with django_assert_num_queries(0):
+      name = instance.get_name()
+
+    assert name == 'annotated'
+
+  def test_get_name_without_prefetch(self, mocker):
+    mocker.patch('stock.models.get_language', return_value='en')
+    stock = factories.StockFactory()
+    _ = factories.LocalizedStockFactory(name='not-prefetched', language_code='en', stock=stock)
+    instance = models.Stock.objects.prefetch_related(None).get(pk=stock.pk)
+
+    assert instance.get_name() == 'not-prefetched'
+
   @pytest.mark.parametrize([
     'filename',
     'condition',
@@ -1204,44 +1969,367 @@ class TestStock(SharedFixtures):
     estimated_first = rows[0]
     estimated_last = rows[-1]
 
-    assert len(rows) == total
-    assert estimated_first[0] == first_obj.code
-    assert estimated_first[1] == first_obj.get_name()
-    assert estimated_last[0] == last_obj.code
-    assert estimated_last[1] == last_obj.get_name()
-    assert all([str(est) == exact for est, exact in zip(kwargs['header'], expected_header)])
-    assert kwargs['filename'] == f'stock-{expected_name}.csv'
+    assert len(rows) == total
+    assert estimated_first[0] == first_obj.code
+    assert estimated_first[1] == first_obj.get_name()
+    assert estimated_last[0] == last_obj.code
+    assert estimated_last[1] == last_obj.get_name()
+    assert all([str(est) == exact for est, exact in zip(kwargs['header'], expected_header)])
+    assert kwargs['filename'] == f'stock-{expected_name}.csv'
+
+  def test_create_response_kwargs_with_no_data(self):
+    kwargs = models.Stock.create_response_kwargs('', None, ['code'])
+    queryset = models.Stock.objects.select_targets().order_by('code')
+
+    assert len(list(kwargs['rows'])) == len(queryset)
+
+  def test_check_get_choices_as_list(self, mocker):
+    stocks = [
+      factories.StockFactory(code='0101'),
+      factories.StockFactory(code='0202'),
+    ]
+    localized_stocks = [
+      factories.LocalizedStockFactory(name='stock1-en', language_code='en', stock=stocks[0]),
+      factories.LocalizedStockFactory(name='stock1-ja', language_code='ja', stock=stocks[0]),
+      factories.LocalizedStockFactory(name='stock2-en', language_code='en', stock=stocks[1]),
+      factories.LocalizedStockFactory(name='stock2-ja', language_code='ja', stock=stocks[1]),
+    ]
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.get_language', return_value='en')
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    data = models.Stock.get_choices_as_list()
+
+    assert all([
+      all([key in item.keys() for key in ['pk', 'name', 'code']]) for item in data
+    ])
+    assert len(stocks) == len(data)
+    assert all([
+      all([stock.pk == item['pk'], stock.code == item['code'], stock.get_name() == item['name']])
+      for stock, item in zip(stocks, data)
+    ])
+
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestStockRanks(BaseTestUtils):
+  @pytest.fixture
+  def get_ranked_stocks(self, mocker):
+    stock_params = [
+      ('1000', '10', '0', False),
+      ('2000', '60', '1.5', False),
+      ('1500', '30', '0.5', False),
+      ('3000', '30', '2.5', False),
+      ('500',  '90', '0.1', True),
+    ]
+    stocks = [
+      factories.StockFactory(price=Decimal(price), dividend=Decimal(dividend), pbr=Decimal(pbr), skip_task=skip_task)
+      for price, dividend, pbr, skip_task in stock_params
+    ]
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+    return stocks
+
+  def test_refresh_ranks(self, get_ranked_stocks):
+    stocks = get_ranked_stocks
+    count = models.Stock.refresh_ranks()
+    records = models.Stock.objects.in_bulk(self.get_pks(stocks))
+
+    assert count == 4
+    assert [records[obj.pk].price_rank for obj in stocks[:4]] == pytest.approx([0.0, 200.0 / 3.0, 100.0 / 3.0, 100.0])
+    assert [records[obj.pk].dividend_rank for obj in stocks[:4]] == pytest.approx([0.0, 100.0, 100.0 / 3.0, 100.0 / 3.0])
+    assert records[stocks[4].pk].price_rank is None
+
+  def test_ranks_of_excluded_stock_are_cleared(self, get_ranked_stocks):
+    stocks = get_ranked_stocks
+    _ = models.Stock.refresh_ranks()
+    models.Stock.objects.filter(pk=stocks[3].pk).update(skip_task=True)
+    count = models.Stock.refresh_ranks()
+    records = models.Stock.objects.in_bulk(self.get_pks(stocks))
+    fields = models.StockMembers.get_rank_members()
+
+    assert count == 3
+    assert all([getattr(records[stocks[3].pk], field) is None for field in fields])
+    assert [records[obj.pk].price_rank for obj in stocks[:3]] == pytest.approx([0.0, 100.0, 50.0])
+
+  def test_ranks_of_positive_only_fields(self, get_ranked_stocks):
+    stocks = get_ranked_stocks
+    _ = models.Stock.refresh_ranks()
+    records = models.Stock.objects.in_bulk(self.get_pks(stocks))
+
+    assert records[stocks[0].pk].pbr_rank is None
+    assert [records[obj.pk].pbr_rank for obj in stocks[1:4]] == pytest.approx([50.0, 0.0, 100.0])
+
+  @pytest.mark.parametrize([
+    'condition',
+    'indices',
+  ], [
+    ('price_rank >= 90', [3]),
+    ('dividend_rank > 20 and pbr_rank < 60', [1, 2]),
+    ('pbr_rank < 20 or price_rank == 0', [0, 2]),
+  ], ids=[
+    'top-ranked',
+    'and-operator',
+    'or-operator',
+  ])
+  def test_select_targets_with_ranks(self, get_ranked_stocks, condition, indices):
+    stocks = get_ranked_stocks
+    _ = models.Stock.refresh_ranks()
+    models.stock_validator(condition)
+    queryset = models.Stock.objects.select_targets(tree=models.get_tree(condition))
+
+    assert list(queryset.order_by('pk').values_list('pk', flat=True)) == [stocks[idx].pk for idx in indices]
+
+# ==================
+# IndustryStatistics
+# ==================
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestIndustryStatistics(BaseTestUtils):
+  @pytest.fixture
+  def get_industry_stocks(self, mocker):
+    industries = factories.IndustryFactory.create_batch(3)
+    stock_params = [
+      (0, '10', '5', '1000', '20', False),
+      (0, '20', '15', '2000', '20', False),
+      (0, '0', '10', '1500', '60', False),
+      (0, '30', '40', '1000', '10', True),
+      (1, '8', '3', '500', '0', False),
+    ]
+    stocks = [
+      factories.StockFactory(
+        industry=industries[idx], per=Decimal(per), pbr=Decimal('1'), roe=Decimal(roe),
+        price=Decimal(price), dividend=Decimal(dividend), skip_task=skip_task,
+      )
+      for idx, per, roe, price, dividend, skip_task in stock_params
+    ]
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+    return industries, stocks
+
+  def test_refresh(self, get_industry_stocks):
+    industries, _ = get_industry_stocks
+    # Create the statistics of the industry which does not have any target stocks
+    _ = models.IndustryStatistics.objects.create(industry=industries[2], count=3)
+    count = models.IndustryStatistics.refresh()
+    instances = {obj.industry_id: obj for obj in models.IndustryStatistics.objects.filter(industry__in=industries)}
+
+    assert count == 2
+    assert models.IndustryStatistics.objects.filter(industry=industries[2]).count() == 0
+    assert instances[industries[0].pk].count == 3
+    assert instances[industries[0].pk].avg_per == pytest.approx(15.0)
+    assert instances[industries[0].pk].median_per == pytest.approx(15.0)
+    assert instances[industries[0].pk].avg_roe == pytest.approx(10.0)
+    assert instances[industries[0].pk].median_div_yield == pytest.approx(2.0)
+    assert instances[industries[1].pk].avg_per == pytest.approx(8.0)
+    assert instances[industries[1].pk].avg_div_yield == pytest.approx(0.0)
+
+  def test_refresh_twice(self, get_industry_stocks):
+    industries, stocks = get_industry_stocks
+    _ = models.IndustryStatistics.refresh()
+    models.Stock.objects.filter(pk=stocks[4].pk).update(per=Decimal('12'))
+    count = models.IndustryStatistics.refresh()
+    instance = models.IndustryStatistics.objects.get(industry=industries[1])
+
+    assert count == 2
+    assert models.IndustryStatistics.objects.filter(industry__in=industries).count() == 2
+    assert instance.avg_per == pytest.approx(12.0)
+
+  def test_relative_values(self, get_industry_stocks):
+    _, stocks = get_industry_stocks
+    _ = models.IndustryStatistics.refresh()
+    records = models.Stock.objects.select_targets().in_bulk([obj.pk for obj in stocks])
+
+    assert records[stocks[0].pk].per_vs_industry == pytest.approx(10.0 / 15.0)
+    assert records[stocks[1].pk].roe_vs_industry == pytest.approx(1.5)
+    assert records[stocks[2].pk].per_vs_industry is None
+    assert records[stocks[2].pk].div_yield_vs_industry == pytest.approx(4.0 / (7.0 / 3.0))
+    assert records[stocks[4].pk].div_yield_vs_industry is None
+
+  def test_relative_values_without_statistics(self, get_industry_stocks):
+    _, stocks = get_industry_stocks
+    instance = models.Stock.objects.select_targets().get(pk=stocks[0].pk)
+
+    assert instance.per_vs_industry is None
+    assert instance.roe_vs_industry is None
+
+  @pytest.mark.parametrize([
+    'condition',
+    'indices',
+  ], [
+    ('per_vs_industry < 1', [0]),
+    ('roe_vs_industry >= 1 and pbr_vs_industry == 1', [1, 2, 4]),
+    ('div_yield_vs_industry > 1.5 or per_vs_industry > 1.2', [1, 2]),
+  ], ids=[
+    'below-industry-average',
+    'multiple-relative-values',
+    'or-operator',
+  ])
+  def test_select_targets_with_relative_values(self, get_industry_stocks, condition, indices):
+    _, stocks = get_industry_stocks
+    _ = models.IndustryStatistics.refresh()
+    models.stock_validator(condition)
+    queryset = models.Stock.objects.select_targets(tree=models.get_tree(condition))
+
+    assert list(queryset.order_by('pk').values_list('pk', flat=True)) == [stocks[idx].pk for idx in indices]
+
+# =================
+# StockDailyMetrics
+# =================
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestStockDailyMetrics(BaseTestUtils):
+  @pytest.fixture
+  def get_metric_stocks(self, mocker):
+    stocks = [
+      factories.StockFactory(price=Decimal('1234.56'), per=Decimal('12.34'), market_cap=Decimal('98765432.10'), skip_task=False),
+      factories.StockFactory(price=Decimal('800'), per=Decimal('0'), market_cap=Decimal('15.5'), skip_task=False),
+    ]
+    ignored = factories.StockFactory(skip_task=True)
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks + [ignored]))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+    return stocks
+
+  @pytest.mark.parametrize([
+    'value',
+    'expected',
+  ], [
+    (Decimal('1234.56'), 123456),
+    (Decimal('0.005'), 1),
+    ('-12.3', -1230),
+    (7, 700),
+    (None, None),
+  ], ids=[
+    'decimal-value',
+    'round-half-up',
+    'string-value',
+    'integer-value',
+    'is-none',
+  ])
+  def test_fixed_point_field(self, value, expected):
+    field = models.StockDailyMetrics._meta.get_field('price')
+
+    assert field.get_prep_value(value) == expected
+
+  def test_invalid_fixed_point_value(self):
+    field = models.StockDailyMetrics._meta.get_field('per')
+
+    with pytest.raises(ValidationError):
+      field.to_python('abc')
+
+  @pytest.mark.parametrize([
+    'name',
+    'value',
+    'expected',
+  ], [
+    ('price', '123.45', Decimal('123.45')),
+    ('er', '-12.3', Decimal('-12.3')),
+  ], ids=[
+    'price-field',
+    'er-field',
+  ])
+  def test_fixed_point_form_field(self, name, value, expected):
+    formfield = models.StockDailyMetrics._meta.get_field(name).formfield()
+
+    assert formfield.clean(value) == expected
+
+  @pytest.mark.parametrize([
+    'value',
+  ], [
+    ('1.234', ),
+    ('12345.6', ),
+  ], ids=[
+    'too-many-decimal-places',
+    'too-many-digits',
+  ])
+  def test_invalid_fixed_point_form_value(self, value):
+    formfield = models.StockDailyMetrics._meta.get_field('er').formfield()
+
+    with pytest.raises(ValidationError):
+      formfield.clean(value)
+
+  def test_record(self, get_metric_stocks):
+    stocks = get_metric_stocks
+    target_date = get_date((2024, 4, 1)).date()
+    count = models.StockDailyMetrics.record(date=target_date)
+    records = {obj.stock_id: obj for obj in models.StockDailyMetrics.objects.filter(date=target_date)}
+    raw_values = list(
+      models.StockDailyMetrics.objects.filter(stock=stocks[0]).values_list(Cast('price', IntegerField()), flat=True)
+    )
+
+    assert count == 2
+    assert sorted(records.keys()) == sorted(self.get_pks(stocks))
+    assert records[stocks[0].pk].price == Decimal('1234.56')
+    assert records[stocks[0].pk].per == Decimal('12.34')
+    assert records[stocks[0].pk].market_cap == Decimal('98765432.10')
+    assert records[stocks[1].pk].per == Decimal('0')
+    assert raw_values == [123456]
+
+  def test_record_again_on_same_day(self, get_metric_stocks):
+    stocks = get_metric_stocks
+    target_date = get_date((2024, 4, 1)).date()
+    _ = models.StockDailyMetrics.record(date=target_date)
+    models.Stock.objects.filter(pk=stocks[0].pk).update(price=Decimal('1500'))
+    _ = models.StockDailyMetrics.record(date=target_date)
+    queryset = models.StockDailyMetrics.objects.filter(stock=stocks[0])
 
-  def test_create_response_kwargs_with_no_data(self):
-    kwargs = models.Stock.create_response_kwargs('', None, ['code'])
-    queryset = models.Stock.objects.select_targets().order_by('code')
+    assert queryset.count() == 1
+    assert queryset.get().price == Decimal('1500')
 
-    assert len(list(kwargs['rows'])) == len(queryset)
+  @pytest.mark.parametrize([
+    'from_date',
+    'to_date',
+    'indices',
+  ], [
+    (None, None, [0, 1, 2]),
+    (get_date((2024, 4, 2)), None, [1, 2]),
+    (None, get_date((2024, 4, 2)), [0, 1]),
+    (get_date((2024, 4, 2)), get_date((2024, 4, 2)), [1]),
+  ], ids=[
+    'no-range',
+    'only-from-date',
+    'only-to-date',
+    'both-dates',
+  ])
+  def test_selected_range(self, get_metric_stocks, from_date, to_date, indices):
+    stocks = get_metric_stocks
+    dates = [get_date((2024, 4, day)).date() for day in [1, 2, 3]]
+
+    for target_date in dates:
+      _ = models.StockDailyMetrics.record(date=target_date)
+    queryset = stocks[0].daily_metrics.selected_range(
+      from_date=from_date.date() if from_date else None,
+      to_date=to_date.date() if to_date else None,
+    )
 
-  def test_check_get_choices_as_list(self, mocker):
-    stocks = [
-      factories.StockFactory(code='0101'),
-      factories.StockFactory(code='0202'),
-    ]
-    localized_stocks = [
-      factories.LocalizedStockFactory(name='stock1-en', language_code='en', stock=stocks[0]),
-      factories.LocalizedStockFactory(name='stock1-ja', language_code='ja', stock=stocks[0]),
-      factories.LocalizedStockFactory(name='stock2-en', language_code='en', stock=stocks[1]),
-      factories.LocalizedStockFactory(name='stock2-ja', language_code='ja', stock=stocks[1]),
-    ]
-    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
-    mocker.patch('stock.models.get_language', return_value='en')
-    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
-    data = models.Stock.get_choices_as_list()
+    assert sorted(queryset.values_list('date', flat=True)) == [dates[idx] for idx in indices]
 
-    assert all([
-      all([key in item.keys() for key in ['pk', 'name', 'code']]) for item in data
-    ])
-    assert len(stocks) == len(data)
-    assert all([
-      all([stock.pk == item['pk'], stock.code == item['code'], stock.get_name() == item['name']])
-      for stock, item in zip(stocks, data)
-    ])
+  def test_get_series(self, get_metric_stocks):
+    stocks = get_metric_stocks
+    dates = [get_date((2024, 4, day)).date() for day in [3, 1, 2]]
+
+    for idx, target_date in enumerate(dates):
+      models.Stock.objects.filter(pk=stocks[0].pk).update(price=Decimal(1000 + idx))
+      _ = models.StockDailyMetrics.record(date=target_date)
+    series = stocks[0].daily_metrics.get_series('price')
+    all_series = stocks[1].daily_metrics.get_series()
+    empty_series = stocks[1].daily_metrics.selected_range(from_date=get_date((2025, 1, 1)).date()).get_series('price', 'per')
+
+    assert series == {'date': sorted(dates), 'price': [Decimal('1001'), Decimal('1002'), Decimal('1000')]}
+    assert list(all_series.keys()) == ['date', *models._DAILY_METRIC_FIELDS]
+    assert all([len(values) == 3 for values in all_series.values()])
+    assert empty_series == {'date': [], 'price': [], 'per': []}
+
+  def test_str_function(self, get_metric_stocks):
+    stocks = get_metric_stocks
+    _ = models.StockDailyMetrics.record(date=get_date((2024, 4, 1)).date())
+    instance = models.StockDailyMetrics.objects.get(stock=stocks[0])
+
+    assert str(instance) == f'{stocks[0]}(2024-04-01)'
 
 # ============
 # StockMembers
@@ -1260,8 +2348,10 @@ class TestStockMembers:
       self.class_name.PAYOUT_RATIO.value, self.class_name.PER.value, self.class_name.PBR.value,
       self.class_name.MULTI_PP.value, self.class_name.EPS.value, self.class_name.BPS.value,
       self.class_name.ROE.value, self.class_name.ER.value, self.class_name.MARKET_CAP.value,
-      self.class_name.OPERATING_CASHFLOW.value,
-    ]
+      self.class_name.OPERATING_CASHFLOW.value, self.class_name.PER_VS_INDUSTRY.value,
+      self.class_name.PBR_VS_INDUSTRY.value, self.class_name.ROE_VS_INDUSTRY.value,
+      self.class_name.DIV_YIELD_VS_INDUSTRY.value,
+    ] + self.class_name.get_rank_members()
     # Call target method
     attr_types = self.class_name.get_attribute_types()
     members = self.class_name.values
@@ -1276,12 +2366,16 @@ class TestStockMembers:
       self.class_name.PAYOUT_RATIO.value, self.class_name.PER.value, self.class_name.PBR.value,
       self.class_name.EPS.value, self.class_name.BPS.value, self.class_name.ROE.value,
       self.class_name.ER.value, self.class_name.MARKET_CAP.value, self.class_name.OPERATING_CASHFLOW.value,
-    ]
+    ] + self.class_name.get_rank_members()
     exacts = {
       self.class_name.NAME.value:      type(models.LocalizedStock._meta.get_field('name')),
       self.class_name.INDUSTRY.value:  type(models.LocalizedIndustry._meta.get_field('name')),
       self.class_name.DIV_YIELD.value: models._IgnoredField,
       self.class_name.MULTI_PP.value:  models._IgnoredField,
+      self.class_name.PER_VS_INDUSTRY.value:       models._IgnoredField,
+      self.class_name.PBR_VS_INDUSTRY.value:       models._IgnoredField,
+      self.class_name.ROE_VS_INDUSTRY.value:       models._IgnoredField,
+      self.class_name.DIV_YIELD_VS_INDUSTRY.value: models._IgnoredField,
     }
     exacts.update({key: type(models.Stock._meta.get_field(key)) for key in defaults})
     # Call target method
@@ -1298,8 +2392,10 @@ class TestStockMembers:
       self.class_name.PAYOUT_RATIO.value, self.class_name.PER.value, self.class_name.PBR.value,
       self.class_name.MULTI_PP.value, self.class_name.EPS.value, self.class_name.BPS.value,
       self.class_name.ROE.value, self.class_name.ER.value, self.class_name.MARKET_CAP.value,
-      self.class_name.OPERATING_CASHFLOW.value,
-    ]
+      self.class_name.OPERATING_CASHFLOW.value, self.class_name.PER_VS_INDUSTRY.value,
+      self.class_name.PBR_VS_INDUSTRY.value, self.class_name.ROE_VS_INDUSTRY.value,
+      self.class_name.DIV_YIELD_VS_INDUSTRY.value,
+    ] + self.class_name.get_rank_members()
     exact_string = {key: models.FOR_STRING for key in string_members}
     exact_number = {key: models.FOR_NUMBER for key in number_members}
     # Call target method
@@ -1754,6 +2850,9 @@ class TestPurchasedStock(SharedFixtures, SelectedRangeFixture):
     ('count == 100', [0, 1, 3, 4]),
     ('"2021-02-01T09:00+09:00" < purchase_date and purchase_date < "2021-05-31T09:00+09:00"', [2, 3]),
     ('diff < 0', [1, 2, 5]),
+    ('code in ["0010", "0033"]', [0, 1, 3]),
+    ('industry_name not in ["foo-bar", "foo"]', [4, 5]),
+    ('count in [200, 300]', [2, 5]),
   ], ids=[
     'based-on-code',
     'based-on-name',
@@ -1762,6 +2861,9 @@ class TestPurchasedStock(SharedFixtures, SelectedRangeFixture):
     'based-on-count',
     'based-on-purchase-date',
     'based-on-diff',
+    'code-in-list',
+    'industry-not-in-list',
+    'count-in-list',
   ])
   def test_select_targets_with_tree(self, mocker, get_dummy_pstocks, expression, indices):
     mocker.patch('stock.models.get_language', return_value='en')
@@ -1885,6 +2987,58 @@ class TestPurchasedStockMembers:
     assert all([comp_ops[key] == vals for key, vals in exact_string.items()])
     assert all([comp_ops[key] == vals for key, vals in exact_number.items()])
 
+@pytest.mark.stock
+@pytest.mark.model
+class TestSnapshotRecordMembers:
+  class_name = models.SnapshotRecordMembers
+
+  def test_get_attribute_types(self):
+    string_members = [self.class_name.CODE.value, self.class_name.NAME.value, self.class_name.INDUSTRY.value]
+    # Call target method
+    attr_types = self.class_name.get_attribute_types()
+    members = self.class_name.values
+
+    assert all([key in members for key in attr_types.keys()])
+    assert all([hasattr(models._SnapshotRecord, key) or key in models._SnapshotRecord.__annotations__ for key in members])
+    assert all([attr_types[key] == ('str' if key in string_members else 'number') for key in members])
+
+  def test_get_field_types(self):
+    ignored = [
+      self.class_name.REAL_DIV.value, self.class_name.DIV_YIELD.value, self.class_name.STOCK_YIELD.value,
+      self.class_name.PURCHASED_VALUE.value, self.class_name.DIFF.value,
+    ]
+    # Call target method
+    field_types = self.class_name.get_field_types()
+
+    assert all([isinstance(field_types[key], models._IgnoredField) for key in ignored])
+    assert isinstance(field_types[self.class_name.COUNT.value], type(models.PurchasedStock._meta.get_field('count')))
+    assert isinstance(field_types[self.class_name.PER.value], type(models.Stock._meta.get_field('per')))
+
+  @pytest.mark.parametrize([
+    'condition',
+    'is_valid',
+  ], [
+    ('real_div > 100 and stock_yield < 3.5', True),
+    ('industry in ["foo", "bar"]', True),
+    ('diff < purchased_value / 10', True),
+    ('industry_name == "foo"', False),
+    ('price in "1"', False),
+    ('code in []', False),
+  ], ids=[
+    'computed-properties',
+    'membership-test',
+    'compare-with-arithmetic',
+    'invalid-keyname',
+    'substring-for-number',
+    'empty-list',
+  ])
+  def test_snapshot_record_validator(self, condition, is_valid):
+    if is_valid:
+      models.snapshot_record_validator(condition)
+    else:
+      with pytest.raises(ValidationError):
+        models.snapshot_record_validator(condition)
+
 # ==============
 # SnapshotRecord
 # ==============
@@ -2674,6 +3828,43 @@ class TestSnapshot(SharedFixtures):
 
     assert all([obj.get_record() == exact for obj, exact in zip(rows, expected_rows)])
 
+  @pytest.mark.parametrize([
+    'condition',
+    'expected_codes',
+  ], [
+    ('', ['-', 'A1B3', 'A1CC']),
+    ('price >= 1000', ['-', 'A1B3']),
+    ('industry in "YYY" or count > 300', ['-', 'A1CC']),
+    ('code in ["A1B3", "A1CC"] and purchased_value - price * count > 10000', ['-', 'A1CC']),
+    ('per > 100', ['-']),
+  ], ids=[
+    'no-condition',
+    'single-compare',
+    'or-operator',
+    'membership-test',
+    'no-matched-stocks',
+  ])
+  def test_get_each_record_with_condition(self, mocker, get_user, condition, expected_codes):
+    mocker.patch('stock.models.get_language', return_value='ge')
+    pstocks = [
+      {
+        'stock': {
+          'code': code, 'names': {'ge': f'ge-{code}'}, 'industry': {'names': {'ge': industry}, 'is_defensive': True},
+          'price': price, 'dividend': 1.0, 'payout_ratio': 1.0, 'per': 7.5, 'pbr': 1.2, 'eps': 1.0, 'bps': 1.0,
+          'roe': 1.0, 'er': 1.0, 'market_cap': 1.0, 'operating_cashflow': 1.0,
+        },
+        'price': value,
+        'count': 100,
+      }
+      for code, industry, price, value in [('A1CC', 'ge-YYY', 900.0, 1100.0), ('A1B3', 'ge-XXX', 1200.0, 1234.0)]
+    ]
+    instance = factories.SnapshotFactory(user=get_user)
+    instance.detail = json.dumps({'cash': {'balance': 1000}, 'purchased_stocks': pstocks})
+    instance.save()
+    codes = [record.code for record in instance.get_each_record(condition=condition)]
+
+    assert codes == expected_codes
+
   def test_update_periodic_task(self, get_user):
     user = get_user
     _ = factories.CashFactory.create_batch(2, user=user)
@@ -2838,6 +4029,200 @@ class TestSnapshot(SharedFixtures):
     assert detail_ss3['cash']['balance'] == 2024
     assert detail_ss3['purchased_stocks'][0]['stock']['price'] == 4567
 
+# ==============
+# Screened stock
+# ==============
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestScreenedPks(BaseTestUtils):
+  def test_get_screened_pks(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    pks = models.get_screened_pks('price > 1000', ['-price'])
+
+    assert pks == [stocks[idx].pk for idx in [2, 3, 0]]
+
+  def test_result_is_shared(self):
+    loader = lambda condition, ordering: [3, 1, 2]
+    first = models.get_screened_pks('price > 1000', ['code'], loader=loader)
+    second = models.get_screened_pks('price > 1000\n', ['code'], loader=lambda condition, ordering: [])
+    other = models.get_screened_pks('price > 1000', ['-code'], loader=lambda condition, ordering: [2])
+
+    assert first == [3, 1, 2]
+    assert second == [3, 1, 2]
+    assert other == [2]
+
+  def test_result_is_discarded_after_update(self):
+    _ = models.get_screened_pks('price > 1000', ['code'], loader=lambda condition, ordering: [3, 1, 2])
+    models.bump_stock_data_version()
+    pks = models.get_screened_pks('price > 1000', ['code'], loader=lambda condition, ordering: [1])
+
+    assert pks == [1]
+
+  def test_result_depends_on_language(self):
+    with translation.override('en'):
+      en_pks = models.get_screened_pks('name in "a"', ['name'], loader=lambda condition, ordering: [1, 2])
+    with translation.override('ja'):
+      ja_pks = models.get_screened_pks('name in "a"', ['name'], loader=lambda condition, ordering: [2, 1])
+
+    assert en_pks == [1, 2]
+    assert ja_pks == [2, 1]
+
+  def test_wait_for_other_request(self, mocker, settings):
+    settings.SCREENER_RESULT_POLL_INTERVAL = 0
+    key = models._get_screened_pks_key('price > 1000', ['code'])
+    loader = mocker.Mock(return_value=[1])
+    # Store the result during waiting as if the other request which holds the lock has finished
+    mocker.patch('stock.models.cache.add', return_value=False)
+    mocker.patch('stock.models.time.sleep', side_effect=lambda _: models.cache.set(key, [4, 5]))
+    pks = models.get_screened_pks('price > 1000', ['code'], loader=loader)
+
+    assert pks == [4, 5]
+    assert loader.call_count == 0
+
+  @pytest.mark.parametrize([
+    'lock_timeout',
+    'wait_timeout',
+  ], [
+    (0, 10),
+    (30, 0),
+  ], ids=[
+    'lock-timeout',
+    'wait-timeout',
+  ])
+  def test_lock_timeout(self, mocker, settings, lock_timeout, wait_timeout):
+    settings.SCREENER_RESULT_POLL_INTERVAL = 0
+    settings.SCREENER_RESULT_LOCK_TIMEOUT = lock_timeout
+    settings.SCREENER_RESULT_WAIT_TIMEOUT = wait_timeout
+    key = models._get_screened_pks_key('price > 1000', ['code'])
+    models.cache.set(f'{key}:lock', 1)
+    loader = mocker.Mock(return_value=[1])
+    pks = models.get_screened_pks('price > 1000', ['code'], loader=loader)
+
+    assert pks == [1]
+    assert loader.call_count == 1
+    # The lock owned by the other request is kept
+    assert models.cache.get(f'{key}:lock') == 1
+
+  def test_lock_is_released(self):
+    key = models._get_screened_pks_key('price > 1000', ['code'])
+    loader = lambda condition, ordering: [][0]
+
+    with pytest.raises(IndexError):
+      _ = models.get_screened_pks('price > 1000', ['code'], loader=loader)
+
+    assert models.cache.get(f'{key}:lock') is None
+    assert models.cache.get(key) is None
+
+@pytest.mark.stock
+@pytest.mark.model
+@pytest.mark.django_db
+class TestCursorPaginator(BaseTestUtils):
+  @pytest.fixture
+  def get_ordered_stocks(self):
+    # Use the same prices and the missing names to check the tiebreaker and NULL values
+    records = [('P05', '300', 'beta'), ('P01', '100', 'alpha'), ('P03', '300', None), ('P02', '200', 'gamma'), ('P04', '100', None)]
+    stocks = []
+
+    for code, price, name in records:
+      stock = factories.StockFactory(code=code, price=Decimal(price), skip_task=False)
+
+      if name is not None:
+        _ = factories.LocalizedStockFactory(stock=stock, name=name, language_code='en')
+      stocks += [stock]
+    pks = self.get_pks(stocks)
+
+    return lambda *ordering: models.Stock.objects.select_targets().filter(pk__in=pks).order_by(*ordering)
+
+  @pytest.mark.parametrize([
+    'ordering',
+    'expected',
+  ], [
+    (['code'], ['P01', 'P02', 'P03', 'P04', 'P05']),
+    (['-price'], ['P03', 'P05', 'P02', 'P01', 'P04']),
+    (['price', '-code'], ['P04', 'P01', 'P02', 'P05', 'P03']),
+    (['name'], ['P01', 'P05', 'P02', 'P03', 'P04']),
+    (['-name'], ['P03', 'P04', 'P02', 'P05', 'P01']),
+  ], ids=[
+    'code-asc',
+    'price-desc',
+    'price-asc-and-code-desc',
+    'name-asc',
+    'name-desc',
+  ])
+  def test_walk_pages(self, mocker, get_ordered_stocks, ordering, expected):
+    mocker.patch('stock.models.get_language', return_value='en')
+    paginator = models.CursorPaginator(get_ordered_stocks(*ordering), 2)
+    page_obj = paginator.get_page(None)
+    forward = [page_obj]
+
+    while page_obj.has_next():
+      page_obj = paginator.get_page(page_obj.next_cursor)
+      forward += [page_obj]
+    backward = [page_obj]
+
+    while page_obj.has_previous():
+      page_obj = paginator.get_page(page_obj.previous_cursor)
+      backward += [page_obj]
+
+    assert [obj.code for page in forward for obj in page] == expected
+    assert [obj.code for page in reversed(backward) for obj in page] == expected
+    assert [page.start_index() for page in forward] == [1, 3, 5]
+    assert [page.start_index() for page in backward] == [5, 3, 1]
+
+  @pytest.mark.parametrize([
+    'cursor',
+    'expected',
+    'start_index',
+    'has_previous',
+    'has_next',
+  ], [
+    ('', ['P01', 'P02', 'P03'], 1, False, True),
+    ('1', ['P01', 'P02', 'P03'], 1, False, True),
+    ('axx', ['P01', 'P02', 'P03'], 1, False, True),
+    ('last', ['P03', 'P04', 'P05'], 3, True, False),
+  ], ids=[
+    'no-cursor',
+    'page-number',
+    'invalid-cursor',
+    'last-page',
+  ])
+  def test_get_page(self, get_ordered_stocks, cursor, expected, start_index, has_previous, has_next):
+    paginator = models.CursorPaginator(get_ordered_stocks('code'), 3)
+    page_obj = paginator.get_page(cursor)
+
+    assert [obj.code for obj in page_obj] == expected
+    assert page_obj.start_index() == start_index
+    assert page_obj.has_previous() == has_previous
+    assert page_obj.has_next() == has_next
+
+  def test_cursor_of_deleted_stock(self, get_ordered_stocks):
+    queryset = get_ordered_stocks('code')
+    paginator = models.CursorPaginator(queryset, 2)
+    cursor = paginator.get_page(None).next_cursor
+    models.Stock.objects.filter(code='P02').delete()
+    page_obj = paginator.get_page(cursor)
+
+    assert [obj.code for obj in page_obj] == ['P03', 'P04']
+    assert page_obj.has_previous()
+
+  def test_cursor_with_other_ordering(self, get_ordered_stocks):
+    cursor = models.CursorPaginator(get_ordered_stocks('-price'), 2).get_page(None).next_cursor
+    page_obj = models.CursorPaginator(get_ordered_stocks('code'), 2).get_page(cursor)
+
+    assert [obj.code for obj in page_obj] == ['P01', 'P02']
+    assert not page_obj.has_previous()
+
+  def test_number_of_queries(self, django_assert_num_queries, get_ordered_stocks):
+    paginator = models.CursorPaginator(get_ordered_stocks('-price'), 2)
+    cursor = paginator.get_page(None).next_cursor
+
+    with django_assert_num_queries(1):
+      page_obj = paginator.get_page(cursor)
+      _ = list(page_obj)
+
 # =============
 # StockScreener
 # =============
@@ -2900,6 +4285,349 @@ class TestStockScreener(BaseTestUtils):
     assert out['condition'] == mark_safe(instance.condition)
     assert out['ordering'] == instance.ordering
     assert out['allowed_long_condition']
+    assert out['screener'] == instance.pk
+
+  @pytest.mark.parametrize([
+    'condition',
+    'ordering',
+    'other_condition',
+    'other_ordering',
+    'is_same',
+  ], [
+    ('price <= 1000', '-er', 'price <= 1000', '-er', True),
+    ('price <= 1000', '-er', 'price <= 1000\n', '-er', True),
+    ('price <= 1000', '', 'price <= 1000', 'code', True),
+    ('price <= 1000', '-er', 'price < 1000', '-er', False),
+    ('price <= 1000', '-er', 'price <= 1000', 'er', False),
+  ], ids=[
+    'same-parameters',
+    'with-newline',
+    'default-ordering',
+    'different-condition',
+    'different-ordering',
+  ])
+  def test_get_result_key(self, condition, ordering, other_condition, other_ordering, is_same):
+    instance = factories.StockScreenerFactory.build(condition=condition, ordering=ordering)
+    other = factories.StockScreenerFactory.build(condition=other_condition, ordering=other_ordering)
+
+    assert (instance.get_result_key() == other.get_result_key()) == is_same
+
+  def test_refresh_results(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    screeners = [
+      factories.StockScreenerFactory(condition='price <= 1000', ordering='er'),
+      factories.StockScreenerFactory(condition='price <= 1000\n', ordering='er'),
+      factories.StockScreenerFactory(condition='', ordering='-price'),
+    ]
+    targets = models.StockScreener.objects.filter(pk__in=self.get_pks(screeners))
+    spy = mocker.spy(models.StockScreener, 'get_screened_queryset')
+    count = models.StockScreener.refresh_results(targets)
+    instances = [models.StockScreener.objects.get(pk=obj.pk) for obj in screeners]
+
+    assert count == 3
+    assert spy.call_count == 2
+    assert all([instance.is_refreshed for instance in instances])
+    assert instances[0].matched_stocks == [stocks[4].pk, stocks[1].pk]
+    assert instances[1].matched_stocks == [stocks[4].pk, stocks[1].pk]
+    assert instances[2].matched_stocks == [stocks[idx].pk for idx in [2, 3, 0, 4, 1]]
+    assert [instance.matched_count for instance in instances] == [2, 2, 5]
+
+  def test_get_screened_stocks_from_result(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price <= 1000', ordering='er')
+    instance.update_result([stocks[2].pk, stocks[0].pk])
+    estimated = instance.get_screened_stocks()
+
+    assert isinstance(estimated, models.ScreenedStockList)
+    assert estimated.count() == 2
+    assert [obj.pk for obj in estimated] == [stocks[2].pk, stocks[0].pk]
+
+  @pytest.mark.parametrize([
+    'top_n',
+    'is_refreshed',
+    'expected_indices',
+  ], [
+    (0, False, [3, 2, 0]),
+    (2, False, [3, 2]),
+    (5, False, [3, 2, 0]),
+    (2, True, [3, 2]),
+  ], ids=[
+    'all-stocks',
+    'top-2-from-queryset',
+    'larger-than-matched-stocks',
+    'top-2-from-result',
+  ])
+  def test_get_screened_stocks_with_top_n(self, mocker, pseudo_stock_data, top_n, is_refreshed, expected_indices):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price > 1000', ordering='er', top_n=top_n)
+
+    if is_refreshed:
+      instance.update_result([stocks[idx].pk for idx in [3, 2, 0]])
+    estimated = instance.get_screened_stocks()
+    records = list(estimated)
+
+    assert [obj.pk for obj in records] == [stocks[idx].pk for idx in expected_indices]
+    assert estimated.count() == len(expected_indices)
+
+  def test_top_n_is_applied_to_query(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    top_2 = factories.StockScreenerFactory(condition='price > 1000', ordering='er', top_n=2)
+    every = factories.StockScreenerFactory(condition='price > 1000', ordering='er', top_n=0)
+
+    with CaptureQueriesContext(connection) as context:
+      records = list(top_2.get_screened_stocks())
+    all_records = list(every.get_screened_stocks())
+
+    assert 'LIMIT 2' in context.captured_queries[0]['sql']
+    assert [obj.pk for obj in records] == [stocks[idx].pk for idx in [3, 2]]
+    assert [obj.pk for obj in all_records] == [stocks[idx].pk for idx in [3, 2, 0]]
+
+  def test_stored_result_is_ignored_after_changing_condition(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price <= 1000', ordering='er')
+    instance.update_result([stocks[2].pk, stocks[0].pk])
+    instance.condition = 'price > 1000'
+    estimated = instance.get_screened_stocks()
+
+    assert not instance.is_refreshed
+    assert [obj.pk for obj in estimated] == [stocks[idx].pk for idx in [3, 2, 0]]
+
+  def test_get_referenced_fields(self):
+    instance = factories.StockScreenerFactory.build(condition='price > 1 and name in "a"', ordering='-per,price')
+
+    assert instance.get_referenced_fields() == {'price', 'name', 'per'}
+
+  def test_lookup_field_index(self):
+    screeners = [
+      factories.StockScreenerFactory(condition='price > 1000', ordering='code'),
+      factories.StockScreenerFactory(condition='per < 2', ordering='-price'),
+    ]
+    estimated = models._screener_field_index.lookup(['price'])
+    # Add new screener after building the index
+    instance = factories.StockScreenerFactory(condition='er > 1', ordering='')
+    updated = models._screener_field_index.lookup(['er', 'per'])
+
+    assert set(self.get_pks(screeners)) <= estimated
+    assert instance.pk not in estimated
+    assert {screeners[1].pk, instance.pk} <= updated
+    assert screeners[0].pk not in updated
+
+  @pytest.mark.parametrize([
+    'index',
+    'params',
+    'fields',
+    'expected_count',
+    'expected_ids',
+  ], [
+    (0, {'price': Decimal('900')}, ['price', 'div_yield'], 1, [4, 1, 0]),
+    (1, {'price': Decimal('1100')}, ['price', 'div_yield'], 1, [4]),
+    (1, {'er': Decimal('5')}, ['er'], 1, [1, 4]),
+    (4, {'er': Decimal('7.1')}, ['er'], 0, [4, 1]),
+    (0, {'per': Decimal('0.5')}, ['per', 'multi_pp'], 0, [4, 1]),
+    (0, {'skip_task': True}, None, 0, [4, 1]),
+    (4, {'skip_task': True}, None, 1, [1]),
+  ], ids=[
+    'add-new-stock',
+    'remove-stock',
+    'change-order',
+    'keep-order',
+    'unrelated-field',
+    'not-target-stock',
+    'remove-skipped-stock',
+  ])
+  def test_update_memberships(self, mocker, pseudo_stock_data, index, params, fields, expected_count, expected_ids):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price <= 1000', ordering='er')
+    models.StockScreener.refresh_results(models.StockScreener.objects.filter(pk=instance.pk))
+    models.Stock.objects.filter(pk=stocks[index].pk).update(**params)
+    count = models.StockScreener.update_memberships(stocks[index].pk, fields=fields)
+    instance.refresh_from_db()
+
+    assert count == expected_count
+    assert instance.matched_stocks == [stocks[idx].pk for idx in expected_ids]
+    assert instance.matched_count == len(expected_ids)
+
+  def test_refresh_results_locks_screeners(self, pseudo_stock_data):
+    _ = factories.StockScreenerFactory(condition='price > 1000')
+
+    with CaptureQueriesContext(connection) as ctx:
+      _ = models.StockScreener.refresh_results()
+
+    assert any(['FOR UPDATE' in query['sql'] for query in ctx.captured_queries])
+
+  def test_update_memberships_of_multiple_screeners(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    screeners = [
+      factories.StockScreenerFactory(condition='price <= 1000', ordering='er'),
+      factories.StockScreenerFactory(condition='price <= 1000', ordering='er'),
+      factories.StockScreenerFactory(condition='', ordering='-price'),
+      factories.StockScreenerFactory(condition='per > 1', ordering='code'),
+    ]
+    models.StockScreener.refresh_results(models.StockScreener.objects.filter(pk__in=self.get_pks(screeners)))
+    models.Stock.objects.filter(pk=stocks[0].pk).update(price=Decimal('700'))
+    count = models.StockScreener.update_memberships(stocks[0].pk, fields=['price', 'div_yield'])
+    instances = [models.StockScreener.objects.get(pk=obj.pk) for obj in screeners]
+
+    assert count == 3
+    assert instances[0].matched_stocks == [stocks[idx].pk for idx in [4, 1, 0]]
+    assert instances[1].matched_stocks == [stocks[idx].pk for idx in [4, 1, 0]]
+    assert instances[2].matched_stocks == [stocks[idx].pk for idx in [2, 3, 4, 1, 0]]
+    assert instances[3].matched_stocks == [stocks[idx].pk for idx in [1, 2, 3, 4]]
+
+  def test_ties_are_ordered_by_code(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='', ordering='-industry_name')
+    models.StockScreener.refresh_results(models.StockScreener.objects.filter(pk=instance.pk))
+    instance.refresh_from_db()
+    refreshed = instance.matched_stocks
+    models.Stock.objects.filter(pk=stocks[1].pk).update(price=Decimal('900'))
+    _ = models.StockScreener.update_memberships(stocks[1].pk)
+    instance.refresh_from_db()
+    expected = [stocks[idx].pk for idx in [4, 0, 1, 2, 3]]
+
+    assert refreshed == expected
+    assert models._select_screened_pks('', ['-industry_name']) == expected
+    assert instance.matched_stocks == expected
+
+  def test_stale_screener_is_not_updated(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price <= 1000', ordering='er')
+    count = models.StockScreener.update_memberships(stocks[0].pk)
+    instance.refresh_from_db()
+
+    assert count == 0
+    assert instance.refreshed_at is None
+
+  @pytest.mark.parametrize([
+    'top_n',
+    'expected_codes',
+  ], [
+    (0, [[], [], [], []]),
+    (2, [['040a', '0012'], ['040a', '0012'], ['0033', '005A'], []]),
+  ], ids=[
+    'without-top-codes',
+    'with-top-codes',
+  ])
+  def test_evaluate_screeners(self, mocker, django_assert_num_queries, pseudo_stock_data, top_n, expected_codes):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    screeners = [
+      factories.StockScreenerFactory(condition='price <= 1000', ordering='er'),
+      factories.StockScreenerFactory(condition='price <= 1000', ordering='er'),
+      factories.StockScreenerFactory(condition='', ordering='-price'),
+      factories.StockScreenerFactory(condition='price > 2000 and price < 1000', ordering='code'),
+    ]
+
+    with django_assert_num_queries(1):
+      instances = models.StockScreener.evaluate_screeners(screeners, top_n=top_n)
+
+    assert [obj.live_count for obj in instances] == [2, 2, 5, 0]
+    assert [obj.top_codes for obj in instances] == expected_codes
+
+  def test_top_codes_of_ties(self, mocker, pseudo_stock_data):
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    screeners = [factories.StockScreenerFactory(condition='', ordering='industry_name')]
+    instances = models.StockScreener.evaluate_screeners(screeners, top_n=3)
+
+    assert instances[0].top_codes == ['0033', '005A', '0010']
+
+  def test_evaluate_unsatisfiable_screeners(self, django_assert_num_queries):
+    screeners = [factories.StockScreenerFactory(condition='price > 2000 and price < 1000')]
+
+    with django_assert_num_queries(0):
+      instances = models.StockScreener.evaluate_screeners(screeners, top_n=3)
+
+    assert instances[0].live_count == 0
+    assert instances[0].top_codes == []
+
+  def test_profile(self, mocker, settings, pseudo_stock_data):
+    settings.SCREENER_PROFILE_HISTORY = 2
+    stocks = pseudo_stock_data
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    instance = factories.StockScreenerFactory(condition='price <= 1000 or code in ["0033"]', ordering='-price')
+    profiles = [instance.profile() for _ in range(3)]
+    pks = list(instance.profiles.values_list('pk', flat=True))
+
+    assert pks == [profiles[2].pk, profiles[1].pk]
+    assert profiles[0].condition == instance.condition
+    assert profiles[0].ordering == '-price'
+    assert profiles[0].total_rows == 3
+    assert profiles[0].scanned_rows >= 3
+    assert profiles[0].planning_time is not None
+    assert profiles[0].execution_time is not None
+    assert profiles[0].plan['Plan']['Node Type'] is not None
+    assert all([val >= 0 for val in [profiles[0].parse_time, profiles[0].validate_time, profiles[0].compile_time]])
+
+  def test_profile_for_unsatisfiable_condition(self, django_assert_num_queries):
+    with django_assert_num_queries(0):
+      results = models.profile_condition('price > 5 and price < 3')
+
+    assert results['plan'] is None
+    assert 'execution_time' not in results
+
+  def test_analyze_plan(self):
+    plan = {
+      'Planning Time': 0.5,
+      'Execution Time': 1.5,
+      'Plan': {
+        'Node Type': 'Nested Loop', 'Actual Rows': 3, 'Actual Loops': 1,
+        'Plans': [
+          {'Node Type': 'Seq Scan', 'Relation Name': 'stock_stock', 'Actual Rows': 3, 'Actual Loops': 1, 'Rows Removed by Filter': 7},
+          {'Node Type': 'Index Scan', 'Relation Name': 'stock_industry', 'Index Name': 'stock_industry_pkey', 'Actual Rows': 1, 'Actual Loops': 3},
+        ],
+      },
+    }
+    results = models.analyze_plan(plan)
+
+    assert results['planning_time'] == 0.5
+    assert results['execution_time'] == 1.5
+    assert results['total_rows'] == 3
+    assert results['scanned_rows'] == 13
+    assert results['indexes'] == ['stock_industry_pkey']
+    assert results['seq_scans'] == ['stock_stock']
+
+  def test_refresh_result_after_saving(self, mocker, django_capture_on_commit_callbacks):
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+
+    with django_capture_on_commit_callbacks(execute=True):
+      instance = factories.StockScreenerFactory(condition='price > 1000')
+    args, kwargs = refresh_mock.call_args
+
+    assert refresh_mock.call_count == 1
+    assert kwargs['pk'] == instance.pk
+
+  def test_no_refresh_if_result_is_latest(self, mocker, django_capture_on_commit_callbacks):
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    instance = factories.StockScreenerFactory(condition='price > 1000')
+    instance.update_result([])
+
+    with django_capture_on_commit_callbacks(execute=True):
+      instance.title = 'hoge'
+      instance.save()
+
+    assert refresh_mock.call_count == 0
 
 # ======================
 # Delete related records
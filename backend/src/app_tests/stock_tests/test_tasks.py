@@ -7,7 +7,7 @@ from django_celery_results.models import TaskResult
 from django_celery_beat.models import CrontabSchedule
 from zoneinfo import ZoneInfo
 from app_tests import factories, get_date, BaseTestUtils
-from stock.models import convert_timezone, Snapshot
+from stock.models import convert_timezone, Snapshot, Stock
 
 class FakeLogger:
   def __init__(self):
@@ -144,6 +144,335 @@ class TestTask(BaseTestUtils):
 
     assert checker(ret)
 
+  def test_stock_data_version_is_updated(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    import stock.tasks
+    from stock.models import get_stock_data_version
+    old_version = get_stock_data_version()
+    # Call target function
+    stock.tasks.update_stock_records()
+
+    assert get_stock_data_version() != old_version
+
+  @pytest.mark.parametrize([
+    'total',
+    'is_updated',
+  ], [
+    (1, True),
+    (3, False),
+  ], ids=[
+    'last-task',
+    'remaining-tasks',
+  ])
+  def test_stock_data_version_is_updated_once_per_run(self, mocker, total, is_updated):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.tasks._refresh_localized_names', return_value=None)
+    mocker.patch('stock.tasks._refresh_percentile_ranks', return_value=None)
+    mocker.patch('stock.tasks._refresh_industry_statistics', return_value=None)
+    import stock.tasks
+    from stock.models import get_stock_data_version
+    run_id = stock.tasks.start_update_run()
+    old_version = get_stock_data_version()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=total)
+
+    assert (get_stock_data_version() != old_version) == is_updated
+
+  @pytest.mark.parametrize([
+    'total',
+    'expected',
+  ], [
+    (1, 1),
+    (3, 0),
+  ], ids=[
+    'last-task',
+    'remaining-tasks',
+  ])
+  def test_refresh_screeners_after_finishing_run(self, mocker, total, expected):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=total)
+
+    assert refresh_mock.call_count == expected
+
+  def test_refresh_industry_statistics_after_finishing_run(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    statistics_mock = mocker.patch('stock.models.IndustryStatistics.refresh', return_value=2)
+    info_mock = mocker.patch('stock.tasks.g_logger.info', return_value=None)
+    import stock.tasks
+    from stock.models import get_stock_data_version
+    run_id = stock.tasks.start_update_run()
+    old_version = get_stock_data_version()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+    messages = [args[0] for args, _ in info_mock.call_args_list]
+
+    assert statistics_mock.call_count == 1
+    assert get_stock_data_version() != old_version
+    assert 'The statistics of 2 industries are refreshed.' in messages
+
+  def test_refresh_percentile_ranks_after_finishing_run(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.models.IndustryStatistics.refresh', return_value=0)
+    ranks_mock = mocker.patch('stock.models.Stock.refresh_ranks', return_value=3)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=2)
+    stock.tasks.update_stock_records(run_id=run_id, total=2)
+
+    assert ranks_mock.call_count == 1
+
+  def test_refresh_localized_names_after_finishing_run(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    industry_mock = mocker.patch('stock.models.Industry.refresh_names', return_value=1)
+    stock_mock = mocker.patch('stock.models.Stock.refresh_names', return_value=2)
+    info_mock = mocker.patch('stock.tasks.g_logger.info', return_value=None)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+    messages = [args[0] for args, _ in info_mock.call_args_list]
+
+    assert industry_mock.call_count == 1
+    assert stock_mock.call_count == 1
+    assert 'The localized names of 3 records are refreshed.' in messages
+
+  def test_failed_to_refresh_localized_names(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.models.Industry.refresh_names', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert refresh_mock.call_count == 1
+    assert 'Failed to refresh the localized names(Error).' in fake_logger.msg
+
+  def test_record_daily_metrics_after_finishing_run(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    record_mock = mocker.patch('stock.models.StockDailyMetrics.record', return_value=4)
+    info_mock = mocker.patch('stock.tasks.g_logger.info', return_value=None)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=2)
+    stock.tasks.update_stock_records(run_id=run_id, total=2)
+    messages = [args[0] for args, _ in info_mock.call_args_list]
+
+    assert record_mock.call_count == 1
+    assert 'The daily metrics of 4 stocks are recorded.' in messages
+
+  def test_failed_to_record_daily_metrics(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.models.StockDailyMetrics.record', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert refresh_mock.call_count == 1
+    assert 'Failed to record the daily metrics of stocks(Error).' in fake_logger.msg
+
+  def test_refresh_stock_catalogs_after_finishing_run(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    info_mock = mocker.patch('stock.tasks.g_logger.info', return_value=None)
+    import stock.tasks
+    from stock.catalog import get_catalog
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+    messages = [args[0] for args, _ in info_mock.call_args_list]
+    get_mock = mocker.patch('stock.catalog.StockCatalog.__init__')
+    _ = get_catalog(language='en')
+
+    assert 'The stock catalogs of 2 languages are refreshed.' in messages
+    assert get_mock.call_count == 0
+
+  def test_failed_to_refresh_stock_catalogs(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.tasks.refresh_catalogs', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert refresh_mock.call_count == 1
+    assert 'Failed to refresh the stock catalogs(Error).' in fake_logger.msg
+
+  def test_failed_to_refresh_percentile_ranks(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    statistics_mock = mocker.patch('stock.models.IndustryStatistics.refresh', return_value=0)
+    mocker.patch('stock.models.Stock.refresh_ranks', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert statistics_mock.call_count == 1
+    assert refresh_mock.call_count == 1
+    assert 'Failed to refresh the percentile ranks of stocks(Error).' in fake_logger.msg
+
+  def test_failed_to_refresh_industry_statistics(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    mocker.patch('stock.models.IndustryStatistics.refresh', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert refresh_mock.call_count == 1
+    assert 'Failed to refresh the statistics of industries(Error).' in fake_logger.msg
+
+  def test_refresh_screeners_only_once(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    for idx in range(1, 4):
+      stock.tasks.update_stock_records(run_id=run_id, idx=idx, total=2)
+
+    assert refresh_mock.call_count == 1
+
+  def test_refresh_screeners_when_user_task_fails(self, mocker):
+    mocker.patch('stock.tasks.g_updater', side_effect=Exception('Error'))
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    with pytest.raises(Exception):
+      stock.tasks.update_stock_records(run_id=run_id, total=1)
+
+    assert refresh_mock.call_count == 1
+
+  def test_no_refresh_without_run_id(self, mocker):
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    refresh_mock = mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    import stock.tasks
+    # Call target function
+    stock.tasks.update_stock_records(total=1)
+
+    assert refresh_mock.call_count == 0
+
+  @pytest.mark.parametrize([
+    'specify_pk',
+    'expected',
+  ], [
+    (True, 1),
+    (False, 3),
+  ], ids=[
+    'specific-screener',
+    'all-screeners',
+  ])
+  def test_check_refresh_screener_results(self, mocker, specify_pk, expected):
+    screeners = factories.StockScreenerFactory.create_batch(3, condition='price > 1000')
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.info', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    from stock.models import StockScreener
+    # Call target function
+    stock.tasks.refresh_screener_results(pk=screeners[0].pk if specify_pk else None)
+    instances = StockScreener.objects.filter(pk__in=self.get_pks(screeners))
+
+    assert sum([instance.is_refreshed for instance in instances]) == expected
+    assert f'The results of {expected} screeners are refreshed.' in fake_logger.msg
+
+  @pytest.mark.parametrize([
+    'params',
+    'expected',
+  ], [
+    ({'price': Decimal('900')}, {'price', 'div_yield'}),
+    ({'per': Decimal('3'), 'er': Decimal('2')}, {'per', 'multi_pp', 'er'}),
+    ({'skip_task': True}, None),
+  ], ids=[
+    'change-price',
+    'change-multiple-fields',
+    'remove-from-targets',
+  ])
+  def test_update_screener_memberships(self, mocker, params, expected):
+    instance = factories.StockFactory(price=Decimal('1000'), dividend=Decimal('5'), per=Decimal('1'), pbr=Decimal('2'), er=Decimal('1'), skip_task=False)
+    mocker.patch('stock.tasks.g_updater', side_effect=lambda **kwargs: Stock.objects.filter(pk=kwargs['pk']).update(**params))
+    update_mock = mocker.patch('stock.models.StockScreener.update_memberships', return_value=0)
+    import stock.tasks
+    # Call target function
+    stock.tasks.update_stock_records(pk=instance.pk, code=instance.code)
+    _, kwargs = update_mock.call_args
+    fields = kwargs['fields']
+
+    assert update_mock.call_count == 1
+    assert (set(fields) if fields is not None else None) == expected
+
+  def test_no_membership_update_without_changes(self, mocker):
+    instance = factories.StockFactory(skip_task=False)
+    mocker.patch('stock.tasks.g_updater', return_value=None)
+    update_mock = mocker.patch('stock.models.StockScreener.update_memberships', return_value=0)
+    import stock.tasks
+    # Call target function
+    stock.tasks.update_stock_records(pk=instance.pk, code=instance.code)
+
+    assert update_mock.call_count == 0
+
+  def test_no_membership_update_in_run(self, mocker):
+    instance = factories.StockFactory(price=Decimal('1000'), skip_task=False)
+    mocker.patch('stock.tasks.g_updater', side_effect=lambda **kwargs: Stock.objects.filter(pk=kwargs['pk']).update(price=Decimal('10')))
+    mocker.patch('stock.tasks.refresh_screener_results.delay', return_value=None)
+    values_mock = mocker.patch('stock.tasks._get_screening_values', return_value=None)
+    update_mock = mocker.patch('stock.models.StockScreener.update_memberships', return_value=0)
+    import stock.tasks
+    run_id = stock.tasks.start_update_run()
+    # Call target function
+    stock.tasks.update_stock_records(run_id=run_id, pk=instance.pk, code=instance.code, total=2)
+
+    assert values_mock.call_count == 0
+    assert update_mock.call_count == 0
+
+  def test_failed_to_update_screener_memberships(self, mocker):
+    instance = factories.StockFactory(price=Decimal('1000'), skip_task=False)
+    mocker.patch('stock.tasks.g_updater', side_effect=lambda **kwargs: Stock.objects.filter(pk=kwargs['pk']).update(price=Decimal('10')))
+    mocker.patch('stock.models.StockScreener.update_memberships', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    # Call target function
+    stock.tasks.update_stock_records(pk=instance.pk, code=instance.code)
+
+    assert 'Failed to update the results of screeners(Error).' in fake_logger.msg
+
+  def test_failed_to_refresh_screener_results(self, mocker):
+    mocker.patch('stock.models.StockScreener.refresh_results', side_effect=Exception('Error'))
+    fake_logger = FakeLogger()
+    mocker.patch('stock.tasks.g_logger.error', side_effect=lambda msg: fake_logger.store(msg))
+    import stock.tasks
+    # Call target function
+    stock.tasks.refresh_screener_results()
+
+    assert 'Failed to refresh the results of screeners(Error).' in fake_logger.msg
+
   def test_raise_import_exception(self, mocker):
     import sys
     import importlib
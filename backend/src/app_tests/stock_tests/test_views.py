@@ -1,8 +1,11 @@
 import pytest
+import gzip
 import json
 import urllib.parse
 from pytest_django.asserts import assertTemplateUsed, assertQuerySetEqual
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 from urllib.parse import urlencode
@@ -13,6 +16,7 @@ from app_tests import (
   BaseTestUtils,
 )
 from stock import models
+from stock.views import StockSearchResponse
 
 @pytest.fixture(scope='module')
 def get_stock_records(django_db_blocker):
@@ -158,11 +162,178 @@ class TestStockAjaxResponse(SharedFixture):
     ])
     assert qs_mock.call_count == 1
 
+  def test_not_modified_response(self, client, mocker, get_stock_records):
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(get_stock_records))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    response = client.get(self.stock_ajax_url)
+    etag = response['ETag']
+    not_modified = client.get(self.stock_ajax_url, headers={'If-None-Match': etag})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not etag.startswith('W/')
+    assert 'Last-Modified' in response
+    assert 'no-cache' in response['Cache-Control']
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not_modified['ETag'] == etag
+    assert not_modified.content == b''
+
+  def test_compressed_response(self, client, mocker, get_stock_records):
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(get_stock_records))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    plain = client.get(self.stock_ajax_url)
+    compressed = client.get(self.stock_ajax_url, headers={'Accept-Encoding': 'gzip, deflate'})
+
+    assert compressed['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed['Vary']
+    assert compressed['ETag'] != plain['ETag']
+    assert json.loads(gzip.decompress(compressed.content)) == json.loads(plain.content)
+
+  def test_get_delta(self, client, mocker, get_stock_records):
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(get_stock_records))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    version = json.loads(client.get(self.stock_ajax_url).content)['version']
+    instance = models.LocalizedStock.objects.get(stock__pk=get_stock_records[0].pk, language_code='en')
+    instance.name = 'renamed01'
+    instance.save()
+    response = client.get(self.stock_ajax_url, query_params={'since': version})
+    content = json.loads(response.content)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert content['is_delta']
+    assert content['version'] > version
+    assert content['qs'] == [{'pk': get_stock_records[0].pk, 'name': 'renamed01', 'code': '0001'}]
+
+  @pytest.mark.parametrize([
+    'since',
+  ], [
+    ('', ),
+    ('abc', ),
+    ('0', ),
+  ], ids=[
+    'empty-version',
+    'invalid-version',
+    'too-old-version',
+  ])
+  def test_get_whole_catalog_with_since(self, client, mocker, get_stock_records, since):
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(get_stock_records))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    response = client.get(self.stock_ajax_url, query_params={'since': since})
+    content = json.loads(response.content)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not content['is_delta']
+    assert len(content['qs']) == len(get_stock_records)
+
   def test_post_invalid_access(self, client):
     response = client.post(self.stock_ajax_url)
 
     assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
+# ===================
+# StockSearchResponse
+# ===================
+@pytest.mark.stock
+@pytest.mark.view
+@pytest.mark.django_db
+class TestStockSearchResponse(SharedFixture):
+  search_url = reverse('stock:search_stock')
+
+  @pytest.fixture
+  def get_search_stocks(self):
+    stocks = [
+      factories.StockFactory(code='ZQ01', skip_task=False),
+      factories.StockFactory(code='ZQ02', skip_task=False),
+      factories.StockFactory(code='XZQ3', skip_task=False),
+      factories.StockFactory(code='ZQ04', skip_task=True),
+    ]
+    _ = [
+      factories.LocalizedStockFactory(name='qqw-alpha', language_code='en', stock=stocks[0]),
+      factories.LocalizedStockFactory(name='qqw-beta', language_code='en', stock=stocks[1]),
+      factories.LocalizedStockFactory(name='beta-qqw', language_code='en', stock=stocks[2]),
+      factories.LocalizedStockFactory(name='qqw-gamma', language_code='en', stock=stocks[3]),
+    ]
+
+    return stocks
+
+  @pytest.mark.parametrize([
+    'term',
+    'indices',
+  ], [
+    ('zq0', [0, 1]),
+    ('QQW', [0, 1, 2]),
+    ('qqw-alpha', [0]),
+    ('qqw-gamma', []),
+  ], ids=[
+    'match-code',
+    'prefix-is-prior',
+    'match-name',
+    'skipped-stock',
+  ])
+  def test_search_stocks(self, client, login_process, get_search_stocks, term, indices):
+    _, _ = login_process()
+    response = client.get(self.search_url, query_params={'q': term})
+    data = json.loads(response.content)
+    stocks = get_search_stocks
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item['pk'] for item in data['results']] == [stocks[idx].pk for idx in indices]
+    assert [item['label'] for item in data['results']] == [str(stocks[idx]) for idx in indices]
+
+  @pytest.mark.parametrize([
+    'term',
+    'indices',
+  ], [
+    ('qqw-alpha', []),
+    ('qqw-ja', [0]),
+    ('qqw-beta', [1]),
+  ], ids=[
+    'name-of-default-language-is-hidden',
+    'match-name-of-current-language',
+    'fallback-to-default-language',
+  ])
+  def test_search_localized_names(self, mocker, client, login_process, get_search_stocks, term, indices):
+    mocker.patch('stock.models.get_language', return_value='ja')
+    stocks = get_search_stocks
+    _ = factories.LocalizedStockFactory(name='qqw-ja', language_code='ja', stock=stocks[0])
+    _, _ = login_process()
+    response = client.get(self.search_url, query_params={'q': term})
+    data = json.loads(response.content)
+
+    assert [item['pk'] for item in data['results']] == [stocks[idx].pk for idx in indices]
+
+  def test_wildcards_are_escaped(self, client, login_process, get_search_stocks):
+    _, _ = login_process()
+    response = client.get(self.search_url, query_params={'q': 'qqw%a'})
+    data = json.loads(response.content)
+
+    assert data['results'] == []
+
+  @pytest.mark.parametrize([
+    'language',
+    'index_name',
+  ], [
+    ('en', 'names_en_trgm_idx_in_stock'),
+    ('ja', 'names_ja_en_trgm_idx_in_stock'),
+  ], ids=lambda value: value)
+  def test_search_uses_trigram_indexes(self, mocker, get_search_stocks, language, index_name):
+    mocker.patch('stock.models.get_language', return_value=language)
+    view = StockSearchResponse()
+    queryset = view.search(view.get_queryset(), 'qqw')
+
+    with connection.cursor() as cursor:
+      # Force the planner to search by the indexes because the table is too small to choose them
+      cursor.execute('SET LOCAL enable_seqscan = off')
+      cursor.execute('SET LOCAL enable_indexscan = off')
+      plan = queryset.explain()
+
+    assert 'code_trgm_idx_in_stock' in plan
+    assert index_name in plan
+
+  def test_without_login(self, client, get_search_stocks):
+    response = client.get(self.search_url, query_params={'q': 'zq0'})
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
 # =========
 # CashViews
 # =========
@@ -957,6 +1128,56 @@ class TestSnapshotViews(SharedFixture):
     assert abs(records['A1CC'].purchased_value - 1000.00*300) < 1e-6
     assert records['A1CC'].count == 300
 
+  @pytest.mark.parametrize([
+    'condition',
+    'is_valid',
+    'expected_codes',
+  ], [
+    ('price > 1000', True, ['-', 'B2DD']),
+    ('industry in ["en-YYY"] or count < 100', True, ['-', 'A1CC']),
+    ('price > "abc"', False, ['-', 'A1CC', 'B2DD']),
+  ], ids=[
+    'compare-price',
+    'membership-test',
+    'invalid-condition',
+  ])
+  def test_get_request_to_detailview_with_condition(self, login_process, condition, is_valid, expected_codes):
+    pstocks = [
+      {
+        'stock': {
+          'code': code,
+          'names': {'en': f'en-{code}', 'ge': f'ge-{code}'},
+          'industry': {
+            'names': {'en': f'en-{industry}', 'ge': f'ge-{industry}'},
+            'is_defensive': False,
+          },
+          'price':  price, 'dividend': 0, 'per': 0, 'pbr': 0,
+          'eps': 0, 'bps': 0, 'roe': 0, 'er':  0,
+        },
+        'price': 1000.00,
+        'count': 300,
+      }
+      for code, industry, price in [('A1CC', 'YYY', 900.00), ('B2DD', 'ZZZ', 1500.00)]
+    ]
+    data = json.dumps({
+      'cash': {'balance': 1000},
+      'purchased_stocks': pstocks,
+    })
+    # Setup
+    client, user = login_process(user=factories.UserFactory())
+    user.language_code = 'en'
+    user.save()
+    instance = factories.SnapshotFactory(user=user)
+    instance.detail = data
+    instance.save()
+    response = client.get(self.detail_url(instance.pk), data={'condition': condition})
+    form = response.context['form']
+    codes = [record.code for record in response.context['records']]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert form.is_valid() == is_valid
+    assert codes == expected_codes
+
   # ========
   # CompareView
   # ========
@@ -1371,6 +1592,7 @@ class TestStockScreenerViews(SharedFixture):
   update_url = lambda _self, pk: reverse('stock:update_stock_screener', kwargs={'pk': pk})
   delete_url = lambda _self, pk: reverse('stock:delete_stock_screener', kwargs={'pk': pk})
   detail_url = lambda _self, pk: reverse('stock:detail_stock_screener', kwargs={'pk': pk})
+  profile_url = lambda _self, pk: reverse('stock:profile_stock_screener', kwargs={'pk': pk})
   form_data = {
     'title': 'sample-screener-v1',
     'priority': 10,
@@ -1427,6 +1649,19 @@ class TestStockScreenerViews(SharedFixture):
     assert response.status_code == status.HTTP_200_OK
     assert len(instances) == correct_count
 
+  def test_live_counts_in_listview(self, mocker, login_process, get_pseudo_instances_for_listview):
+    user, screeners = get_pseudo_instances_for_listview
+    evaluator = mocker.patch('stock.models.StockScreener.evaluate_screeners', side_effect=lambda screeners, top_n: screeners)
+    client, user = login_process(user=user)
+    response = client.get(self.list_url)
+    args, kwargs = evaluator.call_args
+
+    assert response.status_code == status.HTTP_200_OK
+    assert evaluator.call_count == 1
+    assert args[0] is response.context['screeners']
+    assert len(args[0]) == 20
+    assert kwargs['top_n'] == 3
+
   # ==========
   # CreateView
   # ==========
@@ -1577,6 +1812,101 @@ class TestStockScreenerViews(SharedFixture):
     assert initial_values.get('condition') == instance.condition
     assert initial_values.get('ordering') == instance.ordering
     assert initial_values.get('allowed_long_condition')
+    assert len(response.context['profiles']) == 0
+
+  @pytest.mark.parametrize([
+    'page',
+    'is_refreshed',
+    'expected_indices',
+  ], [
+    (1, False, [5, 4]),
+    (2, False, [3, 2]),
+    (3, True, [1, 0]),
+    (9, True, [1, 0]),
+  ], ids=[
+    'first-page',
+    'second-page',
+    'last-page-from-result',
+    'out-of-range-page',
+  ])
+  def test_pagination_in_detailview(self, mocker, get_stock_records, login_process, page, is_refreshed, expected_indices):
+    stocks = get_stock_records
+    mocker.patch('stock.views.DetailScreenedStock.paginate_by', 2)
+    client, user = login_process(user=factories.UserFactory())
+    instance = factories.StockScreenerFactory(user=user, condition='price >= 0', ordering='-code')
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+    if is_refreshed:
+      instance.update_result([obj.pk for obj in reversed(stocks)])
+      instance.save()
+    response = client.get(self.detail_url(instance.pk), data={'page': page})
+    targets = response.context['stocks']
+    page_obj = response.context['page_obj']
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.context['is_paginated']
+    assert page_obj.paginator.count == 6
+    assert [obj.pk for obj in targets] == [stocks[idx].pk for idx in expected_indices]
+
+  @pytest.mark.parametrize([
+    'is_refreshed',
+  ], [
+    (False, ),
+    (True, ),
+  ], ids=[
+    'from-queryset',
+    'from-result',
+  ])
+  def test_top_n_in_detailview(self, mocker, get_stock_records, login_process, is_refreshed):
+    stocks = get_stock_records
+    client, user = login_process(user=factories.UserFactory())
+    instance = factories.StockScreenerFactory(user=user, condition='price >= 0', ordering='-code', top_n=3)
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+
+    if is_refreshed:
+      instance.update_result([obj.pk for obj in reversed(stocks)])
+      instance.save()
+    response = client.get(self.detail_url(instance.pk))
+    targets = response.context['stocks']
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not response.context['is_paginated']
+    assert [obj.pk for obj in targets] == [stocks[idx].pk for idx in [5, 4, 3]]
+
+  # ===========
+  # ProfileView
+  # ===========
+  def test_valid_post_access_to_profileview(self, mocker, get_stock_records, login_process):
+    stocks = get_stock_records
+    client, user = login_process(user=factories.UserFactory())
+    instance = factories.StockScreenerFactory(user=user, condition='price > 100', ordering='-price')
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    response = client.post(self.profile_url(instance.pk))
+    profiles = list(instance.profiles.all())
+
+    assert response.status_code == status.HTTP_302_FOUND
+    assert response['Location'] == self.detail_url(instance.pk)
+    assert len(profiles) == 1
+    assert profiles[0].condition == instance.condition
+    assert profiles[0].ordering == '-price'
+
+  def test_invalid_post_access_to_profileview(self, wrap_login):
+    client, _ = wrap_login
+    instance = factories.StockScreenerFactory()
+    response = client.post(self.profile_url(instance.pk))
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert not instance.profiles.exists()
+
+  def test_get_access_to_profileview(self, login_process):
+    client, user = login_process(user=factories.UserFactory())
+    instance = factories.StockScreenerFactory(user=user)
+    response = client.get(self.profile_url(instance.pk))
+
+    assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
 # ==========
 # StockViews
@@ -1626,7 +1956,7 @@ class TestStockViews(SharedFixture):
   ])
   def test_pagination_in_listview(self, mocker, wrap_login, get_pseudo_instances_for_listview, num, correct_count):
     stocks = get_pseudo_instances_for_listview
-    stocks = models.Stock.objects.filter(pk__in=self.get_pks(stocks[:num]))
+    stocks = models.Stock.objects.select_targets().filter(pk__in=self.get_pks(stocks[:num])).order_by('code')
     mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=stocks)
     client, _ = wrap_login
     response = client.get(self.list_url)
@@ -1635,6 +1965,54 @@ class TestStockViews(SharedFixture):
     assert response.status_code == status.HTTP_200_OK
     assert len(instances) == correct_count
 
+  def test_number_of_queries_in_listview(self, mocker, wrap_login, get_pseudo_instances_for_listview):
+    pks = self.get_pks(get_pseudo_instances_for_listview)
+    client, _ = wrap_login
+    counts = []
+    # Load the industry names in advance
+    _ = client.get(self.list_url)
+
+    for num in [10, 150]:
+      queryset = models.Stock.objects.select_targets().filter(pk__in=pks[:num]).order_by('code')
+      mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=queryset)
+
+      with CaptureQueriesContext(connection) as context:
+        response = client.get(self.list_url)
+      counts += [len(context.captured_queries)]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert counts[0] == counts[1]
+
+  def test_cursor_pagination_in_listview(self, mocker, wrap_login, get_pseudo_instances_for_listview):
+    queryset = models.Stock.objects.select_targets().filter(pk__in=self.get_pks(get_pseudo_instances_for_listview)).order_by('-price')
+    pks = list(queryset.order_by('-price', 'code').values_list('pk', flat=True))
+    mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=queryset)
+    client, _ = wrap_login
+    first_page = client.get(self.list_url)
+    next_cursor = first_page.context['page_obj'].next_cursor
+    second_page = client.get(self.list_url, query_params={'page': next_cursor})
+    prev_cursor = second_page.context['page_obj'].previous_cursor
+    prev_page = client.get(self.list_url, query_params={'page': prev_cursor})
+
+    assert next_cursor.startswith('a')
+    assert [obj.pk for obj in second_page.context['stocks']] == pks[150:]
+    assert second_page.context['page_obj'].start_index() == 151
+    assert not second_page.context['page_obj'].has_next()
+    assert [obj.pk for obj in prev_page.context['stocks']] == pks[:150]
+    assert f'page={next_cursor}' in first_page.content.decode('utf-8')
+
+  def test_page_number_pagination_of_screened_stock_list(self, mocker, wrap_login, get_pseudo_instances_for_listview):
+    pks = sorted(self.get_pks(get_pseudo_instances_for_listview))
+    mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=models.ScreenedStockList(pks))
+    client, _ = wrap_login
+    response = client.get(self.list_url, query_params={'page': 2})
+    page_obj = response.context['page_obj']
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not isinstance(page_obj, models.CursorPage)
+    assert [obj.pk for obj in response.context['stocks']] == pks[150:]
+    assert page_obj.number == 2
+
   @pytest.mark.parametrize([
     'query_params',
     'num',
@@ -1651,15 +2029,45 @@ class TestStockViews(SharedFixture):
     stocks = get_stock_records
     client, _ = wrap_login
     exact_qs = models.Stock.objects.filter(pk__in=self.get_pks(stocks[:num]))
-    mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=exact_qs)
+    mocker.patch('stock.forms.StockSearchForm.get_queryset_with_condition', return_value=models.ScreenedStockList(self.get_pks(stocks[:num])))
     mocker.patch('stock.models.get_language', return_value='en')
     response = client.get(self.list_url, query_params=query_params)
 
     assert response.status_code == status.HTTP_200_OK
     assert response.context['form'] is not None
-    assert response.context['stocks'].count() == exact_qs.count()
+    assert len(response.context['stocks']) == exact_qs.count()
     assertQuerySetEqual(response.context['stocks'], exact_qs, ordered=False)
 
+  @pytest.mark.parametrize([
+    'is_staff',
+    'query_params',
+    'has_profiles',
+  ], [
+    (True, {'condition': 'price < 100', 'explain': '1'}, True),
+    (True, {'condition': 'price < 100'}, False),
+    (False, {'condition': 'price < 100', 'explain': '1'}, False),
+    (True, {'condition': 'price << 100', 'explain': '1'}, False),
+  ], ids=[
+    'staff-with-explain',
+    'staff-without-explain',
+    'not-staff-with-explain',
+    'invalid-condition',
+  ])
+  def test_explain_in_listview(self, mocker, login_process, get_stock_records, is_staff, query_params, has_profiles):
+    stocks = get_stock_records
+    queryset = models.Stock.objects.filter(pk__in=self.get_pks(stocks))
+    mocker.patch('stock.models.StockManager.get_queryset', return_value=queryset)
+    client, _ = login_process(user=factories.UserFactory(is_staff=is_staff))
+    response = client.get(self.list_url, query_params=query_params)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert ('profiles' in response.context) == has_profiles
+
+    if has_profiles:
+      profile = response.context['profiles'][0]
+      assert profile['condition'] == 'price < 100'
+      assert profile['execution_time'] is not None
+
   def test_post_invalid_access(self, wrap_login):
     client, _ = wrap_login
     response = client.post(self.list_url)
@@ -1,4 +1,5 @@
 import pytest
+from django.contrib.auth import get_user_model
 from utils import models
 
 @pytest.mark.utils
@@ -52,4 +53,35 @@ class TestStreaming:
     assert callback(out_header)
     assert self.to_joined_str(rows[0]) == self.remove_return_code(_row0)
     assert self.to_joined_str(rows[1]) == self.remove_return_code(_row1)
-    assert self.to_joined_str(rows[2]) == self.remove_return_code(_row2)
\ No newline at end of file
+    assert self.to_joined_str(rows[2]) == self.remove_return_code(_row2)
+
+@pytest.mark.utils
+@pytest.mark.model
+class TestDataVersion:
+  def test_initial_version(self):
+    version = models.get_data_version('hoge')
+
+    assert version is not None
+    assert models.get_data_version('hoge') == version
+
+  def test_bump_version(self):
+    old_version = models.get_data_version('hoge')
+    new_version = models.bump_data_version('hoge')
+
+    assert new_version != old_version
+    assert models.get_data_version('hoge') == new_version
+
+  def test_each_label_is_independent(self):
+    version = models.get_data_version('foo')
+    _ = models.bump_data_version('bar')
+
+    assert models.get_data_version('foo') == version
+
+  def test_model_data_version(self):
+    model = get_user_model()
+    version = models.get_data_version(models.get_model_data_label(model))
+    new_version = models.bump_model_data_version(model)
+
+    assert models.get_model_data_label(model) == 'model:account.user'
+    assert new_version != version
+    assert models.get_data_version(models.get_model_data_label(model)) == new_version
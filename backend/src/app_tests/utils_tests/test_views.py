@@ -0,0 +1,177 @@
+import pytest
+import json
+from django.contrib.auth import get_user_model
+from utils import models, views
+from app_tests import factories
+
+UserModel = get_user_model()
+
+@pytest.mark.utils
+@pytest.mark.view
+@pytest.mark.django_db
+class TestCachedCountPaginator:
+  @pytest.fixture
+  def get_users(self):
+    users = factories.UserFactory.create_batch(5)
+    queryset = UserModel.objects.filter(pk__in=[user.pk for user in users]).order_by('pk')
+
+    return queryset
+
+  def test_count_is_cached(self, mocker, get_users):
+    queryset = get_users
+    count_mock = mocker.patch.object(type(queryset), 'count', return_value=5)
+    counts = [views.CachedCountPaginator(queryset.all(), 2).count for _ in range(3)]
+
+    assert counts == [5, 5, 5]
+    assert count_mock.call_count == 1
+
+  def test_count_is_updated_after_changing_data(self, get_users):
+    queryset = get_users
+    old_count = views.CachedCountPaginator(queryset.all(), 2).count
+    queryset.first().delete()
+    models.bump_model_data_version(UserModel)
+    new_count = views.CachedCountPaginator(queryset.all(), 2).count
+
+    assert old_count == 5
+    assert new_count == 4
+
+  def test_count_depends_on_data_labels(self, get_users):
+    queryset = get_users
+    paginator = views.CachedCountPaginator(queryset.all(), 2, data_labels=['hoge'])
+    key = paginator.get_count_key()
+    models.bump_data_version('hoge')
+
+    assert views.CachedCountPaginator(queryset.all(), 2).get_count_key() != key
+    assert paginator.get_count_key() != key
+
+  def test_count_depends_on_query(self, get_users):
+    queryset = get_users
+    all_users = views.CachedCountPaginator(queryset.all(), 2).count
+    filtered = views.CachedCountPaginator(queryset.filter(pk=queryset.first().pk), 2).count
+
+    assert all_users == 5
+    assert filtered == 1
+
+  @pytest.mark.parametrize([
+    'threshold',
+    'estimated',
+    'expected',
+  ], [
+    (100, 1000, 1000),
+    (100, 99, 5),
+    (0, 1000, 5),
+  ], ids=[
+    'use-estimated-count',
+    'small-estimated-count',
+    'disable-estimation',
+  ])
+  def test_estimated_count(self, mocker, settings, get_users, threshold, estimated, expected):
+    settings.PAGINATOR_ESTIMATE_THRESHOLD = threshold
+    mocker.patch('utils.views.CachedCountPaginator.estimate_count', return_value=estimated)
+    paginator = views.CachedCountPaginator(get_users, 2)
+
+    assert paginator.count == expected
+
+  def test_estimate_count(self, get_users):
+    paginator = views.CachedCountPaginator(get_users, 2)
+
+    assert paginator.estimate_count() >= 0
+
+  def test_list_object(self):
+    paginator = views.CachedCountPaginator([1, 2, 3], 2)
+
+    assert paginator.count == 3
+    assert paginator.num_pages == 2
+
+class _UserSearchView(views.RemoteSearchView):
+  model = UserModel
+  search_fields = ['username', 'screen_name']
+  ordering = ['username']
+  paginate_by = 2
+
+@pytest.mark.utils
+@pytest.mark.view
+@pytest.mark.django_db
+class TestRemoteSearchView:
+  @pytest.fixture
+  def get_users(self):
+    users = [
+      factories.UserFactory(username='remote-beta', screen_name='alpha-remote'),
+      factories.UserFactory(username='remote-alpha', screen_name='beta-remote'),
+      factories.UserFactory(username='alpha-remote', screen_name='gamma-remote'),
+      factories.UserFactory(username='other-user', screen_name='delta-REMOTE'),
+      factories.UserFactory(username='unrelated', screen_name='unrelated'),
+    ]
+
+    return users
+
+  def get_response(self, rf, params):
+    request = rf.get('/search', params)
+    response = _UserSearchView.as_view()(request)
+
+    return json.loads(response.content)
+
+  def test_search_records(self, rf, get_users):
+    first = self.get_response(rf, {'q': 'Remote'})
+    second = self.get_response(rf, {'q': 'Remote', 'page': 2})
+    labels = [item['label'] for item in first['results'] + second['results']]
+
+    # The records which start with the term are prior to the others
+    assert labels == ['beta-remote', 'alpha-remote', 'gamma-remote', 'delta-REMOTE']
+    assert [item['pk'] for item in first['results']] == [get_users[1].pk, get_users[0].pk]
+    assert first['page'] == 1
+    assert first['has_next']
+    assert second['page'] == 2
+    assert not second['has_next']
+
+  @pytest.mark.parametrize([
+    'params',
+    'page',
+  ], [
+    ({}, 1),
+    ({'q': ' '}, 1),
+    ({'q': 'no-matched-term'}, 1),
+    ({'q': 'remote', 'page': 10}, 10),
+  ], ids=[
+    'no-term',
+    'blank-term',
+    'no-matched-records',
+    'out-of-range-page',
+  ])
+  def test_empty_results(self, rf, get_users, params, page):
+    data = self.get_response(rf, params)
+
+    assert data['results'] == []
+    assert data['page'] == page
+    assert not data['has_next']
+
+  @pytest.mark.parametrize([
+    'page',
+  ], [
+    ('abc', ),
+    ('0', ),
+    ('-1', ),
+  ], ids=[
+    'is-string',
+    'is-zero',
+    'is-negative',
+  ])
+  def test_invalid_page(self, rf, get_users, page):
+    data = self.get_response(rf, {'q': 'remote', 'page': page})
+
+    assert data['page'] == 1
+    assert len(data['results']) == 2
+
+  def test_short_term(self, rf, mocker, get_users):
+    mocker.patch.object(_UserSearchView, 'min_length', 3)
+    search_mock = mocker.patch.object(_UserSearchView, 'search')
+    data = self.get_response(rf, {'q': 're'})
+
+    assert data['results'] == []
+    assert search_mock.call_count == 0
+
+  def test_queryset_attribute(self, rf, mocker, get_users):
+    mocker.patch.object(_UserSearchView, 'queryset', UserModel.objects.filter(pk=get_users[2].pk))
+    data = self.get_response(rf, {'q': 'remote'})
+
+    assert [item['pk'] for item in data['results']] == [get_users[2].pk]
@@ -144,6 +144,76 @@ class TestDatalist:
 
     assert 'Invalid data access' in str(ex.value)
 
+@pytest.mark.utils
+@pytest.mark.widget
+class TestRemoteSearchDatalist:
+  @pytest.mark.parametrize([
+    'attrs',
+    'expected',
+  ], [
+    ({'search-url': '/search', 'min-length': 2, 'delay': 100}, ('/search', 2, 100)),
+    (None, ('', 1, 300)),
+  ], ids=[
+    'attrs-exist',
+    'attrs-are-none',
+  ])
+  def test_check_attrs(self, attrs, expected):
+    instance = widgets.RemoteSearchDatalist(attrs=attrs)
+    context = instance.get_context('custom', None, attrs=None)
+    out_attrs = context['widget']['attrs']
+
+    assert instance.use_dataset()
+    assert (instance.search_url, instance.min_length, instance.delay) == expected
+    assert (out_attrs['data-search-url'], out_attrs['data-min-length'], out_attrs['data-delay']) == expected
+    assert out_attrs['autocomplete'] == 'off'
+    assert 'search-url' not in out_attrs
+
+  @pytest.mark.parametrize([
+    'value',
+    'expected',
+  ], [
+    ('foo', ['foo']),
+    ('', []),
+    (None, []),
+  ], ids=[
+    'selected-value',
+    'empty-string',
+    'is-None',
+  ])
+  def test_render_only_selected_choices(self, value, expected):
+    instance = widgets.RemoteSearchDatalist()
+    instance.choices = [('foo', 'Foo'), ('bar', 'Bar'), ('baz', 'Baz')]
+    context = instance.get_context('custom', value, attrs=None)
+    values = [option['value'] for _, options, _ in context['widget']['optgroups'] for option in options]
+
+    assert values == expected
+    assert len(instance.choices) == 3
+
+  @pytest.mark.django_db
+  @pytest.mark.parametrize([
+    'get_value',
+    'count',
+  ], [
+    (lambda users: users[1].pk, 1),
+    (lambda users: 'abc', 0),
+    (lambda users: 0, 0),
+  ], ids=[
+    'valid-pk',
+    'invalid-pk',
+    'no-matched-pk',
+  ])
+  def test_render_only_selected_records(self, django_assert_max_num_queries, get_value, count):
+    users = [UserModel.objects.create_user(username=f'remote-widget{idx}', email=f'remote-widget{idx}@example.com', password='a') for idx in range(3)]
+    field = widgets.ModelDatalistField(queryset=UserModel.objects.all(), widget=widgets.RemoteSearchDatalist)
+    value = get_value(users)
+
+    with django_assert_max_num_queries(1):
+      context = field.widget.get_context('custom', value, attrs=None)
+    options = [option for _, options, _ in context['widget']['optgroups'] for option in options]
+
+    assert len(options) == count
+    assert all([str(option['value']) == str(value) for option in options])
+
 @pytest.mark.utils
 @pytest.mark.widget
 class TestDropdownWithInput:
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     'django.forms',
     'django_celery_results',
     'django_celery_beat',
@@ -205,6 +206,28 @@ NUMBER_GROUPING = 3
 # User definition variables
 CSV_DOWNLOAD_MAX_AGE = 5 * 60
 IS_SECURE_COOKIE = os.getenv('DJANGO_IS_SECURE_COOKIE', 'true').lower() == 'true'
+SCREENER_CONDITION_CACHE_SIZE = 128
+# The number of stock codes shown for each screener in the list page
+SCREENER_LIST_TOP_N = 3
+# The number of profiles kept for each screener
+SCREENER_PROFILE_HISTORY = 30
+USE_COLUMNAR_SCREENER = os.getenv('DJANGO_USE_COLUMNAR_SCREENER', 'false').lower() == 'true'
+# The lifetime (seconds) of the screened results shared between users
+SCREENER_RESULT_CACHE_TIMEOUT = 10 * 60
+# The lifetime (seconds) of the lock held by the request which executes the screening query
+SCREENER_RESULT_LOCK_TIMEOUT = 30
+# The maximum time (seconds) to wait for the result of the other request before executing the query by itself
+# Keep it around the expected query time and far below the request timeout because the worker is blocked while waiting
+SCREENER_RESULT_WAIT_TIMEOUT = float(os.getenv('DJANGO_SCREENER_RESULT_WAIT_TIMEOUT', '1.0'))
+SCREENER_RESULT_POLL_INTERVAL = 0.05
+# The lifetime (seconds) of the numbers of records in the list pages
+PAGINATOR_COUNT_CACHE_TIMEOUT = 5 * 60
+# Use the estimated number of records instead of counting them if it exceeds this value
+PAGINATOR_ESTIMATE_THRESHOLD = 100000
+# The interval (seconds) to check whether the industry names have been changed by the other processes
+INDUSTRY_NAME_CHECK_INTERVAL = 5
+# The number of daily metrics of stocks which are inserted in one query
+STOCK_DAILY_METRICS_BATCH_SIZE = 1000
 
 # Log setting
 LOGGING = {
@@ -3,12 +3,15 @@ from django.utils.translation import gettext_lazy
 from .models import (
   LocalizedIndustry,
   Industry,
+  IndustryStatistics,
+  StockDailyMetrics,
   LocalizedStock,
   Stock,
   Cash,
   PurchasedStock,
   Snapshot,
   StockScreener,
+  ScreenerProfile,
 )
 
 @admin.register(LocalizedIndustry)
@@ -34,6 +37,37 @@ class IndustryAdmin(admin.ModelAdmin):
   def localized_name(self, instance):
     return instance.get_name()
 
+@admin.register(IndustryStatistics)
+class IndustryStatisticsAdmin(admin.ModelAdmin):
+  model = IndustryStatistics
+  fields = [
+    'industry', 'count', 'avg_per', 'median_per', 'avg_pbr', 'median_pbr',
+    'avg_roe', 'median_roe', 'avg_div_yield', 'median_div_yield', 'updated_at',
+  ]
+  readonly_fields = ['updated_at']
+  list_display = ('industry', 'count', 'median_per', 'median_pbr', 'median_roe', 'median_div_yield', 'updated_at')
+  search_fields = ('industry__locals__name',)
+  ordering = ('industry__pk',)
+
+  def get_queryset(self, request):
+    return super().get_queryset(request).select_related('industry')
+
+@admin.register(StockDailyMetrics)
+class StockDailyMetricsAdmin(admin.ModelAdmin):
+  model = StockDailyMetrics
+  fields = [
+    'stock', 'date', 'price', 'dividend', 'per', 'pbr', 'eps', 'bps',
+    'roe', 'er', 'market_cap', 'payout_ratio', 'operating_cashflow',
+  ]
+  list_display = ('stock', 'date', 'price', 'dividend', 'per', 'pbr')
+  search_fields = ('stock__code',)
+  date_hierarchy = 'date'
+  ordering = ('-date', 'stock__code')
+  raw_id_fields = ('stock',)
+
+  def get_queryset(self, request):
+    return super().get_queryset(request).select_related('stock')
+
 @admin.register(LocalizedStock)
 class LocalizedStockAdmin(admin.ModelAdmin):
   model = LocalizedStock
@@ -43,6 +77,9 @@ class LocalizedStockAdmin(admin.ModelAdmin):
   search_fields = ('name', 'language_code')
   ordering = ('pk', 'language_code', 'name')
 
+  def get_queryset(self, request):
+    return super().get_queryset(request).select_related('stock')
+
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
   model = Stock
@@ -75,6 +112,9 @@ class PurchasedStockAdmin(admin.ModelAdmin):
   search_fields = ('user__username', 'user__screen_name', 'stock__code', 'purchase_date')
   ordering = ('-purchase_date', 'stock__code')
 
+  def get_queryset(self, request):
+    return super().get_queryset(request).select_related('user', 'stock')
+
 @admin.register(Snapshot)
 class SnapshotAdmin(admin.ModelAdmin):
   model = Snapshot
@@ -91,4 +131,16 @@ class StockScreenerAdmin(admin.ModelAdmin):
   list_display = ('user', 'title', 'priority')
   list_filter = ('user',)
   search_fields = ('user__username', 'user__screen_name', 'title', 'priority')
-  ordering = ('priority', 'title')
\ No newline at end of file
+  ordering = ('priority', 'title')
+
+@admin.register(ScreenerProfile)
+class ScreenerProfileAdmin(admin.ModelAdmin):
+  model = ScreenerProfile
+  fields = [
+    'screener', 'condition', 'ordering', 'parse_time', 'validate_time', 'compile_time', 'planning_time',
+    'execution_time', 'total_rows', 'scanned_rows', 'indexes', 'seq_scans', 'plan', 'created_at',
+  ]
+  list_display = ('screener', 'planning_time', 'execution_time', 'scanned_rows', 'created_at')
+  list_filter = ('screener__user',)
+  search_fields = ('screener__title', 'condition')
+  ordering = ('-created_at',)
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.translation import get_language
+from . import models
+import gzip
+import json
+
+def _get_catalog_key(language):
+  return f'stock-catalog:{language}'
+
+def _dumps(data):
+  return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+class StockCatalog:
+  def __init__(self, language, previous=None):
+    # The catalog is rebuilt whenever the stock data is changed but its version is updated only if the contents are changed
+    self.language = language
+    self.source = models.get_stock_data_version()
+    self.records = {
+      item['pk']: (item['name'], item['code'])
+      for item in models.Stock.get_choices_as_list(language=language)
+    }
+
+    if previous is None:
+      # The differences from the older versions are unknown
+      self.version = self.source
+      self.base_version = self.source
+      self.changes = {}
+      self.removed = {}
+    else:
+      changed = [pk for pk, record in self.records.items() if previous.records.get(pk) != record]
+      removed = [pk for pk in previous.records.keys() if pk not in self.records]
+      self.version = self.source if changed or removed else previous.version
+      self.base_version = previous.base_version
+      self.changes = {pk: version for pk, version in previous.changes.items() if pk in self.records}
+      self.changes.update({pk: self.version for pk in changed})
+      self.removed = {pk: version for pk, version in previous.removed.items() if pk not in self.records}
+      self.removed.update({pk: self.version for pk in removed})
+    # Precompute the payload of the whole catalog
+    self.content = _dumps(self.get_data())
+    self.compressed_content = gzip.compress(self.content)
+
+  @property
+  def last_modified(self):
+    # The version is the timestamp in nanoseconds
+    return self.version // 10**9
+
+  def _to_dict(self, pk):
+    name, code = self.records[pk]
+
+    return {'pk': pk, 'name': name, 'code': code}
+
+  def is_delta_available(self, since):
+    return since is not None and since >= self.base_version
+
+  def get_data(self, since=None):
+    if self.is_delta_available(since):
+      pks = [pk for pk, version in self.changes.items() if version > since]
+      removed = sorted([pk for pk, version in self.removed.items() if version > since])
+    else:
+      pks = self.records.keys()
+      removed = []
+    data = {
+      'version': self.version,
+      'is_delta': self.is_delta_available(since),
+      'qs': [self._to_dict(pk) for pk in sorted(pks)],
+      'removed': removed,
+    }
+
+    return data
+
+  def get_etag(self, since=None, is_compressed=False):
+    # Use the strong entity tag which depends on the representation of the response
+    since = since if self.is_delta_available(since) else 'all'
+    suffix = '-gzip' if is_compressed else ''
+
+    return f'"{self.language}-{since}-{self.version}{suffix}"'
+
+  def get_content(self, since=None, is_compressed=False):
+    if self.is_delta_available(since):
+      content = _dumps(self.get_data(since))
+
+      if is_compressed:
+        content = gzip.compress(content)
+    else:
+      content = self.compressed_content if is_compressed else self.content
+
+    return content
+
+def get_catalog(language=None):
+  language = language or get_language()
+  key = _get_catalog_key(language)
+  catalog = cache.get(key)
+
+  if catalog is None or catalog.source != models.get_stock_data_version():
+    # Rebuild the catalog from the previous one to keep the differences
+    catalog = StockCatalog(language, previous=catalog)
+    cache.set(key, catalog, timeout=None)
+
+  return catalog
+
+def refresh_catalogs():
+  catalogs = [get_catalog(language=code) for code, _ in settings.LANGUAGES]
+
+  return len(catalogs)
@@ -0,0 +1,234 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank
+from django.utils.translation import get_language
+from . import models
+import ast
+import threading
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+def is_available():
+  return np is not None
+
+def is_enabled():
+  return is_available() and getattr(settings, 'USE_COLUMNAR_SCREENER', False)
+
+def _is_nullable_column(name):
+  # The negated lookup of the nullable column also matches null values (the one of the annotation does not)
+  try:
+    is_nullable = models.Stock._meta.get_field(name).null
+  except FieldDoesNotExist:
+    is_nullable = False
+
+  return is_nullable
+
+class ColumnStore:
+  def __init__(self, version=None):
+    attr_types = models.StockMembers.get_attribute_types()
+    fields = list(attr_types.keys())
+    # Use the rank of each string in the collation of the database as its sort key
+    ranks = {
+      f'{name}_collation_rank': Window(DenseRank(), order_by=F(name).asc())
+      for name, attr_type in attr_types.items() if attr_type == 'str'
+    }
+    queryset = models.Stock.objects.select_targets().annotate(**ranks).order_by('code')
+    records = list(queryset.values_list('pk', *fields, *ranks.keys()))
+    columns = list(zip(*records)) if records else [()] * (len(fields) + len(ranks) + 1)
+    rank_columns = dict(zip(ranks.keys(), columns[len(fields) + 1:]))
+    # Each row is sorted by stock code
+    self.version = version
+    self.pks = np.array(columns[0], dtype=np.int64)
+    self.columns = {}
+    self.nulls = {}
+    self.sort_keys = {}
+    self.negated_nulls = {}
+
+    for name, values in zip(fields, columns[1:]):
+      nulls = np.array([val is None for val in values], dtype=bool)
+
+      if attr_types[name] == 'str':
+        column = np.array(['' if val is None else val for val in values], dtype=np.str_)
+        # Move null values to the last position
+        sort_key = np.where(nulls, len(column) + 1, np.array(rank_columns[f'{name}_collation_rank'], dtype=np.float64))
+      else:
+        column = np.array([0 if val is None else val for val in values], dtype=np.float64)
+        sort_key = np.where(nulls, np.inf, column)
+      self.columns[name] = column
+      self.nulls[name] = nulls
+      self.sort_keys[name] = sort_key
+      self.negated_nulls[name] = _is_nullable_column(name)
+    self.index = {code: idx for idx, code in enumerate(self.columns[models.StockMembers.CODE.value])}
+
+  def __len__(self):
+    return len(self.pks)
+
+  def get_column(self, name):
+    column = self.columns[name]
+
+    if column.dtype.kind == 'U':
+      caster = str
+    else:
+      caster = float
+
+    return column, ~self.nulls[name], caster
+
+  def filtering(self, tree=None):
+    if tree is None:
+      mask = np.ones(len(self), dtype=bool)
+    else:
+      visitor = _ColumnarConditionVisitor(self)
+      visitor.visit(tree)
+      mask = visitor.mask
+
+    return mask
+
+  def argsort(self, mask, ordering):
+    rows = np.flatnonzero(mask)
+    # The last key is given priority in numpy.lexsort and the row index is used as tiebreaker
+    keys = [rows]
+
+    for order in reversed(ordering):
+      name = str(order)
+      is_desc = name.startswith('-')
+      sort_key = self.sort_keys[name.lstrip('-')][rows]
+      keys += [-sort_key if is_desc else sort_key]
+    indices = rows[np.lexsort(keys)]
+
+    return indices
+
+  def select(self, tree=None, ordering=None):
+    mask = self.filtering(tree)
+    indices = self.argsort(mask, ordering or [models.StockOrderingTypes.CODE_ASC.value])
+    pks = self.pks[indices].tolist()
+
+    return pks
+
+class _ColumnarConditionVisitor(models._BaseConditionVisitor):
+  def __init__(self, store, *args, **kwargs):
+    self.store = store
+    self.mask = None
+    self._comp_op_callbacks = {
+      ast.Eq:    lambda column, val: column == val,
+      ast.NotEq: lambda column, val: column != val,
+      ast.Lt:    lambda column, val: column < val,
+      ast.LtE:   lambda column, val: column <= val,
+      ast.Gt:    lambda column, val: column > val,
+      ast.GtE:   lambda column, val: column >= val,
+      ast.In:    lambda column, val: np.char.find(column, val) >= 0,
+      ast.NotIn: lambda column, val: np.char.find(column, val) < 0,
+    }
+    self._bin_op_callbacks = {
+      ast.Add:  np.add,
+      ast.Sub:  np.subtract,
+      ast.Mult: np.multiply,
+      ast.Div:  np.divide,
+    }
+    super().__init__(*args, **kwargs)
+
+  def _evaluate(self, node):
+    if isinstance(node, ast.Name):
+      column, not_null, _ = self.store.get_column(node.id)
+    elif isinstance(node, ast.Constant):
+      column, not_null = node.value, True
+    else:
+      lhs, lhs_not_null = self._evaluate(node.left)
+      rhs, rhs_not_null = self._evaluate(node.right)
+      not_null = lhs_not_null & rhs_not_null
+
+      if isinstance(node.op, ast.Div):
+        # Division by zero is treated as null as with SQL
+        not_null = not_null & (rhs != 0)
+        rhs = np.where(rhs != 0, rhs, 1)
+      column = self._bin_op_callbacks[type(node.op)](lhs, rhs)
+
+    return column, not_null
+
+  def callback_expression(self, left_item, comp_op, right_item):
+    lhs, lhs_not_null = self._evaluate(left_item)
+    rhs, rhs_not_null = self._evaluate(right_item)
+    callback = self._comp_op_callbacks[type(comp_op)]
+    mask = callback(lhs, rhs) & lhs_not_null & rhs_not_null
+    self.stack.append(np.broadcast_to(mask, (len(self.store), )))
+
+  def callback_compare(self, comp_op):
+    # Note: the right item position is upper than left item one because of using stack
+    val = self.stack.pop()
+    name = self.stack.pop()
+    column, not_null, caster = self.store.get_column(name)
+    # Check whether each value is one of the listed values
+    if isinstance(val, list):
+      mask = np.isin(column, [caster(item) for item in val])
+
+      if isinstance(comp_op, ast.NotIn):
+        mask = ~mask
+      mask = mask & not_null
+    else:
+      # Null values do not match any conditions as with SQL
+      mask = self._comp_op_callbacks[type(comp_op)](column, caster(val)) & not_null
+    # Null values of the nullable column match the negated condition as with Django's query
+    if isinstance(comp_op, (ast.NotEq, ast.NotIn)) and self.store.negated_nulls[name]:
+      mask = mask | ~not_null
+    self.stack.append(mask)
+
+  # Assumption: top module name is an expression
+  def visit_Expression(self, node):
+    self.mask = None
+    super().visit_Expression(node)
+    self.visit(node.body)
+    self.mask = self.stack.pop()
+
+    return node
+
+  def visit_BoolOp(self, node):
+    super().visit_BoolOp(node)
+    # Create mask
+    operator = np.logical_or if isinstance(node.op, ast.Or) else np.logical_and
+    masks = [self.stack.pop() for _ in node.values]
+    self.stack.append(operator.reduce(masks))
+
+    return node
+
+  def visit_Compare(self, node):
+    super().visit_Compare(node)
+    count = len(node.comparators)
+    mask = self.stack.pop()
+    # Bind multi comparison
+    for _ in range(count - 1):
+      mask = mask & self.stack.pop()
+    # Store added items
+    self.stack.append(mask)
+
+    return node
+
+_lock = threading.Lock()
+_stores = {}
+
+def get_store():
+  # Localized names depend on the current language
+  language = get_language()
+  version = models.get_stock_data_version()
+  store = _stores.get(language, None)
+
+  if store is None or store.version != version:
+    with _lock:
+      store = _stores.get(language, None)
+      # Rebuild the store if stock data has been changed
+      if store is None or store.version != version:
+        store = ColumnStore(version=version)
+        _stores[language] = store
+
+  return store
+
+def clear_stores():
+  with _lock:
+    _stores.clear()
+
+def screen(compiled, ordering):
+  pks = get_store().select(tree=compiled.tree, ordering=ordering)
+
+  return models.ScreenedStockList(pks)
@@ -3,17 +3,19 @@ from django.core.validators import FileExtensionValidator
 from django.db import transaction
 from django.db.utils import IntegrityError
 from django.utils.translation import gettext_lazy
+from django.urls import reverse_lazy
 from django_celery_beat.models import CrontabSchedule, PeriodicTask
 from utils.forms import ModelFormBasedOnUser, BaseModelDatalistForm
+from utils.models import bump_model_data_version
 from utils.widgets import (
   SelectWithDataAttr,
   DropdownWithInput,
-  Datalist,
+  RemoteSearchDatalist,
   ModelDatalistField,
   DropdownField,
   CustomRadioSelect,
 )
-from . import models
+from . import models, columnar
 from io import TextIOWrapper
 import csv
 import json
@@ -73,10 +75,10 @@ class PurchasedStockForm(BaseModelDatalistForm, _BaseModelFormWithCSS):
     model = models.PurchasedStock
     fields = ('stock', 'price', 'purchase_date', 'count', 'has_been_sold')
     widgets = {
-      'stock': Datalist(attrs={
+      'stock': RemoteSearchDatalist(attrs={
         'id': 'stock-id',
-        'use-dataset': True,
         'class': 'form-control',
+        'search-url': reverse_lazy('stock:search_stock'),
       }),
       'purchase_date': forms.DateInput(attrs={
         'id': 'purchase-date-id',
@@ -88,7 +90,8 @@ class PurchasedStockForm(BaseModelDatalistForm, _BaseModelFormWithCSS):
     datalist_kwargs = {
       'stock': {
         'label': gettext_lazy('Stock'),
-        'queryset': models.Stock.objects.none(),
+        # Only the selected stock is rendered because the widget searches the stocks on demand
+        'queryset': models.Stock.objects.all(),
       },
     }
 
@@ -250,6 +253,8 @@ class UploadCsvPurchasedStockForm(forms.Form):
       ]
       with transaction.atomic():
         instances = models.PurchasedStock.objects.bulk_create(enabled_items)
+      # The signals are not sent by bulk_create
+      bump_model_data_version(models.PurchasedStock)
     except IntegrityError as ex:
       error = forms.ValidationError(
         gettext_lazy('Include invalid records. Please check the detail: %(ex)s.'),
@@ -607,13 +612,20 @@ class StockSearchForm(forms.Form):
   def get_queryset_with_condition(self):
     if self.is_valid():
       data = self.cleaned_data.get('condition', '')
-      tree = models.get_tree(data)
+      compiled = models.compile_condition(data)
     else:
-      tree = None
+      data = ''
+      compiled = models.CompiledCondition(None)
     # Get ordering of queryset
     ordering = self.cleaned_data.get('ordering') or [models.StockOrderingTypes.CODE_ASC]
-    # Get queryset
-    queryset = models.Stock.objects.select_targets(tree=tree).order_by(*ordering)
+    # Share the screened stocks with the other views via the result cache
+    if columnar.is_enabled():
+      loader = lambda condition, ordering: columnar.screen(compiled, ordering).pks
+    else:
+      loader = None
+    pks = models.get_screened_pks(data, ordering, loader=loader)
+    # The cached stocks are paginated by the keyset of the ordering without evaluating the condition again
+    queryset = models.Stock.objects.select_targets().filter(pk__in=pks).order_by(*ordering)
 
     return queryset
 
@@ -676,14 +688,41 @@ class PurchasedStockFilteringForm(forms.Form):
   def get_queryset_with_condition(self, user):
     if self.is_valid():
       data = self.cleaned_data.get('condition', '')
-      tree = models.get_tree(data)
+      compiled = models.compile_condition(data)
     else:
-      tree = None
+      compiled = models.CompiledCondition(None)
     # Get queryset
-    queryset = user.purchased_stocks.select_targets(tree=tree)
+    queryset = user.purchased_stocks.select_targets(tree=compiled.tree, condition=compiled.condition)
 
     return queryset
 
+class SnapshotRecordFilteringForm(forms.Form):
+  condition = forms.CharField(
+    label=gettext_lazy('Condition'),
+    max_length=1024,
+    empty_value='',
+    required=False,
+    widget=forms.TextInput(attrs={
+      'class': 'form-control',
+      'id': 'condition',
+      'name': 'condition',
+    }),
+    validators=[models.snapshot_record_validator],
+  )
+
+  def __init__(self, *args, **kwargs):
+    params = kwargs.pop('data', {})
+    # Convert message
+    for key, val in params.items():
+      target = val.encode('utf-8', 'ignore')
+      params[key] = urllib.parse.unquote(target)
+    super().__init__(*args, data=params, **kwargs)
+
+  def get_condition(self):
+    condition = self.cleaned_data.get('condition', '') if self.is_valid() else ''
+
+    return condition
+
 class StockDownloadForm(forms.Form):
   template_name = 'renderer/custom_form.html'
 
@@ -722,6 +761,11 @@ class StockDownloadForm(forms.Form):
     initial=False,
     widget=forms.HiddenInput(),
   )
+  screener = forms.IntegerField(
+    label=gettext_lazy('Stock screener'),
+    required=False,
+    widget=forms.HiddenInput(),
+  )
 
   def __init__(self, *args, max_condition_length=1024, **kwargs):
     self.max_condition_length = max_condition_length
@@ -744,6 +788,20 @@ class StockDownloadForm(forms.Form):
 
     return query_string
 
+  def get_stored_pks(self, condition, ordering):
+    pk = self.cleaned_data.get('screener')
+    instance = models.StockScreener.objects.filter(pk=pk).first() if pk else None
+    pks = None
+    # Use the materialized result only if it was created by the same condition and ordering
+    if instance is not None and instance.is_refreshed:
+      is_same_condition = models.normalize_condition(instance.condition) == models.normalize_condition(condition)
+      is_same_ordering = instance.get_ordering() == list(ordering)
+
+      if is_same_condition and is_same_ordering:
+        pks = instance.matched_stocks
+
+    return pks
+
   def create_response_kwargs(self):
     filename = self.cleaned_data.get('filename', '').replace('.csv', '')
     ordering = self.cleaned_data.get('ordering', '')
@@ -753,9 +811,10 @@ class StockDownloadForm(forms.Form):
     try:
       # Check condition
       models.stock_validator(data)
-      tree = models.get_tree(data)
+      compiled = models.compile_condition(data)
     except forms.ValidationError:
-      tree = None
+      data = ''
+      compiled = models.CompiledCondition(None)
     # Check ordering
     if ordering:
       try:
@@ -764,15 +823,19 @@ class StockDownloadForm(forms.Form):
       except forms.ValidationError:
         qs_order = [models.StockOrderingTypes.CODE_ASC.value]
     # Create response kwargs
-    kwargs = models.Stock.create_response_kwargs(filename, tree, qs_order)
+    pks = self.get_stored_pks(data, qs_order)
+    # Share the result with the other users who use the same condition and ordering
+    if pks is None:
+      pks = models.get_screened_pks(data, qs_order)
+    kwargs = models.Stock.create_response_kwargs(filename, compiled.tree, qs_order, condition=compiled.condition, pks=pks)
 
     return kwargs
 
 class StockScreenerForm(_BaseModelFormWithCSS):
   class Meta:
     model = models.StockScreener
-    fields = ('title', 'priority', 'condition', 'ordering')
-    field_order = ('title', 'priority', 'condition', 'ordering', 'target', 'compop', 'inputs')
+    fields = ('title', 'priority', 'top_n', 'condition', 'ordering')
+    field_order = ('title', 'priority', 'top_n', 'condition', 'ordering', 'target', 'compop', 'inputs')
     widgets = {
       'condition': forms.Textarea(attrs={
         'class': 'h-100',
@@ -794,6 +857,13 @@ class StockScreenerForm(_BaseModelFormWithCSS):
   def ordering_types(self):
     return models.StockOrderingTypes.choices
 
+  top_n = forms.IntegerField(
+    label=gettext_lazy('The number of stocks to show'),
+    help_text=gettext_lazy('Only the first N stocks in the ordering are shown. 0 means all stocks.'),
+    min_value=0,
+    required=False,
+  )
+
   target = forms.ChoiceField(
     label=gettext_lazy('Target column name'),
     choices=models.StockMembers.choices,
@@ -824,4 +894,10 @@ class StockScreenerForm(_BaseModelFormWithCSS):
       'class': 'form-control',
       'id': 'input-data',
     }),
-  )
\ No newline at end of file
+  )
+
+  def clean_top_n(self):
+    # Show all stocks if the value is not given
+    top_n = self.cleaned_data.get('top_n') or 0
+
+    return top_n
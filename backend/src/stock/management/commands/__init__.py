@@ -1,14 +1,18 @@
-from stock.tasks import update_stock_records
+from stock.tasks import update_stock_records, start_update_run
 
-def run_stock_task(idx, total, stock):
+def run_stock_task(idx, total, stock, run_id=None):
   kwargs = {
     'idx': idx,
     'pk': stock.pk,
     'code': stock.code,
     'total': total,
   }
+  # Identifier to detect the end of all tasks
+  if run_id is not None:
+    kwargs['run_id'] = run_id
   update_stock_records.apply_async(kwargs=kwargs)
 
 __all__ = [
   'run_stock_task',
+  'start_update_run',
 ]
\ No newline at end of file
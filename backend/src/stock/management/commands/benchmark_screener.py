@@ -0,0 +1,82 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy
+from stock.models import Stock, StockOrderingTypes, stock_validator, stock_ordering_validator, compile_condition
+from stock import columnar
+import time
+
+class Command(BaseCommand):
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--condition',
+      dest='condition',
+      type=str,
+      default='',
+      help=gettext_lazy('Condition to screen stocks'),
+    )
+    parser.add_argument(
+      '--ordering',
+      dest='ordering',
+      type=str,
+      default=StockOrderingTypes.CODE_ASC.value,
+      help=gettext_lazy('Ordering of stocks (multiple orderings may be specified, separated by commas)'),
+    )
+    parser.add_argument(
+      '--repeat',
+      dest='repeat',
+      type=int,
+      default=10,
+      help=gettext_lazy('The number of repetitions'),
+    )
+
+  def measure(self, callback, repeat):
+    elapsed_times = []
+
+    for _ in range(repeat):
+      start = time.perf_counter()
+      pks = callback()
+      elapsed_times += [time.perf_counter() - start]
+    elapsed = sum(elapsed_times) / len(elapsed_times) * 1000
+
+    return pks, elapsed
+
+  def handle(self, *args, **options):
+    condition = options.get('condition')
+    ordering = StockOrderingTypes.separate(options.get('ordering'))
+    repeat = max(options.get('repeat'), 1)
+
+    # Pre-process
+    if not columnar.is_available():
+      raise CommandError(str(gettext_lazy('Error: numpy is not installed.')))
+    try:
+      stock_validator(condition)
+      stock_ordering_validator(ordering)
+    except ValidationError as ex:
+      raise CommandError(' '.join(ex.messages))
+    compiled = compile_condition(condition)
+
+    # Main process
+    start = time.perf_counter()
+    store = columnar.ColumnStore()
+    build_time = (time.perf_counter() - start) * 1000
+    sql_pks, sql_time = self.measure(
+      lambda: list(Stock.objects.select_targets(condition=compiled.condition).order_by(*ordering).values_list('pk', flat=True)),
+      repeat,
+    )
+    numpy_pks, numpy_time = self.measure(lambda: store.select(tree=compiled.tree, ordering=ordering), repeat)
+
+    # Post process
+    lines = [
+      gettext_lazy('Rows in store: %(total)s (built in %(elapsed).2f ms)') % {'total': len(store), 'elapsed': build_time},
+      gettext_lazy('SQL:   %(count)s rows, %(elapsed).2f ms/query') % {'count': len(sql_pks), 'elapsed': sql_time},
+      gettext_lazy('NumPy: %(count)s rows, %(elapsed).2f ms/query') % {'count': len(numpy_pks), 'elapsed': numpy_time},
+    ]
+    for message in lines:
+      self.stdout.write(str(message))
+
+    if set(sql_pks) == set(numpy_pks):
+      message = gettext_lazy('Both engines return the same stocks (speedup: x%(ratio).1f).') % {'ratio': sql_time / max(numpy_time, 1e-9)}
+      self.stdout.write(self.style.SUCCESS(str(message)))
+    else:
+      message = gettext_lazy('Warning: The screened stocks are different between the engines.')
+      self.stdout.write(self.style.WARNING(str(message)))
@@ -0,0 +1,227 @@
+from django.core.management.base import BaseCommand
+from django.core.validators import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy
+from stock.models import (
+  FOR_NUMBER,
+  StockMembers,
+  get_tree,
+  _is_number,
+  _BaseConditionVisitor,
+  _ValidateCondition,
+  _stock_validation_schema,
+)
+import ast
+import random
+import time
+
+class _LegacyValidateCondition(_BaseConditionVisitor):
+  # Private copy of the validator before the schema was precompiled, which is used as the baseline
+  def __init__(self, fields, comp_ops, *args, attr_types=None, **kwargs):
+    self._enable_classes = [
+      'Expression',
+      'BoolOp', 'And', 'Or',
+      'Compare', 'Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE', 'In', 'NotIn',
+      'BinOp', 'Add', 'Sub', 'Mult', 'Div',
+      'Name',
+      'Constant',
+    ]
+    self._variables = {}
+    self._operators = {}
+    self._expressions = []
+    self._fields = fields
+    self._comp_ops = comp_ops
+    self._attr_types = attr_types or {key: 'number' if ast.Lt in ops else 'str' for key, ops in comp_ops.items()}
+    super().__init__(*args, **kwargs)
+
+  def _get_operand_type(self, node):
+    if isinstance(node, ast.Name):
+      if node.id not in self._fields or node.id not in self._attr_types:
+        raise KeyError(gettext_lazy('%(key)s does not exist') % {'key': node.id})
+      attr_type = self._attr_types[node.id]
+
+      if isinstance(self._fields[node.id], (models.DateField, models.DateTimeField)):
+        attr_type = 'date'
+    elif isinstance(node, ast.Constant):
+      attr_type = 'number' if _is_number(node.value) else 'str'
+    elif isinstance(node, ast.BinOp):
+      types = [self._get_operand_type(node.left), self._get_operand_type(node.right)]
+
+      if any([val != 'number' for val in types]):
+        raise ValidationError(gettext_lazy('Arithmetic operations are available only for numbers: %(expr)s'), params={'expr': ast.unparse(node)})
+      attr_type = 'number'
+    else:
+      attr_type = None
+
+    return attr_type
+
+  def _validate_expression(self, left_item, comp_op, right_item):
+    types = [self._get_operand_type(left_item), self._get_operand_type(right_item)]
+    has_field = any([isinstance(node, ast.Name) for item in [left_item, right_item] for node in ast.walk(item)])
+
+    if not has_field or None in types:
+      raise ValueError(gettext_lazy('Invalid inputs exist.'))
+    comp_ops = FOR_NUMBER if types[0] in ['number', 'date'] else [ast.Eq, ast.NotEq]
+
+    if types[0] != types[1] or not any([isinstance(comp_op, _op) for _op in comp_ops]):
+      expr = ast.Compare(left=left_item, ops=[comp_op], comparators=[right_item])
+      raise ValidationError(gettext_lazy('Invalid operator in %(expr)s'), params={'expr': ast.unparse(expr)})
+
+  def validate(self):
+    if self.stack:
+      raise ValueError(gettext_lazy('Invalid inputs exist.'))
+
+    for left_item, comp_op, right_item in self._expressions:
+      self._validate_expression(left_item, comp_op, right_item)
+
+    for key in self._variables.keys():
+      vals = self._variables[key]
+      ops = self._operators[key]
+      field = self._fields[key]
+      comp_ops = self._comp_ops[key]
+
+      for value, operator in zip(vals, ops):
+        field.clean(f'{value}', None)
+
+        if not any([isinstance(operator, _op) for _op in comp_ops]):
+          raise ValidationError(gettext_lazy('Invalid operator between %(key)s and %(value)s'), params={'key': key, 'value': str(value)})
+
+  def callback_compare(self, comp_op):
+    var_value = self.stack.pop()
+    var_name = self.stack.pop()
+    old_vals = self._variables.get(var_name, [])
+    old_ops = self._operators.get(var_name, [])
+    self._variables[var_name] = old_vals + [var_value]
+    self._operators[var_name] = old_ops + [comp_op]
+
+  def callback_expression(self, left_item, comp_op, right_item):
+    for node in [*ast.walk(left_item), *ast.walk(right_item)]:
+      classname = node.__class__.__name__
+
+      if classname not in self._enable_classes and not isinstance(node, ast.expr_context):
+        raise SyntaxError(gettext_lazy('cannot use %(name)s in this application') % {'name': classname})
+    self._expressions += [(left_item, comp_op, right_item)]
+
+  def visit(self, node):
+    classname = node.__class__.__name__
+
+    if classname not in self._enable_classes:
+      raise SyntaxError(gettext_lazy('cannot use %(name)s in this application') % {'name': classname})
+
+    return super().visit(node)
+
+  def visit_Expression(self, node):
+    self._variables = {}
+    self._operators = {}
+    self._expressions = []
+    super().visit_Expression(node)
+    self.visit(node.body)
+
+    return node
+
+class Command(BaseCommand):
+  terms = [
+    lambda rand: 'price > {:.1f}'.format(rand.uniform(0, 5000)),
+    lambda rand: 'per < {:.2f}'.format(rand.uniform(0, 30)),
+    lambda rand: '{:.1f} <= er <= {:.1f}'.format(rand.uniform(0, 40), rand.uniform(40, 99)),
+    lambda rand: 'div_yield >= {:.2f}'.format(rand.uniform(0, 5)),
+    lambda rand: 'name in "{}"'.format(rand.choice(['alpha', 'beta', 'gamma', 'delta'])),
+    lambda rand: 'industry_name != "{}"'.format(rand.choice(['foo', 'bar', 'baz'])),
+    lambda rand: 'code not in "{}"'.format(rand.randint(1, 9)),
+    lambda rand: 'per < pbr * {}'.format(rand.randint(2, 9)),
+  ]
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--length',
+      dest='length',
+      type=int,
+      default=1024,
+      help=gettext_lazy('The number of characters of each condition'),
+    )
+    parser.add_argument(
+      '--conditions',
+      dest='conditions',
+      type=int,
+      default=100,
+      help=gettext_lazy('The number of conditions'),
+    )
+    parser.add_argument(
+      '--repeat',
+      dest='repeat',
+      type=int,
+      default=10,
+      help=gettext_lazy('The number of repetitions'),
+    )
+    parser.add_argument(
+      '--seed',
+      dest='seed',
+      type=int,
+      default=0,
+      help=gettext_lazy('Seed of random conditions'),
+    )
+
+  def create_condition(self, rand, length):
+    condition = rand.choice(self.terms)(rand)
+
+    while True:
+      term = ' {} {}'.format(rand.choice(['and', 'or']), rand.choice(self.terms)(rand))
+
+      if len(condition) + len(term) > length:
+        break
+      condition += term
+
+    return condition
+
+  def create_legacy_visitor(self):
+    # Rebuild the field and operator maps for each call as before
+    visitor = _LegacyValidateCondition(
+      StockMembers.get_field_types(),
+      StockMembers.get_comp_ops(),
+      attr_types=StockMembers.get_attribute_types(),
+    )
+
+    return visitor
+
+  def measure(self, trees, create_visitor, repeat):
+    elapsed_times = []
+
+    for _ in range(repeat):
+      start = time.perf_counter()
+
+      for tree in trees:
+        visitor = create_visitor()
+        visitor.visit(tree)
+        visitor.validate()
+      elapsed_times += [time.perf_counter() - start]
+    elapsed = sum(elapsed_times) / (len(elapsed_times) * len(trees)) * 1000
+
+    return elapsed
+
+  def handle(self, *args, **options):
+    length = max(options.get('length'), 1)
+    num = max(options.get('conditions'), 1)
+    repeat = max(options.get('repeat'), 1)
+    rand = random.Random(options.get('seed'))
+
+    # Pre-process
+    conditions = [self.create_condition(rand, length) for _ in range(num)]
+    trees = [get_tree(condition) for condition in conditions]
+
+    # Main process
+    legacy_time = self.measure(trees, self.create_legacy_visitor, repeat)
+    schema_time = self.measure(trees, lambda: _ValidateCondition(schema=_stock_validation_schema), repeat)
+
+    # Post process
+    lines = [
+      gettext_lazy('Conditions: %(count)s (%(length)s characters on average)') % {
+        'count': num,
+        'length': sum([len(condition) for condition in conditions]) // num,
+      },
+      gettext_lazy('Legacy:      %(elapsed).3f ms/condition') % {'elapsed': legacy_time},
+      gettext_lazy('Precompiled: %(elapsed).3f ms/condition') % {'elapsed': schema_time},
+    ]
+    for message in lines:
+      self.stdout.write(str(message))
+    message = gettext_lazy('Speedup: x%(ratio).1f') % {'ratio': legacy_time / max(schema_time, 1e-9)}
+    self.stdout.write(self.style.SUCCESS(str(message)))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils.translation import gettext_lazy
 from stock.models import Stock
-from . import run_stock_task
+from . import run_stock_task, start_update_run
 import random
 
 class Command(BaseCommand):
@@ -11,8 +11,10 @@ class Command(BaseCommand):
     total = queryset.count()
 
     # Main process
+    run_id = start_update_run()
+
     for idx, instance in enumerate(queryset, 1):
-      run_stock_task(idx, total, instance)
+      run_stock_task(idx, total, instance, run_id=run_id)
 
       if (idx % 100) == 0:
         message = gettext_lazy('Processing status: %(idx)s / %(total)s started') % {'idx': idx, 'total': total}
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils.translation import gettext_lazy
 from stock.models import Stock
-from . import run_stock_task
+from . import run_stock_task, start_update_run
 
 class Command(BaseCommand):
   def add_arguments(self, parser):
@@ -28,8 +28,10 @@ class Command(BaseCommand):
       return
 
     # Main process
+    run_id = start_update_run()
+
     for idx, instance in enumerate(stocks, 1):
-      run_stock_task(idx, total, instance)
+      run_stock_task(idx, total, instance, run_id=run_id)
 
     # Post process
     message = gettext_lazy('All jobs have been started(total: %(total)s).') % {'total': total}
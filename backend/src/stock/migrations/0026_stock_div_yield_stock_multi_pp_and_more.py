@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:36
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0025_stock_marketcap_gte_0_in_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='div_yield',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(price__gt=0, then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('dividend'), '/', models.F('price')), '*', models.Value(100.0))), default=models.Value(0), output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='Dividend yield'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='multi_pp',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(pbr__gt=0, per__gt=0, then=django.db.models.expressions.CombinedExpression(models.F('per'), '*', models.F('pbr'))), default=models.Value(0), output_field=models.FloatField()), output_field=models.FloatField(), verbose_name='PER x PBR'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['div_yield'], name='div_yield_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['multi_pp'], name='multi_pp_idx_in_stock'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0026_stock_div_yield_stock_multi_pp_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockscreener',
+            name='matched_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='The number of matched stocks'),
+        ),
+        migrations.AddField(
+            model_name='stockscreener',
+            name='matched_stocks',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Primary keys of the matched stocks in screener ordering.', verbose_name='Matched stocks'),
+        ),
+        migrations.AddField(
+            model_name='stockscreener',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Refreshed time'),
+        ),
+        migrations.AddField(
+            model_name='stockscreener',
+            name='result_key',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the condition and ordering used for the matched stocks.', max_length=64, verbose_name='Result key'),
+        ),
+    ]
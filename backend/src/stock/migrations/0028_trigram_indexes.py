@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:01
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0027_stockscreener_matched_count_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='localizedindustry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='name_trgm_idx_in_lindustry', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='localizedindustry',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='uname_trgm_idx_in_lindustry'),
+        ),
+        migrations.AddIndex(
+            model_name='localizedstock',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='name_trgm_idx_in_lstock', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='localizedstock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='uname_trgm_idx_in_lstock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['code'], name='code_trgm_idx_in_stock', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('code'), name='gin_trgm_ops'), name='ucode_trgm_idx_in_stock'),
+        ),
+    ]
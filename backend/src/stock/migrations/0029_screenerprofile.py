@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0028_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreenerProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('condition', models.TextField(blank=True, help_text='Condition used for the profile.', verbose_name='Condition')),
+                ('ordering', models.TextField(blank=True, help_text='Ordering used for the profile.', verbose_name='Ordering')),
+                ('parse_time', models.FloatField(default=0, verbose_name='Parse time (ms)')),
+                ('validate_time', models.FloatField(default=0, verbose_name='Validation time (ms)')),
+                ('compile_time', models.FloatField(default=0, verbose_name='Compile time (ms)')),
+                ('planning_time', models.FloatField(blank=True, null=True, verbose_name='Planning time (ms)')),
+                ('execution_time', models.FloatField(blank=True, null=True, verbose_name='Execution time (ms)')),
+                ('total_rows', models.IntegerField(default=0, verbose_name='The number of matched rows')),
+                ('scanned_rows', models.IntegerField(default=0, verbose_name='The number of scanned rows')),
+                ('indexes', models.JSONField(blank=True, default=list, verbose_name='Used indexes')),
+                ('seq_scans', models.JSONField(blank=True, default=list, verbose_name='Sequentially scanned tables')),
+                ('plan', models.JSONField(blank=True, help_text='Result of EXPLAIN (ANALYZE, BUFFERS) in json format.', null=True, verbose_name='Query plan')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Creation time')),
+                ('screener', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profiles', to='stock.stockscreener', verbose_name='Stock screener')),
+            ],
+            options={
+                'ordering': ('-created_at', '-pk'),
+            },
+        ),
+    ]
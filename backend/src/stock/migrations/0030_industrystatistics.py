@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0029_screenerprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndustryStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='The number of stocks')),
+                ('avg_per', models.FloatField(blank=True, null=True, verbose_name='Average of PER')),
+                ('median_per', models.FloatField(blank=True, null=True, verbose_name='Median of PER')),
+                ('avg_pbr', models.FloatField(blank=True, null=True, verbose_name='Average of PBR')),
+                ('median_pbr', models.FloatField(blank=True, null=True, verbose_name='Median of PBR')),
+                ('avg_roe', models.FloatField(blank=True, null=True, verbose_name='Average of ROE')),
+                ('median_roe', models.FloatField(blank=True, null=True, verbose_name='Median of ROE')),
+                ('avg_div_yield', models.FloatField(blank=True, null=True, verbose_name='Average of dividend yield')),
+                ('median_div_yield', models.FloatField(blank=True, null=True, verbose_name='Median of dividend yield')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated time')),
+                ('industry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='stock.industry', verbose_name='Industry')),
+            ],
+        ),
+    ]
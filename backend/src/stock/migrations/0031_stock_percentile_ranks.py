@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0030_industrystatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='bps_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of BPS'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='div_yield_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of dividend yield'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='dividend_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of dividend'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='eps_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of EPS'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='er_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of ER'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='market_cap_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of market capitalization'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='multi_pp_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of PER x PBR'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='operating_cashflow_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of operating cashflow'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='payout_ratio_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of payout ratio'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='pbr_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of PBR'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='per_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of PER'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='price_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of stock price'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='roe_rank',
+            field=models.FloatField(blank=True, editable=False, help_text='Percentile rank (0-100) in all target stocks', null=True, verbose_name='Rank of ROE'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['price_rank'], name='price_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['dividend_rank'], name='dividend_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['div_yield_rank'], name='yield_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['payout_ratio_rank'], name='payout_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['per_rank'], name='per_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['pbr_rank'], name='pbr_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['multi_pp_rank'], name='multi_pp_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['eps_rank'], name='eps_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['bps_rank'], name='bps_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['roe_rank'], name='roe_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['er_rank'], name='er_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['market_cap_rank'], name='mcap_rank_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['operating_cashflow_rank'], name='ocf_rank_idx_in_stock'),
+        ),
+    ]
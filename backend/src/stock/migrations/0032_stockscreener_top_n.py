@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:45
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0031_stock_percentile_ranks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockscreener',
+            name='top_n',
+            field=models.IntegerField(default=0, help_text='Only the first N stocks in the ordering are shown. 0 means all stocks.', validators=[django.core.validators.MinValueValidator(0)], verbose_name='The number of stocks to show'),
+        ),
+    ]
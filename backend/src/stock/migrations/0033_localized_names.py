@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:10
+
+import django.contrib.postgres.indexes
+import django.db.models.fields.json
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0032_stockscreener_top_n'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='industry',
+            name='names',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='This field is updated by the localized records.', verbose_name='Localized names'),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='names',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='This field is updated by the localized records.', verbose_name='Localized names'),
+        ),
+        migrations.RunSQL(
+            sql=[
+                'UPDATE "stock_industry" AS owner SET "names" = COALESCE('
+                '(SELECT JSONB_OBJECT_AGG(local."language_code", local."name") FROM "stock_localizedindustry" AS local WHERE local."industry_id" = owner."id"), '
+                '\'{}\'::jsonb)',
+                'UPDATE "stock_stock" AS owner SET "names" = COALESCE('
+                '(SELECT JSONB_OBJECT_AGG(local."language_code", local."name") FROM "stock_localizedstock" AS local WHERE local."stock_id" = owner."id"), '
+                '\'{}\'::jsonb)',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.fields.json.KeyTextTransform('en', 'names'), name='gin_trgm_ops'), name='names_en_trgm_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.fields.json.KeyTextTransform('ja', 'names'), name='gin_trgm_ops'), name='names_ja_trgm_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('en', 'names'), django.db.models.fields.json.KeyTextTransform('ja', 'names')), name='gin_trgm_ops'), name='names_en_ja_trgm_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('ja', 'names'), django.db.models.fields.json.KeyTextTransform('en', 'names')), name='gin_trgm_ops'), name='names_ja_en_trgm_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('en', 'names'), name='names_en_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('ja', 'names'), name='names_ja_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('en', 'names'), django.db.models.fields.json.KeyTextTransform('ja', 'names')), name='names_en_ja_idx_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('ja', 'names'), django.db.models.fields.json.KeyTextTransform('en', 'names')), name='names_ja_en_idx_in_stock'),
+        ),
+    ]
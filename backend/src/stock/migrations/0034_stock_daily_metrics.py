@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:38
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import stock.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0033_localized_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('price', stock.models._BigFixedPointField(decimal_places=2, default=0, max_digits=10, verbose_name='Stock price')),
+                ('dividend', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=7, verbose_name='Dividend')),
+                ('per', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=7, verbose_name='PER')),
+                ('pbr', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=7, verbose_name='PBR')),
+                ('eps', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=7, verbose_name='EPS')),
+                ('bps', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=7, verbose_name='BPS')),
+                ('roe', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=6, verbose_name='ROE')),
+                ('er', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=5, verbose_name='ER')),
+                ('market_cap', stock.models._BigFixedPointField(decimal_places=2, default=0, max_digits=10, verbose_name='Market Capitalization')),
+                ('payout_ratio', stock.models._FixedPointField(decimal_places=2, default=0, max_digits=6, verbose_name='Payout Ratio')),
+                ('operating_cashflow', stock.models._BigFixedPointField(decimal_places=2, default=0, max_digits=10, verbose_name='Operating Cashflow')),
+                ('stock', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_metrics', to='stock.stock', verbose_name='Stock')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['date'], name='date_brin_idx_in_daily_metrics')],
+                'constraints': [models.UniqueConstraint(fields=('stock', 'date'), name='unique_stock_date_in_daily_metrics')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0034_stock_daily_metrics'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='localizedindustry',
+            name='name_trgm_idx_in_lindustry',
+        ),
+        migrations.RemoveIndex(
+            model_name='localizedindustry',
+            name='uname_trgm_idx_in_lindustry',
+        ),
+        migrations.RemoveIndex(
+            model_name='localizedstock',
+            name='name_trgm_idx_in_lstock',
+        ),
+        migrations.RemoveIndex(
+            model_name='localizedstock',
+            name='uname_trgm_idx_in_lstock',
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models, transaction
+from django import forms
+from django.db import models, transaction, connection
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Upper, NullIf, Cast, Coalesce, PercentRank
+from django.db.models.lookups import Exact, LessThan, LessThanOrEqual, GreaterThan, GreaterThanOrEqual
+from django.contrib.postgres.indexes import GinIndex, BrinIndex, OpClass
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.conf import settings
-from django.core.validators import MinValueValidator, ValidationError
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator, MaxLengthValidator, DecimalValidator, ValidationError
 from django.utils.translation import gettext_lazy, get_language
 from django.utils.html import format_html
 from django.contrib.auth import get_user_model
@@ -8,19 +16,47 @@ from django.utils import timezone
 from django.utils.html import json_script
 from django.utils.safestring import mark_safe
 from django_celery_beat.models import PeriodicTask
+from utils.models import get_data_version, bump_data_version
 from types import FunctionType
 from dataclasses import dataclass
-from collections import deque
-from functools import wraps
+from collections import deque, OrderedDict
+from functools import reduce, wraps
 import ast
+import base64
+import copy
+import decimal
+import hashlib
 import json
+import operator
 import re
+import threading
+import time
 import urllib.parse
 import uuid
 
 UserModel = get_user_model()
 FOR_STRING = [ast.Eq, ast.NotEq, ast.In, ast.NotIn]
 FOR_NUMBER = [ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE]
+_NUMBER_OPS = frozenset(FOR_NUMBER)
+_EQUALITY_OPS = frozenset([ast.Eq, ast.NotEq])
+_MEMBERSHIP_OPS = frozenset([ast.In, ast.NotIn])
+STOCK_DATA_LABEL = 'stock'
+# Condition which does not match any records without executing the query
+EMPTY_CONDITION = models.Q(pk__in=[])
+SCREENER_DATA_LABEL = 'screener'
+INDUSTRY_NAMES_LABEL = 'industry-names'
+
+def get_stock_data_version():
+  return get_data_version(STOCK_DATA_LABEL)
+
+def bump_stock_data_version():
+  return bump_data_version(STOCK_DATA_LABEL)
+
+def get_screener_data_version():
+  return get_data_version(SCREENER_DATA_LABEL)
+
+def bump_screener_data_version():
+  return bump_data_version(SCREENER_DATA_LABEL)
 
 def bind_user_function(callback):
   def wrapper(**kwargs):
@@ -60,24 +96,128 @@ def generate_default_filename():
 
   return filename
 
+def normalize_condition(data):
+  return ' '.join(data.splitlines()).strip()
+
 def get_tree(data):
-  condition = ' '.join(data.splitlines()).strip()
+  condition = normalize_condition(data)
   # Convert python like script to abstract syntax tree
   tree = ast.parse(condition, mode='eval') if condition else None
 
   return tree
 
+class CompiledCondition:
+  def __init__(self, tree):
+    self.tree = tree
+    self.validators = set()
+    self._q_conds = {}
+    self._optimized_tree = None
+    self._fields = None
+    self._predicate = None
+
+  @property
+  def optimized_tree(self):
+    if self.tree is not None and self._optimized_tree is None:
+      self._optimized_tree = optimize_tree(self.tree)
+
+    return self._optimized_tree
+
+  @property
+  def is_unsatisfiable(self):
+    return self.tree is not None and is_false_node(self.optimized_tree.body)
+
+  @property
+  def fields(self):
+    if self._fields is None:
+      nodes = ast.walk(self.tree) if self.tree is not None else []
+      self._fields = frozenset([node.id for node in nodes if isinstance(node, ast.Name)])
+
+    return self._fields
+
+  @property
+  def condition(self):
+    # Localized names depend on the current language
+    language = get_language()
+
+    if self.tree is not None and language not in self._q_conds:
+      if self.is_unsatisfiable:
+        self._q_conds[language] = EMPTY_CONDITION
+      else:
+        visitor = _AnalyzeAndCreateQmodelCondition()
+        visitor.visit(self.optimized_tree)
+        self._q_conds[language] = visitor.condition
+
+    return self._q_conds.get(language, None)
+
+  @property
+  def predicate(self):
+    if self.tree is not None and self._predicate is None:
+      if self.is_unsatisfiable:
+        self._predicate = lambda record: False
+      else:
+        visitor = _CreatePredicate(attr_types=SnapshotRecordMembers.get_attribute_types())
+        visitor.visit(self.optimized_tree)
+        self._predicate = visitor.predicate
+
+    return self._predicate
+
+class _CompiledConditionCache:
+  def __init__(self):
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  @property
+  def maxsize(self):
+    return getattr(settings, 'SCREENER_CONDITION_CACHE_SIZE', 128)
+
+  def get(self, data):
+    key = normalize_condition(data)
+
+    with self._lock:
+      compiled = self._entries.get(key, None)
+
+      if compiled is not None:
+        self._entries.move_to_end(key)
+
+        return compiled
+    # Parse the condition outside of the lock because syntax errors are not cached
+    compiled = CompiledCondition(get_tree(key))
+
+    with self._lock:
+      compiled = self._entries.setdefault(key, compiled)
+      self._entries.move_to_end(key)
+      # Discard the least recently used entries
+      while len(self._entries) > max(self.maxsize, 0):
+        self._entries.popitem(last=False)
+
+    return compiled
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def __len__(self):
+    return len(self._entries)
+
+_compiled_conditions = _CompiledConditionCache()
+
+def compile_condition(data):
+  return _compiled_conditions.get(data)
+
+def clear_compiled_conditions():
+  _compiled_conditions.clear()
+
 def wrap_validation(callback):
   @wraps(callback)
   def wrapper(value):
-    visitor = callback()
-
     try:
-      tree = get_tree(value)
-
-      if tree is not None:
-        visitor.visit(tree)
+      compiled = compile_condition(value)
+      # Skip validation if the same condition has already been accepted by this validator
+      if compiled.tree is not None and callback not in compiled.validators:
+        visitor = callback()
+        visitor.visit(compiled.tree)
         visitor.validate()
+        compiled.validators.add(callback)
     except ValueError as ex:
       raise ValidationError(
         gettext_lazy('Invalid value: %(ex)s'),
@@ -113,6 +253,9 @@ class _BaseConditionVisitor(ast.NodeVisitor):
   def callback_compare(self, comp_op):
     raise NotImplementedError
 
+  def callback_expression(self, left_item, comp_op, right_item):
+    raise NotImplementedError
+
   # Assumption: top module name is an expression
   def visit_Expression(self, node):
     self.stack.clear()
@@ -137,6 +280,10 @@ class _BaseConditionVisitor(ast.NodeVisitor):
           if isinstance(comp_op, key):
             comp_op = alter_op
             break
+      # Compare the field with an arithmetic expression or the other field
+      if not isinstance(left_item, ast.Name) or not (isinstance(right_item, ast.Constant) or is_constant_list(right_item)):
+        self.callback_expression(left_item, comp_op, right_item)
+        continue
       # Analysis each node
       self.visit(left_item)
       self.visit(right_item)
@@ -155,47 +302,173 @@ class _BaseConditionVisitor(ast.NodeVisitor):
 
     return node
 
+  # Assumption: all items are constants
+  def visit_List(self, node):
+    self.stack.append([item.value for item in node.elts])
+
+    return node
+
+_ENABLE_CLASSES = frozenset([
+  'Expression',
+  'BoolOp', 'And', 'Or',
+  'Compare', 'Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE', 'In', 'NotIn',
+  'BinOp', 'Add', 'Sub', 'Mult', 'Div',
+  'Name',
+  'Constant',
+  'List',
+])
+
+def _is_valid_decimal(text, max_digits, decimal_places):
+  # Same rules as django.core.validators.DecimalValidator without creating any exceptions
+  try:
+    value = decimal.Decimal(text)
+  except (decimal.InvalidOperation, ValueError):
+    return False
+  if not value.is_finite():
+    return False
+  _, digit_tuple, exponent = value.as_tuple()
+
+  if exponent >= 0:
+    digits = len(digit_tuple) + (exponent if digit_tuple != (0, ) else 0)
+    decimals = 0
+  else:
+    decimals = abs(exponent)
+    digits = max(len(digit_tuple), decimals)
+  is_valid = (
+        (max_digits is None or digits <= max_digits)
+    and (decimal_places is None or decimals <= decimal_places)
+    and (max_digits is None or decimal_places is None or digits - decimals <= max_digits - decimal_places)
+  )
+
+  return is_valid
+
+class _ValidationSchema:
+  def __init__(self, fields, comp_ops, attr_types=None):
+    self.fields = fields
+    self.comp_ops = comp_ops
+    self.attr_types = attr_types or {key: 'number' if ast.Lt in ops else 'str' for key, ops in comp_ops.items()}
+    self.allowed_ops = {key: frozenset(ops) for key, ops in comp_ops.items()}
+    self.checkers = {key: self._get_checker(field) for key, field in fields.items()}
+    self.date_fields = frozenset([
+      key for key, field in fields.items() if isinstance(field, (models.DateField, models.DateTimeField))
+    ])
+
+  @staticmethod
+  def _get_checker(field):
+    if isinstance(field, _IgnoredField):
+      return lambda text: True
+    if not isinstance(field, models.Field) or field.choices:
+      return None
+    validators = [validator for validator in field.validators if not isinstance(validator, (MaxLengthValidator, DecimalValidator))]
+
+    if validators:
+      checker = None
+    elif isinstance(field, models.DecimalField):
+      checker = lambda text: _is_valid_decimal(text, field.max_digits, field.decimal_places)
+    elif isinstance(field, models.CharField):
+      checker = lambda text: (field.blank or text != '') and (field.max_length is None or len(text) <= field.max_length)
+    else:
+      checker = None
+
+    return checker
+
+  def clean(self, key, value):
+    text = f'{value}'
+    checker = self.checkers.get(key, None)
+    # Use the field's own cleaning only if the value cannot be checked quickly to get its error message
+    if checker is None or not checker(text):
+      self.fields[key].clean(text, None)
+
 class _ValidateCondition(_BaseConditionVisitor):
-  def __init__(self, fields, comp_ops, *args, **kwargs):
-    self._enable_classes = [
-      'Expression',
-      'BoolOp', 'And', 'Or',
-      'Compare', 'Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE', 'In', 'NotIn',
-      'Name',
-      'Constant',
-    ]
+  def __init__(self, fields=None, comp_ops=None, *args, attr_types=None, schema=None, **kwargs):
+    self._enable_classes = _ENABLE_CLASSES
     self._variables = {}
     self._operators = {}
-    self._fields = fields
-    self._comp_ops = comp_ops
+    self._expressions = []
+    self._schema = schema or _ValidationSchema(fields, comp_ops, attr_types=attr_types)
+    self._fields = self._schema.fields
+    self._comp_ops = self._schema.comp_ops
+    self._attr_types = self._schema.attr_types
     super().__init__(*args, **kwargs)
 
+  def _get_operand_type(self, node):
+    if isinstance(node, ast.Name):
+      if node.id not in self._fields or node.id not in self._attr_types:
+        raise KeyError(gettext_lazy('%(key)s does not exist') % {'key': node.id})
+      attr_type = self._attr_types[node.id]
+      # Dates can be compared with each other but cannot be used in arithmetic operations
+      if node.id in self._schema.date_fields:
+        attr_type = 'date'
+    elif isinstance(node, ast.Constant):
+      attr_type = 'number' if _is_number(node.value) else 'str'
+    elif isinstance(node, ast.BinOp):
+      types = [self._get_operand_type(node.left), self._get_operand_type(node.right)]
+
+      if any([val != 'number' for val in types]):
+        raise ValidationError(
+          gettext_lazy('Arithmetic operations are available only for numbers: %(expr)s'),
+          code='invalid_expression',
+          params={'expr': ast.unparse(node)},
+        )
+      attr_type = 'number'
+    else:
+      attr_type = None
+
+    return attr_type
+
+  def _validate_expression(self, left_item, comp_op, right_item):
+    types = [self._get_operand_type(left_item), self._get_operand_type(right_item)]
+    has_field = any([isinstance(node, ast.Name) for item in [left_item, right_item] for node in ast.walk(item)])
+    # Either operand has to refer to a field
+    if not has_field or None in types:
+      raise ValueError(gettext_lazy('Invalid inputs exist.'))
+    # Strings can be compared only by equality operators
+    comp_ops = _NUMBER_OPS if types[0] in ['number', 'date'] else _EQUALITY_OPS
+
+    if types[0] != types[1] or type(comp_op) not in comp_ops:
+      raise ValidationError(
+        gettext_lazy('Invalid operator in %(expr)s'),
+        code='invalid_operator',
+        params={'expr': ast.unparse(ast.Compare(left=left_item, ops=[comp_op], comparators=[right_item]))},
+      )
+
   def validate(self):
     # If some items which do not have any comparison operators exist, raise exception
     if self.stack:
       raise ValueError(gettext_lazy('Invalid inputs exist.'))
 
-    for key in self._variables.keys():
-      vals = self._variables[key]
+    for left_item, comp_op, right_item in self._expressions:
+      self._validate_expression(left_item, comp_op, right_item)
+
+    for key, vals in self._variables.items():
       ops = self._operators[key]
+      comp_ops = self._schema.allowed_ops.get(key, None)
 
-      try:
-        field = self._fields[key]
-        comp_ops = self._comp_ops[key]
-      except KeyError:
+      if key not in self._fields or comp_ops is None:
         raise KeyError(gettext_lazy('%(key)s does not exist') % {'key': key})
 
       for value, operator in zip(vals, ops):
-        try:
-          field.clean(f'{value}', None)
-        except ValidationError as ex:
+        # The list of values is available only for membership tests
+        is_list = isinstance(value, list)
+
+        if is_list and not value:
           raise ValidationError(
-            gettext_lazy('Invalid data (%(key)s, %(value)s): %(ex)s'),
+            gettext_lazy('Empty list is not available for %(key)s'),
             code='invalid_data',
-            params={'key': key, 'value': str(value), 'ex': str(ex)},
+            params={'key': key},
           )
 
-        if not any([isinstance(operator, _op) for _op in comp_ops]):
+        for item in (value if is_list else [value]):
+          try:
+            self._schema.clean(key, item)
+          except ValidationError as ex:
+            raise ValidationError(
+              gettext_lazy('Invalid data (%(key)s, %(value)s): %(ex)s'),
+              code='invalid_data',
+              params={'key': key, 'value': str(item), 'ex': str(ex)},
+            )
+
+        if type(operator) not in (_MEMBERSHIP_OPS if is_list else comp_ops):
           raise ValidationError(
             gettext_lazy('Invalid operator between %(key)s and %(value)s'),
             code='invalid_operator',
@@ -207,10 +480,17 @@ class _ValidateCondition(_BaseConditionVisitor):
     var_value = self.stack.pop()
     var_name = self.stack.pop()
     # Add name-value pair to variable list
-    old_vals = self._variables.get(var_name, [])
-    old_ops = self._operators.get(var_name, [])
-    self._variables[var_name] = old_vals + [var_value]
-    self._operators[var_name] = old_ops + [comp_op]
+    self._variables.setdefault(var_name, []).append(var_value)
+    self._operators.setdefault(var_name, []).append(comp_op)
+
+  def callback_expression(self, left_item, comp_op, right_item):
+    for node in [*ast.walk(left_item), *ast.walk(right_item)]:
+      classname = node.__class__.__name__
+
+      if classname not in self._enable_classes and not isinstance(node, ast.expr_context):
+        raise SyntaxError(gettext_lazy('cannot use %(name)s in this application') % {'name': classname})
+    # Check the types of operands after visiting all nodes
+    self._expressions.append((left_item, comp_op, right_item))
 
   def visit(self, node):
     classname = node.__class__.__name__
@@ -223,6 +503,7 @@ class _ValidateCondition(_BaseConditionVisitor):
   def visit_Expression(self, node):
     self._variables = {}
     self._operators = {}
+    self._expressions = []
     super().visit_Expression(node)
     self.visit(node.body)
 
@@ -238,8 +519,23 @@ class _AnalyzeAndCreateQmodelCondition(_BaseConditionVisitor):
       ast.LtE:   lambda name, val:  models.Q(**{f'{name}__lte': val}),
       ast.Gt:    lambda name, val:  models.Q(**{f'{name}__gt': val}),
       ast.GtE:   lambda name, val:  models.Q(**{f'{name}__gte': val}),
-      ast.In:    lambda name, val:  models.Q(**{f'{name}__contains': val}),
-      ast.NotIn: lambda name, val: ~models.Q(**{f'{name}__contains': val}),
+      ast.In:    lambda name, val:  models.Q(**{f'{name}__{get_membership_lookup(val)}': val}),
+      ast.NotIn: lambda name, val: ~models.Q(**{f'{name}__{get_membership_lookup(val)}': val}),
+    }
+    self._expr_op_callbacks = {
+      ast.Eq:    lambda lhs, rhs:  models.Q(Exact(lhs, rhs)),
+      ast.NotEq: lambda lhs, rhs: ~models.Q(Exact(lhs, rhs)),
+      ast.Lt:    lambda lhs, rhs:  models.Q(LessThan(lhs, rhs)),
+      ast.LtE:   lambda lhs, rhs:  models.Q(LessThanOrEqual(lhs, rhs)),
+      ast.Gt:    lambda lhs, rhs:  models.Q(GreaterThan(lhs, rhs)),
+      ast.GtE:   lambda lhs, rhs:  models.Q(GreaterThanOrEqual(lhs, rhs)),
+    }
+    self._bin_op_callbacks = {
+      ast.Add:  lambda lhs, rhs: lhs + rhs,
+      ast.Sub:  lambda lhs, rhs: lhs - rhs,
+      ast.Mult: lambda lhs, rhs: lhs * rhs,
+      # Division by zero is treated as null in order not to stop the query
+      ast.Div:  lambda lhs, rhs: lhs / NullIf(rhs, models.Value(0)),
     }
     super().__init__(*args, **kwargs)
 
@@ -247,6 +543,24 @@ class _AnalyzeAndCreateQmodelCondition(_BaseConditionVisitor):
   def condition(self):
     return self.q_cond
 
+  def _create_expression(self, node):
+    if isinstance(node, ast.Name):
+      expr = models.F(node.id)
+    elif isinstance(node, ast.Constant):
+      expr = models.Value(node.value)
+    else:
+      lhs = self._create_expression(node.left)
+      rhs = self._create_expression(node.right)
+      expr = models.ExpressionWrapper(self._bin_op_callbacks[type(node.op)](lhs, rhs), output_field=models.FloatField())
+
+    return expr
+
+  def callback_expression(self, left_item, comp_op, right_item):
+    lhs = self._create_expression(left_item)
+    rhs = self._create_expression(right_item)
+    q_cond = self._expr_op_callbacks[type(comp_op)](lhs, rhs)
+    self.stack.append(q_cond)
+
   def callback_compare(self, comp_op):
     # Note: the right item position is upper than left item one because of using stack
     val = self.stack.pop()
@@ -292,14 +606,391 @@ class _AnalyzeAndCreateQmodelCondition(_BaseConditionVisitor):
 
     return node
 
+class _CreatePredicate(_BaseConditionVisitor):
+  def __init__(self, *args, attr_types=None, **kwargs):
+    self.predicate = None
+    self._attr_types = attr_types or {}
+    self._casters = {
+      'number': float,
+      'str': str,
+    }
+    self._comp_op_callbacks = {
+      ast.Eq:    operator.eq,
+      ast.NotEq: operator.ne,
+      ast.Lt:    operator.lt,
+      ast.LtE:   operator.le,
+      ast.Gt:    operator.gt,
+      ast.GtE:   operator.ge,
+      ast.In:    lambda lhs, rhs: rhs in lhs,
+      ast.NotIn: lambda lhs, rhs: rhs not in lhs,
+    }
+    self._bin_op_callbacks = {
+      ast.Add:  operator.add,
+      ast.Sub:  operator.sub,
+      ast.Mult: operator.mul,
+      # Division by zero is treated as null as with SQL
+      ast.Div:  lambda lhs, rhs: lhs / rhs if rhs != 0 else None,
+    }
+    super().__init__(*args, **kwargs)
+
+  def _create_evaluator(self, node):
+    if isinstance(node, ast.Name):
+      evaluator = operator.attrgetter(node.id)
+    elif isinstance(node, ast.Constant):
+      value = node.value
+      evaluator = lambda record: value
+    else:
+      lhs = self._create_evaluator(node.left)
+      rhs = self._create_evaluator(node.right)
+      callback = self._bin_op_callbacks[type(node.op)]
+
+      def evaluator(record):
+        lval = lhs(record)
+        rval = rhs(record)
+
+        return None if lval is None or rval is None else callback(lval, rval)
+
+    return evaluator
+
+  def _create_comparison(self, lhs, callback, rhs):
+    # Null values do not match any conditions as with SQL
+    def predicate(record):
+      lval = lhs(record)
+      rval = rhs(record)
+
+      return lval is not None and rval is not None and callback(lval, rval)
+
+    return predicate
+
+  def callback_expression(self, left_item, comp_op, right_item):
+    lhs = self._create_evaluator(left_item)
+    rhs = self._create_evaluator(right_item)
+    predicate = self._create_comparison(lhs, self._comp_op_callbacks[type(comp_op)], rhs)
+    self.stack.append(predicate)
+
+  def callback_compare(self, comp_op):
+    # Note: the right item position is upper than left item one because of using stack
+    val = self.stack.pop()
+    name = self.stack.pop()
+    caster = self._casters.get(self._attr_types.get(name, None), lambda value: value)
+    # Cast the constants in advance in order not to convert them for each record
+    if isinstance(val, list):
+      values = frozenset([caster(item) for item in val])
+      is_negated = isinstance(comp_op, ast.NotIn)
+      callback = lambda lhs, rhs: (lhs in rhs) != is_negated
+      value = values
+    else:
+      callback = self._comp_op_callbacks[type(comp_op)]
+      value = caster(val)
+    predicate = self._create_comparison(operator.attrgetter(name), callback, lambda record: value)
+    self.stack.append(predicate)
+
+  # Assumption: top module name is an expression
+  def visit_Expression(self, node):
+    self.predicate = None
+    super().visit_Expression(node)
+    self.visit(node.body)
+    self.predicate = self.stack.pop()
+
+    return node
+
+  def visit_BoolOp(self, node):
+    super().visit_BoolOp(node)
+    predicates = [self.stack.pop() for _ in node.values][::-1]
+    # Evaluate each item in the original order to stop as soon as possible
+    if isinstance(node.op, ast.Or):
+      predicate = lambda record: any(pred(record) for pred in predicates)
+    else:
+      predicate = lambda record: all(pred(record) for pred in predicates)
+    self.stack.append(predicate)
+
+    return node
+
+  def visit_Compare(self, node):
+    super().visit_Compare(node)
+    count = len(node.comparators)
+    predicates = [self.stack.pop() for _ in range(count)][::-1]
+    # Bind multi comparison
+    if count == 1:
+      predicate = predicates[0]
+    else:
+      predicate = lambda record: all(pred(record) for pred in predicates)
+    self.stack.append(predicate)
+
+    return node
+
+def is_false_node(node):
+  return isinstance(node, ast.Constant) and node.value is False
+
+def is_constant_list(node):
+  return isinstance(node, ast.List) and all([isinstance(item, ast.Constant) for item in node.elts])
+
+def get_membership_lookup(value):
+  # The list of values means the membership test and the string means the substring test
+  return 'in' if isinstance(value, list) else 'contains'
+
+def _is_number(value):
+  return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+@dataclass
+class _Bound:
+  value: float
+  inclusive: bool
+
+class _OptimizeCondition(ast.NodeTransformer):
+  def __init__(self, *args, **kwargs):
+    self._swap_pairs = {
+      ast.Lt:  ast.Gt,
+      ast.LtE: ast.GtE,
+      ast.Gt:  ast.Lt,
+      ast.GtE: ast.LtE,
+    }
+    super().__init__(*args, **kwargs)
+
+  def _create_compare(self, name, comp_op, value):
+    node = ast.Compare(left=ast.Name(id=name, ctx=ast.Load()), ops=[comp_op], comparators=[ast.Constant(value=value)])
+
+    return node
+
+  def _get_members(self, node):
+    # Return (name, values) only for the equality or the membership test with the list of constants
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.left, ast.Name):
+      comp_op, right = node.ops[0], node.comparators[0]
+
+      if isinstance(comp_op, ast.Eq) and isinstance(right, ast.Constant):
+        return node.left.id, [right.value]
+      if isinstance(comp_op, ast.In) and is_constant_list(right):
+        return node.left.id, [item.value for item in right.elts]
+
+    return None
+
+  def _merge_equalities(self, nodes):
+    groups = {}
+
+    for node in nodes:
+      members = self._get_members(node)
+
+      if members is not None:
+        groups.setdefault(members[0], []).append(members[1])
+    results = []
+    merged_names = set()
+    # Replace the chain of equalities for each field with a single membership test
+    for node in nodes:
+      members = self._get_members(node)
+
+      if members is None or len(groups[members[0]]) == 1:
+        results += [node]
+      elif members[0] not in merged_names:
+        name = members[0]
+        merged_names.add(name)
+        values = list(dict.fromkeys([value for values in groups[name] for value in values]))
+        elts = [ast.Constant(value=value) for value in values]
+        results += [ast.Compare(left=ast.Name(id=name, ctx=ast.Load()), ops=[ast.In()], comparators=[ast.List(elts=elts, ctx=ast.Load())])]
+
+    return results
+
+  def _get_term(self, node):
+    # Return (name, operator, value) only for the comparison between a field and a number
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+      left, right = node.left, node.comparators[0]
+
+      if isinstance(left, ast.Name) and isinstance(right, ast.Constant) and _is_number(right.value):
+        return left.id, node.ops[0], right.value
+
+    return None
+
+  def _merge_and_terms(self, terms):
+    lower, upper, equals, not_equals = None, None, set(), set()
+
+    for _, comp_op, value in terms:
+      if isinstance(comp_op, (ast.Gt, ast.GtE)):
+        bound = _Bound(value, isinstance(comp_op, ast.GtE))
+        if lower is None or (bound.value, not bound.inclusive) > (lower.value, not lower.inclusive):
+          lower = bound
+      elif isinstance(comp_op, (ast.Lt, ast.LtE)):
+        bound = _Bound(value, isinstance(comp_op, ast.LtE))
+        if upper is None or (bound.value, bound.inclusive) < (upper.value, upper.inclusive):
+          upper = bound
+      elif isinstance(comp_op, ast.Eq):
+        equals.add(value)
+      else:
+        not_equals.add(value)
+    # Check whether each value is in the range
+    in_range = lambda val: (lower is None or val > lower.value or (lower.inclusive and val == lower.value)) and \
+                           (upper is None or val < upper.value or (upper.inclusive and val == upper.value))
+    # Narrow the range to a single value
+    if not equals and lower is not None and upper is not None and lower.value == upper.value and lower.inclusive and upper.inclusive:
+      equals.add(lower.value)
+
+    if len(equals) > 1:
+      return None
+    if equals:
+      value = equals.pop()
+
+      if not in_range(value) or value in not_equals:
+        return None
+
+      return [(ast.Eq(), value)]
+    if lower is not None and upper is not None:
+      if lower.value > upper.value or (lower.value == upper.value and not (lower.inclusive and upper.inclusive)):
+        return None
+    merged = []
+
+    if lower is not None:
+      merged += [(ast.GtE() if lower.inclusive else ast.Gt(), lower.value)]
+    if upper is not None:
+      merged += [(ast.LtE() if upper.inclusive else ast.Lt(), upper.value)]
+    # Ignore the values out of the range
+    merged += [(ast.NotEq(), value) for value in sorted(not_equals) if in_range(value)]
+
+    return merged
+
+  def _merge_or_terms(self, terms):
+    lower, upper, others = None, None, []
+
+    for _, comp_op, value in terms:
+      # Keep the loosest bound for each direction
+      if isinstance(comp_op, (ast.Gt, ast.GtE)):
+        bound = _Bound(value, isinstance(comp_op, ast.GtE))
+        if lower is None or (bound.value, not bound.inclusive) < (lower.value, not lower.inclusive):
+          lower = bound
+      elif isinstance(comp_op, (ast.Lt, ast.LtE)):
+        bound = _Bound(value, isinstance(comp_op, ast.LtE))
+        if upper is None or (bound.value, bound.inclusive) > (upper.value, upper.inclusive):
+          upper = bound
+      else:
+        others += [(comp_op, value)]
+    merged = []
+
+    if lower is not None:
+      merged += [(ast.GtE() if lower.inclusive else ast.Gt(), lower.value)]
+    if upper is not None:
+      merged += [(ast.LtE() if upper.inclusive else ast.Lt(), upper.value)]
+    merged += others
+
+    return merged
+
+  def _simplify(self, op, values):
+    is_and = isinstance(op, ast.And)
+    nodes = []
+    keys = set()
+    # Flatten the nested operations and remove duplicated items
+    for node in values:
+      items = node.values if isinstance(node, ast.BoolOp) and isinstance(node.op, type(op)) else [node]
+
+      for item in items:
+        key = ast.dump(item)
+
+        if key not in keys:
+          keys.add(key)
+          nodes += [item]
+    # Check always-false items
+    if is_and and any([is_false_node(node) for node in nodes]):
+      return ast.Constant(value=False)
+    nodes = [node for node in nodes if not is_false_node(node)]
+
+    if not nodes:
+      return ast.Constant(value=False)
+    if not is_and:
+      nodes = self._merge_equalities(nodes)
+    # Merge the comparisons for each field
+    groups = {}
+
+    for node in nodes:
+      term = self._get_term(node)
+
+      if term is not None:
+        groups.setdefault(term[0], []).append(term)
+    results = []
+    merged_names = set()
+
+    for node in nodes:
+      term = self._get_term(node)
+
+      if term is None:
+        results += [node]
+      elif term[0] not in merged_names:
+        name = term[0]
+        merged_names.add(name)
+        merged = self._merge_and_terms(groups[name]) if is_and else self._merge_or_terms(groups[name])
+
+        if merged is None:
+          return ast.Constant(value=False)
+        results += [self._create_compare(name, comp_op, value) for comp_op, value in merged]
+    node = results[0] if len(results) == 1 else ast.BoolOp(op=op, values=results)
+
+    return node
+
+  def visit_BoolOp(self, node):
+    values = [self.visit(item) for item in node.values]
+
+    return self._simplify(node.op, values)
+
+  def visit_Compare(self, node):
+    _left = [node.left] + node.comparators[:-1]
+    _right = list(node.comparators)
+    values = []
+    # Split the chained comparison into the binary comparisons
+    for left_item, comp_op, right_item in zip(_left, node.ops, _right):
+      if isinstance(left_item, ast.Constant) and isinstance(right_item, ast.Name):
+        left_item, right_item = right_item, left_item
+        comp_op = self._swap_pairs.get(type(comp_op), type(comp_op))()
+      values += [ast.Compare(left=left_item, ops=[comp_op], comparators=[right_item])]
+
+    return self._simplify(ast.And(), values)
+
+def optimize_tree(tree):
+  # Keep the original tree because it is used to validate the condition
+  optimized = _OptimizeCondition().visit(copy.deepcopy(tree))
+
+  return optimized
+
+def _get_target_languages():
+  # The current language is given priority over the default language
+  return [get_language(), getattr(settings, 'LANGUAGE_CODE', 'en')]
+
+def get_localized_name(instance, annotation=None):
+  # Use the annotated name if it exists
+  name = getattr(instance, annotation, None) if annotation else None
+
+  if name is None:
+    # Pick the name from the denormalized names without executing any queries
+    names = instance.names or {}
+    name = next((names[target] for target in _get_target_languages() if target in names), '')
+
+  return name
+
+def _get_name_expression(field, *targets):
+  keys = [KeyTextTransform(target, field) for target in dict.fromkeys(targets)]
+  # The name of the first language falls back to the ones of the others
+  expression = Coalesce(*keys) if len(keys) > 1 else keys[0]
+
+  return expression
+
+# Combinations of the languages of the indexed name expressions which are made by get_localized_name_expression
+_INDEXED_NAME_LANGUAGES = (
+  ('en',),
+  ('ja',),
+  ('en', 'ja'),
+  ('ja', 'en'),
+)
+
+def get_localized_name_expression(field, language=None):
+  # The name of the current language falls back to the one of the default language
+  expression = _get_name_expression(field, language or get_language(), getattr(settings, 'LANGUAGE_CODE', 'en'))
+
+  return expression
+
+class _JSONObjectAgg(models.Aggregate):
+  function = 'JSONB_OBJECT_AGG'
+  output_field = models.JSONField()
+
 class LocalizedQuerySet(models.QuerySet):
   def select_current_lang(self):
     return self.filter(language_code=get_language())
 
   def get_local(self):
-    default_lang = getattr(settings, 'LANGUAGE_CODE', 'en')
-
-    for target in [get_language(), default_lang]:
+    for target in _get_target_languages():
       try:
         instance = self.get(language_code=target)
         break
@@ -314,6 +1005,9 @@ class _BaseLocalization(models.Model):
   class Meta:
     abstract = True
 
+  # Name of the field which refers to the owner of the localized names
+  owner_name = None
+
   language_code = models.CharField(
     max_length=10,
     verbose_name=gettext_lazy('Language code'),
@@ -328,6 +1022,15 @@ class _BaseLocalization(models.Model):
   def get_lang_pair(self):
     return (self.language_code, self.name)
 
+  def update_owner_names(self):
+    field = self._meta.get_field(self.owner_name)
+    owner_pk = getattr(self, field.attname)
+    names = dict(type(self).objects.filter(**{field.attname: owner_pk}).values_list('language_code', 'name'))
+    field.related_model._base_manager.filter(pk=owner_pk).update(names=names)
+    # Keep the cached owner consistent with the database
+    if field.is_cached(self):
+      getattr(self, self.owner_name).names = names
+
   def __str__(self):
     return self.name
 
@@ -336,6 +1039,7 @@ class LocalizedIndustry(_BaseLocalization):
     unique_together = (('industry', 'language_code'), )
 
   objects = LocalizedQuerySet.as_manager()
+  owner_name = 'industry'
 
   industry = models.ForeignKey(
     'Industry',
@@ -344,11 +1048,96 @@ class LocalizedIndustry(_BaseLocalization):
     related_name='locals',
   )
 
+class _BaseLocalizedNames(models.Model):
+  class Meta:
+    abstract = True
+
+  # Fields which are updated in bulk by the other processes
+  derived_fields = ('names',)
+
+  names = models.JSONField(
+    verbose_name=gettext_lazy('Localized names'),
+    help_text=gettext_lazy('This field is updated by the localized records.'),
+    default=dict,
+    blank=True,
+    editable=False,
+  )
+
+  def save(self, *args, **kwargs):
+    # Do not overwrite the derived fields which may have been updated by the other processes
+    if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+      kwargs['update_fields'] = [
+        field.name for field in self._meta.concrete_fields
+        if not field.primary_key and field.name not in self.derived_fields
+      ]
+    super().save(*args, **kwargs)
+
+  @classmethod
+  def refresh_names(cls):
+    related_name = cls._meta.get_field('locals').field.name
+    records = cls._meta.get_field('locals').related_model.objects.filter(**{related_name: models.OuterRef('pk')})
+    names = records.order_by().values(related_name).annotate(names=_JSONObjectAgg('language_code', 'name')).values('names')
+    count = cls._base_manager.update(names=Coalesce(models.Subquery(names), models.Value({}, output_field=models.JSONField())))
+
+    return count
+
+class _IndustryNameCache:
+  # Process-wide map of (industry pk, language code) to the localized name
+  def __init__(self):
+    self._names = None
+    self._version = None
+    self._checked_at = 0
+    self._lock = threading.Lock()
+
+  def _is_expired(self):
+    if self._names is None:
+      return True
+    now = time.monotonic()
+    # Check the version shared between processes at regular intervals instead of every lookup
+    if now - self._checked_at < getattr(settings, 'INDUSTRY_NAME_CHECK_INTERVAL', 5):
+      return False
+    self._checked_at = now
+
+    return self._version != get_data_version(INDUSTRY_NAMES_LABEL)
+
+  def _load(self):
+    with self._lock:
+      version = get_data_version(INDUSTRY_NAMES_LABEL)
+      records = Industry._base_manager.values_list('pk', 'names')
+      self._names = {(pk, code): name for pk, names in records for code, name in (names or {}).items()}
+      self._version = version
+      self._checked_at = time.monotonic()
+
+  def get(self, pk):
+    if self._is_expired():
+      self._load()
+    names = self._names
+
+    return next((names[(pk, target)] for target in _get_target_languages() if (pk, target) in names), '')
+
+  def clear(self):
+    with self._lock:
+      self._names = None
+
+_industry_names = _IndustryNameCache()
+
+def get_industry_name(pk):
+  return _industry_names.get(pk)
+
+def clear_industry_names():
+  _industry_names.clear()
+
+def bump_industry_names_version():
+  # Discard the names of this process immediately and the ones of the other processes by the version
+  clear_industry_names()
+
+  return bump_data_version(INDUSTRY_NAMES_LABEL)
+
 class IndustryManager(models.Manager):
   def get_queryset(self):
     return super().get_queryset().prefetch_related('locals')
 
-class Industry(models.Model):
+class Industry(_BaseLocalizedNames):
   is_defensive = models.BooleanField(
     verbose_name=gettext_lazy('Defensive brand'),
   )
@@ -356,15 +1145,13 @@ class Industry(models.Model):
   objects = IndustryManager()
 
   def get_dict(self):
-    queryset = self.locals.all()
-
     return {
-      'names': dict([record.get_lang_pair() for record in queryset]),
+      'names': dict(self.names or {}),
       'is_defensive': self.is_defensive,
     }
 
   def get_name(self):
-    return str(self.locals.get_local() or '')
+    return get_industry_name(self.pk)
 
   def __str__(self):
     return self.get_name()
@@ -384,6 +1171,7 @@ class LocalizedStock(_BaseLocalization):
     unique_together = (('stock', 'language_code'), )
 
   objects = LocalizedQuerySet.as_manager()
+  owner_name = 'stock'
 
   stock = models.ForeignKey(
     'Stock',
@@ -392,47 +1180,77 @@ class LocalizedStock(_BaseLocalization):
     related_name='locals',
   )
 
+# Target fields of the industry statistics and whether only positive values are available or not
+_INDUSTRY_RELATIVE_FIELDS = {
+  'per': True,
+  'pbr': True,
+  'roe': False,
+  'div_yield': False,
+}
+
+# Target fields of the percentile ranks and whether only positive values are available or not
+_RANKED_FIELDS = {
+  'price': False,
+  'dividend': False,
+  'div_yield': False,
+  'payout_ratio': False,
+  'per': True,
+  'pbr': True,
+  'multi_pp': True,
+  'eps': False,
+  'bps': False,
+  'roe': False,
+  'er': False,
+  'market_cap': False,
+  'operating_cashflow': False,
+}
+
+def _create_rank_field(verbose_name):
+  return models.FloatField(
+    verbose_name=verbose_name,
+    help_text=gettext_lazy('Percentile rank (0-100) in all target stocks'),
+    null=True,
+    blank=True,
+    editable=False,
+  )
+
 class StockQuerySet(models.QuerySet):
-  def _annotate_dividend(self):
-    return self.annotate(
-      div_yield=models.Case(
-        models.When(price__gt=0, then=models.F('dividend')/models.F('price')*100.0),
-        default=models.Value(0),
-        output_field=models.FloatField(),
-      )
-    )
+  def _annotate_industry_relatives(self):
+    relatives = {}
 
-  def _annotate_per_pbr(self):
-    return self.annotate(
-      multi_pp=models.Case(
-        models.When(per__gt=0, pbr__gt=0, then=models.F('per')*models.F('pbr')),
-        default=models.Value(0),
-        output_field=models.FloatField(),
-      )
-    )
+    for name, positive_only in _INDUSTRY_RELATIVE_FIELDS.items():
+      # The ratio of the value to its industry average which is stored in the precomputed table
+      average = NullIf(models.F(f'industry__statistics__avg_{name}'), models.Value(0.0))
+      ratio = models.ExpressionWrapper(Cast(name, models.FloatField()) / average, output_field=models.FloatField())
+
+      if positive_only:
+        ratio = models.Case(models.When(**{f'{name}__gt': 0}, then=ratio), default=None, output_field=models.FloatField())
+      relatives[f'{name}_vs_industry'] = ratio
+    queryset = self.annotate(**relatives)
+
+    return queryset
 
   def _annotate_names(self):
-    stocks = LocalizedStock.objects.select_current_lang().filter(stock=models.OuterRef('pk'))
-    industries = LocalizedIndustry.objects.select_current_lang().filter(industry=models.OuterRef('industry__pk'))
     queryset = self.annotate(
-      name=models.Subquery(stocks.values('name'))
-    ).annotate(
-      industry_name=models.Subquery(industries.values('name'))
+      name=get_localized_name_expression('names'),
+      industry_name=get_localized_name_expression('industry__names'),
     )
 
     return queryset
 
-  def select_targets(self, tree=None):
-    queryset = self.filter(skip_task=False) \
-                   ._annotate_dividend() \
-                   ._annotate_per_pbr() \
-                   ._annotate_names()
+  def select_targets(self, tree=None, condition=None):
+    queryset = self.filter(skip_task=False)._annotate_names()._annotate_industry_relatives()
 
-    if tree:
+    if condition is None and tree:
       # Assumption: abstract syntax tree is validated by caller
       visitor = _AnalyzeAndCreateQmodelCondition()
       visitor.visit(tree)
-      queryset = queryset.filter(visitor.condition)
+      condition = visitor.condition
+    # Return empty queryset without executing the query if the condition never matches
+    if condition is EMPTY_CONDITION:
+      queryset = queryset.none()
+    elif condition is not None:
+      queryset = queryset.filter(condition)
 
     return queryset
 
@@ -440,14 +1258,44 @@ class StockManager(models.Manager):
   def get_queryset(self):
     queryset = StockQuerySet(self.model, using=self._db)
 
-    return queryset.select_related('industry').prefetch_related('locals')
+    return queryset.select_related('industry')
 
-  def select_targets(self, tree=None):
-    return self.get_queryset().select_targets(tree)
+  def select_targets(self, tree=None, condition=None):
+    return self.get_queryset().select_targets(tree=tree, condition=condition)
 
-class Stock(models.Model):
+class Stock(_BaseLocalizedNames):
   class Meta:
     ordering = ('code',)
+    indexes = [
+      # Indexes of the localized name expressions (trigram for substring search and btree for ordering)
+      # Both the name of each language and the one falling back to the other language are indexed
+      # so that the indexes are the same regardless of the default language of the environment
+      *[
+        GinIndex(OpClass(_get_name_expression('names', *languages), name='gin_trgm_ops'), name=f'names_{"_".join(languages)}_trgm_idx_in_stock')
+        for languages in _INDEXED_NAME_LANGUAGES
+      ],
+      *[
+        models.Index(_get_name_expression('names', *languages), name=f'names_{"_".join(languages)}_idx_in_stock')
+        for languages in _INDEXED_NAME_LANGUAGES
+      ],
+      models.Index(fields=['div_yield'], name='div_yield_idx_in_stock'),
+      models.Index(fields=['multi_pp'],  name='multi_pp_idx_in_stock'),
+      GinIndex(fields=['code'], opclasses=['gin_trgm_ops'], name='code_trgm_idx_in_stock'),
+      GinIndex(OpClass(Upper('code'), name='gin_trgm_ops'), name='ucode_trgm_idx_in_stock'),
+      models.Index(fields=['price_rank'],              name='price_rank_idx_in_stock'),
+      models.Index(fields=['dividend_rank'],           name='dividend_rank_idx_in_stock'),
+      models.Index(fields=['div_yield_rank'],          name='yield_rank_idx_in_stock'),
+      models.Index(fields=['payout_ratio_rank'],       name='payout_rank_idx_in_stock'),
+      models.Index(fields=['per_rank'],                name='per_rank_idx_in_stock'),
+      models.Index(fields=['pbr_rank'],                name='pbr_rank_idx_in_stock'),
+      models.Index(fields=['multi_pp_rank'],           name='multi_pp_rank_idx_in_stock'),
+      models.Index(fields=['eps_rank'],                name='eps_rank_idx_in_stock'),
+      models.Index(fields=['bps_rank'],                name='bps_rank_idx_in_stock'),
+      models.Index(fields=['roe_rank'],                name='roe_rank_idx_in_stock'),
+      models.Index(fields=['er_rank'],                 name='er_rank_idx_in_stock'),
+      models.Index(fields=['market_cap_rank'],         name='mcap_rank_idx_in_stock'),
+      models.Index(fields=['operating_cashflow_rank'], name='ocf_rank_idx_in_stock'),
+    ]
     constraints = [
       models.CheckConstraint(condition=models.Q(price__gte=0),      name='price_gte_0_in_stock'),
       models.CheckConstraint(condition=models.Q(dividend__gte=0),   name='dividend_gte_0_in_stock'),
@@ -549,21 +1397,95 @@ class Stock(models.Model):
     verbose_name=gettext_lazy('Skip executing user task'),
     default=False,
   )
+  # Derived metrics which are maintained by the database
+  div_yield = models.GeneratedField(
+    expression=models.Case(
+      models.When(price__gt=0, then=models.F('dividend')/models.F('price')*100.0),
+      default=models.Value(0),
+      output_field=models.FloatField(),
+    ),
+    output_field=models.FloatField(),
+    db_persist=True,
+    verbose_name=gettext_lazy('Dividend yield'),
+  )
+  multi_pp = models.GeneratedField(
+    expression=models.Case(
+      models.When(per__gt=0, pbr__gt=0, then=models.F('per')*models.F('pbr')),
+      default=models.Value(0),
+      output_field=models.FloatField(),
+    ),
+    output_field=models.FloatField(),
+    db_persist=True,
+    verbose_name=gettext_lazy('PER x PBR'),
+  )
+  # Percentile ranks which are refreshed after updating all stocks
+  price_rank              = _create_rank_field(gettext_lazy('Rank of stock price'))
+  dividend_rank           = _create_rank_field(gettext_lazy('Rank of dividend'))
+  div_yield_rank          = _create_rank_field(gettext_lazy('Rank of dividend yield'))
+  payout_ratio_rank       = _create_rank_field(gettext_lazy('Rank of payout ratio'))
+  per_rank                = _create_rank_field(gettext_lazy('Rank of PER'))
+  pbr_rank                = _create_rank_field(gettext_lazy('Rank of PBR'))
+  multi_pp_rank           = _create_rank_field(gettext_lazy('Rank of PER x PBR'))
+  eps_rank                = _create_rank_field(gettext_lazy('Rank of EPS'))
+  bps_rank                = _create_rank_field(gettext_lazy('Rank of BPS'))
+  roe_rank                = _create_rank_field(gettext_lazy('Rank of ROE'))
+  er_rank                 = _create_rank_field(gettext_lazy('Rank of ER'))
+  market_cap_rank         = _create_rank_field(gettext_lazy('Rank of market capitalization'))
+  operating_cashflow_rank = _create_rank_field(gettext_lazy('Rank of operating cashflow'))
+  # The ranks are also refreshed in bulk
+  derived_fields = ('names', *[f'{name}_rank' for name in _RANKED_FIELDS.keys()])
 
   def save(self, *args, **kwargs):
     self.full_clean()
     super().save(*args, **kwargs)
 
   @classmethod
-  def get_choices_as_list(cls):
-    return list(cls.objects.select_targets().values('pk', 'name', 'code').order_by('pk'))
+  def get_choices_as_list(cls, language=None):
+    # Annotate only the localized name because the other values are not needed
+    queryset = cls.objects.filter(skip_task=False).annotate(name=get_localized_name_expression('names', language))
 
-  def get_dict(self):
-    queryset = self.locals.all()
+    return list(queryset.values('pk', 'name', 'code').order_by('pk'))
 
+  @classmethod
+  def refresh_ranks(cls):
+    quote = connection.ops.quote_name
+    ranks = {}
+
+    for name, positive_only in _RANKED_FIELDS.items():
+      if positive_only:
+        # Zero means that the value is not available, so the other values are ranked in their own partition
+        is_available = models.Q(**{f'{name}__gt': 0})
+        partition = models.ExpressionWrapper(is_available, output_field=models.BooleanField())
+        window = models.Window(PercentRank(), partition_by=[partition], order_by=models.F(name).asc())
+        rank = models.Case(models.When(is_available, then=window * 100.0), default=None, output_field=models.FloatField())
+      else:
+        rank = models.Window(PercentRank(), order_by=models.F(name).asc()) * 100.0
+      # Use the alias which does not conflict with the field name
+      ranks[f'new_{name}_rank'] = models.ExpressionWrapper(rank, output_field=models.FloatField())
+    queryset = cls.objects.filter(skip_task=False).order_by().values('pk', **ranks)
+    subquery, params = queryset.query.sql_with_params()
+    table = quote(cls._meta.db_table)
+    pk_column = quote(cls._meta.pk.column)
+    columns = ', '.join([f'{quote(alias.removeprefix("new_"))} = ranks.{quote(alias)}' for alias in ranks.keys()])
+    # Update all ranks in one statement by using the window functions
+    sql = f'UPDATE {table} SET {columns} FROM ({subquery}) AS ranks WHERE {table}.{pk_column} = ranks."pk"'
+
+    # The stocks which are excluded from the targets do not keep their old ranks
+    fields = [f'{name}_rank' for name in _RANKED_FIELDS.keys()]
+    is_ranked = reduce(operator.or_, [models.Q(**{f'{field}__isnull': False}) for field in fields])
+
+    with transaction.atomic():
+      with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        count = cursor.rowcount
+      cls.objects.filter(is_ranked, skip_task=True).update(**{field: None for field in fields})
+
+    return count
+
+  def get_dict(self):
     return {
       'code': self.code,
-      'names': dict([record.get_lang_pair() for record in queryset]),
+      'names': dict(self.names or {}),
       'industry': self.industry.get_dict(),
       'price': float(self.price),
       'dividend': float(self.dividend),
@@ -579,14 +1501,18 @@ class Stock(models.Model):
     }
 
   def get_name(self):
-    return str(self.locals.get_local() or '')
+    return get_localized_name(self, annotation='name')
 
   @classmethod
-  def create_response_kwargs(cls, filename, tree, ordering):
+  def create_response_kwargs(cls, filename, tree, ordering, condition=None, pks=None):
     if not filename:
       filename = generate_default_filename()
     name = urllib.parse.quote(filename.encode('utf-8'))
-    queryset = cls.objects.select_targets(tree=tree).order_by(*ordering)
+    # Use the stored ordering of the screened stocks if it exists
+    if pks is not None:
+      queryset = ScreenedStockList(pks)
+    else:
+      queryset = cls.objects.select_targets(tree=tree, condition=condition).order_by(*ordering)
     rows = (
       [
         obj.code, obj.get_name(), str(obj.industry), str(obj.price), str(obj.dividend),
@@ -624,6 +1550,488 @@ class Stock(models.Model):
   def __str__(self):
     return f'{self.get_name()}({self.code})'
 
+class _Median(models.Aggregate):
+  function = 'PERCENTILE_CONT'
+  name = 'Median'
+  template = '%(function)s(0.5) WITHIN GROUP (ORDER BY %(expressions)s)'
+  output_field = models.FloatField()
+
+class IndustryStatistics(models.Model):
+  industry = models.OneToOneField(
+    Industry,
+    verbose_name=gettext_lazy('Industry'),
+    on_delete=models.CASCADE,
+    related_name='statistics',
+  )
+  count = models.IntegerField(
+    verbose_name=gettext_lazy('The number of stocks'),
+    default=0,
+  )
+  avg_per = models.FloatField(
+    verbose_name=gettext_lazy('Average of PER'),
+    null=True,
+    blank=True,
+  )
+  median_per = models.FloatField(
+    verbose_name=gettext_lazy('Median of PER'),
+    null=True,
+    blank=True,
+  )
+  avg_pbr = models.FloatField(
+    verbose_name=gettext_lazy('Average of PBR'),
+    null=True,
+    blank=True,
+  )
+  median_pbr = models.FloatField(
+    verbose_name=gettext_lazy('Median of PBR'),
+    null=True,
+    blank=True,
+  )
+  avg_roe = models.FloatField(
+    verbose_name=gettext_lazy('Average of ROE'),
+    null=True,
+    blank=True,
+  )
+  median_roe = models.FloatField(
+    verbose_name=gettext_lazy('Median of ROE'),
+    null=True,
+    blank=True,
+  )
+  avg_div_yield = models.FloatField(
+    verbose_name=gettext_lazy('Average of dividend yield'),
+    null=True,
+    blank=True,
+  )
+  median_div_yield = models.FloatField(
+    verbose_name=gettext_lazy('Median of dividend yield'),
+    null=True,
+    blank=True,
+  )
+  updated_at = models.DateTimeField(
+    verbose_name=gettext_lazy('Updated time'),
+    auto_now=True,
+  )
+
+  @classmethod
+  def refresh(cls):
+    aggregates = {'count': models.Count('pk')}
+
+    for name, positive_only in _INDUSTRY_RELATIVE_FIELDS.items():
+      # Zero means that the value is not available
+      condition = models.Q(**{f'{name}__gt': 0}) if positive_only else None
+      value = Cast(name, models.FloatField())
+      aggregates[f'avg_{name}'] = models.Avg(value, filter=condition)
+      aggregates[f'median_{name}'] = _Median(value, filter=condition)
+    # Calculate the statistics of all industries in one query
+    rows = Stock.objects.filter(skip_task=False).order_by().values('industry').annotate(**aggregates)
+    instances = [cls(industry_id=row.pop('industry'), **row) for row in rows]
+    update_fields = list(aggregates.keys()) + ['updated_at']
+
+    with transaction.atomic():
+      cls.objects.bulk_create(instances, update_conflicts=True, unique_fields=['industry'], update_fields=update_fields)
+      # Remove the statistics of the industries which do not have any target stocks
+      cls.objects.exclude(industry__in=[instance.industry_id for instance in instances]).delete()
+
+    return len(instances)
+
+  def __str__(self):
+    return f'{self.industry}({self.count})'
+
+class _FixedPointMixin:
+  # Keep the decimal value as the integer scaled by 10^decimal_places to make the rows compact
+  def __init__(self, *args, max_digits=None, decimal_places=2, **kwargs):
+    self.max_digits = max_digits
+    self.decimal_places = decimal_places
+    super().__init__(*args, **kwargs)
+
+  def deconstruct(self):
+    name, path, args, kwargs = super().deconstruct()
+    kwargs['decimal_places'] = self.decimal_places
+
+    if self.max_digits is not None:
+      kwargs['max_digits'] = self.max_digits
+
+    return name, path, args, kwargs
+
+  def formfield(self, **kwargs):
+    # Input the decimal value instead of the scaled integer (the range of the integer field is not applied)
+    return models.Field.formfield(self, **{
+      'form_class': forms.DecimalField,
+      'max_digits': self.max_digits,
+      'decimal_places': self.decimal_places,
+      **kwargs,
+    })
+
+  def from_db_value(self, value, expression, connection):
+    if value is None:
+      return value
+
+    return decimal.Decimal(value).scaleb(-self.decimal_places)
+
+  def to_python(self, value):
+    if value is None or isinstance(value, decimal.Decimal):
+      return value
+
+    try:
+      return decimal.Decimal(str(value))
+    except decimal.InvalidOperation:
+      raise ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+  def get_prep_value(self, value):
+    value = self.to_python(value)
+
+    if value is None:
+      return value
+
+    return int(value.scaleb(self.decimal_places).to_integral_value(rounding=decimal.ROUND_HALF_UP))
+
+class _FixedPointField(_FixedPointMixin, models.IntegerField):
+  pass
+
+class _BigFixedPointField(_FixedPointMixin, models.BigIntegerField):
+  pass
+
+def _create_fixed_point_field(verbose_name, max_digits):
+  # Use the 4-byte integer if the scaled value can be stored in it
+  field_class = _FixedPointField if max_digits <= 9 else _BigFixedPointField
+
+  return field_class(verbose_name=verbose_name, max_digits=max_digits, decimal_places=2, default=0)
+
+_DAILY_METRIC_FIELDS = [
+  'price', 'dividend', 'per', 'pbr', 'eps', 'bps', 'roe', 'er', 'market_cap', 'payout_ratio', 'operating_cashflow',
+]
+
+class StockDailyMetricsQuerySet(models.QuerySet):
+  def selected_range(self, from_date=None, to_date=None):
+    if from_date and to_date:
+      queryset = self.filter(date__range=[from_date, to_date])
+    elif from_date:
+      queryset = self.filter(date__gte=from_date)
+    elif to_date:
+      queryset = self.filter(date__lte=to_date)
+    else:
+      queryset = self
+
+    return queryset
+
+  def get_series(self, *fields):
+    # Return the list of values for each field in date order
+    names = ['date'] + (list(fields) or _DAILY_METRIC_FIELDS)
+    rows = list(self.order_by('date').values_list(*names))
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    series = {name: list(values) for name, values in zip(names, columns)}
+
+    return series
+
+class StockDailyMetrics(models.Model):
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['stock', 'date'], name='unique_stock_date_in_daily_metrics'),
+    ]
+    indexes = [
+      # The rows are appended in date order, so the small block range index is enough to select the period
+      BrinIndex(fields=['date'], name='date_brin_idx_in_daily_metrics'),
+    ]
+
+  objects = StockDailyMetricsQuerySet.as_manager()
+
+  stock = models.ForeignKey(
+    Stock,
+    verbose_name=gettext_lazy('Stock'),
+    on_delete=models.CASCADE,
+    related_name='daily_metrics',
+    # The unique constraint of (stock, date) is used to look up the metrics of each stock
+    db_index=False,
+  )
+  date = models.DateField(
+    verbose_name=gettext_lazy('Date'),
+  )
+  price              = _create_fixed_point_field(gettext_lazy('Stock price'), max_digits=10)
+  dividend           = _create_fixed_point_field(gettext_lazy('Dividend'), max_digits=7)
+  per                = _create_fixed_point_field(gettext_lazy('PER'), max_digits=7)
+  pbr                = _create_fixed_point_field(gettext_lazy('PBR'), max_digits=7)
+  eps                = _create_fixed_point_field(gettext_lazy('EPS'), max_digits=7)
+  bps                = _create_fixed_point_field(gettext_lazy('BPS'), max_digits=7)
+  roe                = _create_fixed_point_field(gettext_lazy('ROE'), max_digits=6)
+  er                 = _create_fixed_point_field(gettext_lazy('ER'), max_digits=5)
+  market_cap         = _create_fixed_point_field(gettext_lazy('Market Capitalization'), max_digits=10)
+  payout_ratio       = _create_fixed_point_field(gettext_lazy('Payout Ratio'), max_digits=6)
+  operating_cashflow = _create_fixed_point_field(gettext_lazy('Operating Cashflow'), max_digits=10)
+
+  @classmethod
+  def record(cls, date=None):
+    date = date or timezone.localdate()
+    rows = Stock.objects.filter(skip_task=False).order_by().values('pk', *_DAILY_METRIC_FIELDS)
+    instances = [cls(stock_id=row.pop('pk'), date=date, **row) for row in rows]
+    # Overwrite the metrics of the same day if the update is executed again
+    cls.objects.bulk_create(
+      instances,
+      batch_size=getattr(settings, 'STOCK_DAILY_METRICS_BATCH_SIZE', 1000),
+      update_conflicts=True,
+      unique_fields=['stock', 'date'],
+      update_fields=_DAILY_METRIC_FIELDS,
+    )
+
+    return len(instances)
+
+  def __str__(self):
+    return f'{self.stock}({self.date})'
+
+class ScreenedStockList:
+  # Sequence of the screened stocks which fetches only the requested rows by using their primary keys
+  ordered = True
+
+  def __init__(self, pks, queryset=None):
+    self.pks = list(pks)
+    self.queryset = queryset if queryset is not None else Stock.objects.select_targets()
+
+  def _get_records(self, pks):
+    records = self.queryset.in_bulk(pks)
+
+    return [records[pk] for pk in pks if pk in records]
+
+  def __len__(self):
+    return len(self.pks)
+
+  def count(self):
+    return len(self)
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      records = self._get_records(self.pks[key])
+    else:
+      records = self._get_records([self.pks[key]])
+
+      if not records:
+        raise IndexError(key)
+      records = records[0]
+
+    return records
+
+  def iterator(self, chunk_size=512):
+    for start in range(0, len(self.pks), chunk_size):
+      yield from self._get_records(self.pks[start:start+chunk_size])
+
+  def __iter__(self):
+    return self.iterator()
+
+class CursorPage:
+  def __init__(self, object_list, start, paginator, has_previous, has_next):
+    self.object_list = object_list
+    self.start = start
+    self.paginator = paginator
+    self._has_previous = has_previous
+    self._has_next = has_next
+
+  def __len__(self):
+    return len(self.object_list)
+
+  def __iter__(self):
+    return iter(self.object_list)
+
+  @property
+  def is_cursor(self):
+    return True
+
+  def has_next(self):
+    return self._has_next
+
+  def has_previous(self):
+    return self._has_previous
+
+  def has_other_pages(self):
+    return self.has_previous() or self.has_next()
+
+  @property
+  def first_cursor(self):
+    return ''
+
+  @property
+  def next_cursor(self):
+    # Resume just after the last stock of this page
+    return self.paginator.create_cursor(CursorPaginator.AFTER, self.object_list[-1], self.end_index() - 1)
+
+  @property
+  def previous_cursor(self):
+    # Resume just before the first stock of this page
+    return self.paginator.create_cursor(CursorPaginator.BEFORE, self.object_list[0], self.start)
+
+  @property
+  def last_cursor(self):
+    return CursorPaginator.LAST
+
+  def start_index(self):
+    return self.start + 1 if self.object_list else 0
+
+  def end_index(self):
+    return self.start + len(self.object_list)
+
+class CursorPaginator:
+  # Paginator of the ordered queryset which fetches the adjacent page by the keyset of the boundary stock
+  AFTER = 'a'
+  BEFORE = 'b'
+  LAST = 'last'
+
+  def __init__(self, queryset, per_page):
+    ordering = [str(order) for order in queryset.query.order_by]
+    # The stock code is used as the tiebreaker because it is unique
+    if not {'code', '-code'} & set(ordering):
+      ordering += ['code']
+    self.keys = [(order.removeprefix('-'), order.startswith('-')) for order in ordering]
+    self.queryset = queryset
+    self.per_page = per_page
+
+  def create_cursor(self, direction, instance, position):
+    values = [getattr(instance, name) for name, _ in self.keys]
+    data = json.dumps([position, values], cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+    return direction + base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+  def _parse_cursor(self, cursor):
+    # Return None if the cursor is invalid or created for the other ordering
+    try:
+      data = base64.urlsafe_b64decode(cursor[1:] + '=' * (-len(cursor[1:]) % 4))
+      position, values = json.loads(data)
+      is_valid = isinstance(position, int) and isinstance(values, list) and len(values) == len(self.keys)
+    except (ValueError, TypeError):
+      is_valid = False
+
+    return (max(position, 0), values) if is_valid else None
+
+  def _get_ordering(self, is_reversed):
+    # NULL is placed last in ascending order and first in descending order, so the reversed order is also consistent
+    ordering = [
+      models.F(name).desc() if is_descending != is_reversed else models.F(name).asc()
+      for name, is_descending in self.keys
+    ]
+
+    return ordering
+
+  def _get_condition(self, values, is_reversed):
+    # Expand "(ordering columns, code) > (cursor values)" for the mixed directions and NULL values
+    conditions = []
+    same = models.Q()
+
+    for (name, is_descending), value in zip(self.keys, values):
+      is_descending = is_descending != is_reversed
+
+      if value is None:
+        after = models.Q(**{f'{name}__isnull': False}) if is_descending else None
+        current = models.Q(**{f'{name}__isnull': True})
+      else:
+        after = models.Q(**{f'{name}__lt' if is_descending else f'{name}__gt': value})
+        after = after if is_descending else after | models.Q(**{f'{name}__isnull': True})
+        current = models.Q(**{name: value})
+
+      if after is not None:
+        conditions += [same & after]
+      same &= current
+    condition = EMPTY_CONDITION
+
+    for target in conditions:
+      condition = target if condition is EMPTY_CONDITION else condition | target
+
+    return condition
+
+  def _fetch(self, values=None, is_reversed=False):
+    queryset = self.queryset.order_by(*self._get_ordering(is_reversed))
+
+    if values is not None:
+      queryset = queryset.filter(self._get_condition(values, is_reversed))
+    # Fetch one more stock to check whether the other page exists
+    records = list(queryset[:self.per_page + 1])
+
+    return records[:self.per_page], len(records) > self.per_page
+
+  def _get_first_page(self):
+    records, has_next = self._fetch()
+
+    return CursorPage(records, 0, self, False, has_next)
+
+  def _get_last_page(self):
+    records, has_previous = self._fetch(is_reversed=True)
+    # Only the last page counts the stocks to number its rows
+    start = self.queryset.count() - len(records) if has_previous else 0
+
+    return CursorPage(records[::-1], start, self, has_previous, False)
+
+  def get_page(self, cursor):
+    cursor = str(cursor or '')
+    parsed = self._parse_cursor(cursor) if cursor[:1] in [self.AFTER, self.BEFORE] else None
+
+    if cursor == self.LAST:
+      page_obj = self._get_last_page()
+    elif parsed is None:
+      page_obj = self._get_first_page()
+    elif cursor[0] == self.AFTER:
+      position, values = parsed
+      records, has_next = self._fetch(values)
+      # Show the last page if there are no stocks after the cursor
+      page_obj = CursorPage(records, position + 1, self, True, has_next) if records else self._get_last_page()
+    else:
+      position, values = parsed
+      records, has_previous = self._fetch(values, is_reversed=True)
+      # Show the first page if the previous page is not filled
+      if len(records) < self.per_page:
+        page_obj = self._get_first_page()
+      else:
+        page_obj = CursorPage(records[::-1], max(position - len(records), 0), self, has_previous, True)
+
+    return page_obj
+
+def _get_screened_pks_key(condition, ordering, limit=None):
+  # Localized names depend on the current language
+  ordering = ','.join([str(order) for order in ordering])
+  target = f'{normalize_condition(condition)}\n{ordering}\n{get_language()}\n{limit or ""}'
+  digest = hashlib.sha256(target.encode('utf-8')).hexdigest()
+
+  return f'screened-pks:{digest}:{get_stock_data_version()}'
+
+def _select_screened_pks(condition, ordering, limit=None):
+  compiled = compile_condition(condition)
+  # Use the stock code as a tiebreaker to keep the order of the stocks stable between requests
+  queryset = Stock.objects.select_targets(tree=compiled.tree, condition=compiled.condition).order_by(*ordering, 'code')
+  queryset = queryset.values_list('pk', flat=True)
+
+  return list(queryset[:limit] if limit else queryset)
+
+def get_screened_pks(condition, ordering, loader=None, limit=None):
+  # Assumption: the condition and the ordering have already been validated
+  loader = loader or (lambda condition, ordering: _select_screened_pks(condition, ordering, limit=limit))
+  key = _get_screened_pks_key(condition, ordering, limit=limit)
+  pks = cache.get(key)
+
+  if pks is not None:
+    return pks
+  timeout = getattr(settings, 'SCREENER_RESULT_CACHE_TIMEOUT', 10 * 60)
+  lock_timeout = getattr(settings, 'SCREENER_RESULT_LOCK_TIMEOUT', 30)
+  lock_key = f'{key}:lock'
+  # Wait only for about one query time so as not to block the workers behind a slow query
+  deadline = time.monotonic() + min(getattr(settings, 'SCREENER_RESULT_WAIT_TIMEOUT', 1.0), lock_timeout)
+  # Only one request executes the query and the others wait for its result
+  while not (has_lock := cache.add(lock_key, 1, timeout=lock_timeout)):
+    time.sleep(getattr(settings, 'SCREENER_RESULT_POLL_INTERVAL', 0.05))
+    pks = cache.get(key)
+
+    if pks is not None:
+      return pks
+    # Execute the query by itself if the result is not stored in time
+    if time.monotonic() > deadline:
+      break
+
+  try:
+    # The other request may have stored the result before getting the lock
+    pks = cache.get(key) if has_lock else None
+
+    if pks is None:
+      pks = list(loader(condition, ordering))[:limit or None]
+      cache.set(key, pks, timeout=timeout)
+  finally:
+    if has_lock:
+      cache.delete(lock_key)
+
+  return pks
+
 class _IgnoredField:
   def clean(self, value, option):
     pass
@@ -645,6 +2053,23 @@ class StockMembers(models.TextChoices):
   ER                 = 'er',                 gettext_lazy('Equity Ratio')
   MARKET_CAP         = 'market_cap',         gettext_lazy('Market Capitalization')
   OPERATING_CASHFLOW = 'operating_cashflow', gettext_lazy('Operating Cashflow')
+  PER_VS_INDUSTRY       = 'per_vs_industry',       gettext_lazy('PER relative to industry average')
+  PBR_VS_INDUSTRY       = 'pbr_vs_industry',       gettext_lazy('PBR relative to industry average')
+  ROE_VS_INDUSTRY       = 'roe_vs_industry',       gettext_lazy('ROE relative to industry average')
+  DIV_YIELD_VS_INDUSTRY = 'div_yield_vs_industry', gettext_lazy('Dividend yield relative to industry average')
+  PRICE_RANK              = 'price_rank',              gettext_lazy('Percentile rank of stock price')
+  DIVIDEND_RANK           = 'dividend_rank',           gettext_lazy('Percentile rank of dividend')
+  DIV_YIELD_RANK          = 'div_yield_rank',          gettext_lazy('Percentile rank of dividend yield')
+  PAYOUT_RATIO_RANK       = 'payout_ratio_rank',       gettext_lazy('Percentile rank of payout ratio')
+  PER_RANK                = 'per_rank',                gettext_lazy('Percentile rank of PER')
+  PBR_RANK                = 'pbr_rank',                gettext_lazy('Percentile rank of PBR')
+  MULTI_PP_RANK           = 'multi_pp_rank',           format_html('{} ({} &times; {})', gettext_lazy('Percentile rank'), 'PER', 'PBR')
+  EPS_RANK                = 'eps_rank',                gettext_lazy('Percentile rank of EPS')
+  BPS_RANK                = 'bps_rank',                gettext_lazy('Percentile rank of BPS')
+  ROE_RANK                = 'roe_rank',                gettext_lazy('Percentile rank of ROE')
+  ER_RANK                 = 'er_rank',                 gettext_lazy('Percentile rank of ER')
+  MARKET_CAP_RANK         = 'market_cap_rank',         gettext_lazy('Percentile rank of market capitalization')
+  OPERATING_CASHFLOW_RANK = 'operating_cashflow_rank', gettext_lazy('Percentile rank of operating cashflow')
 
   @classmethod
   def get_attribute_types(cls):
@@ -656,8 +2081,10 @@ class StockMembers(models.TextChoices):
       cls.PAYOUT_RATIO.value, cls.PER.value, cls.PBR.value,
       cls.MULTI_PP.value, cls.EPS.value, cls.BPS.value,
       cls.ROE.value, cls.ER.value, cls.MARKET_CAP.value,
-      cls.OPERATING_CASHFLOW.value,
-    ]
+      cls.OPERATING_CASHFLOW.value, cls.PER_VS_INDUSTRY.value,
+      cls.PBR_VS_INDUSTRY.value, cls.ROE_VS_INDUSTRY.value,
+      cls.DIV_YIELD_VS_INDUSTRY.value,
+    ] + cls.get_rank_members()
     pairs = [(key, 'str') for key in for_str] + [(key, 'number') for key in for_number]
     attr_types = dict(pairs)
 
@@ -671,6 +2098,10 @@ class StockMembers(models.TextChoices):
       cls.INDUSTRY.value:  lambda key: LocalizedIndustry._meta.get_field('name'),
       cls.DIV_YIELD.value: lambda key: _IgnoredField(),
       cls.MULTI_PP.value:  lambda key: _IgnoredField(),
+      cls.PER_VS_INDUSTRY.value:       lambda key: _IgnoredField(),
+      cls.PBR_VS_INDUSTRY.value:       lambda key: _IgnoredField(),
+      cls.ROE_VS_INDUSTRY.value:       lambda key: _IgnoredField(),
+      cls.DIV_YIELD_VS_INDUSTRY.value: lambda key: _IgnoredField(),
     }
     targets = [
       cls.CODE.value, cls.NAME.value, cls.INDUSTRY.value,
@@ -678,12 +2109,18 @@ class StockMembers(models.TextChoices):
       cls.PAYOUT_RATIO.value, cls.PER.value, cls.PBR.value,
       cls.MULTI_PP.value, cls.EPS.value, cls.BPS.value,
       cls.ROE.value, cls.ER.value, cls.MARKET_CAP.value,
-      cls.OPERATING_CASHFLOW.value,
-    ]
+      cls.OPERATING_CASHFLOW.value, cls.PER_VS_INDUSTRY.value,
+      cls.PBR_VS_INDUSTRY.value, cls.ROE_VS_INDUSTRY.value,
+      cls.DIV_YIELD_VS_INDUSTRY.value,
+    ] + cls.get_rank_members()
     field_types = dict([(key, rare_cases.get(key, default_case)(key)) for key in targets])
 
     return field_types
 
+  @classmethod
+  def get_rank_members(cls):
+    return [f'{name}_rank' for name in _RANKED_FIELDS.keys()]
+
   @classmethod
   def get_comp_ops(cls):
     pattern = {
@@ -695,13 +2132,16 @@ class StockMembers(models.TextChoices):
 
     return comp_ops
 
+# Define stock fields to check right operand and comparison operators to check the relationship between variable and value
+_stock_validation_schema = _ValidationSchema(
+  StockMembers.get_field_types(),
+  StockMembers.get_comp_ops(),
+  attr_types=StockMembers.get_attribute_types(),
+)
+
 @wrap_validation
 def stock_validator():
-  # Define stock fields to check right operand
-  field_types = StockMembers.get_field_types()
-  # Define comparison operators to check the relationship between variable and value
-  comp_ops = StockMembers.get_comp_ops()
-  visitor = _ValidateCondition(field_types, comp_ops)
+  visitor = _ValidateCondition(schema=_stock_validation_schema)
 
   return visitor
 
@@ -833,19 +2273,10 @@ class PurchasedStockQuerySet(models.QuerySet):
     return self.order_by('purchase_date')
 
   def _annotate_names(self):
-    stocks = LocalizedStock.objects \
-                           .select_current_lang() \
-                           .filter(stock=models.OuterRef('stock'))
-    industries = LocalizedIndustry.objects \
-                                  .select_current_lang() \
-                                  .filter(industry=models.OuterRef('stock__industry'))
-    # Annotation
     queryset = self.annotate(
-      code=models.F('stock__code')
-    ).annotate(
-      name=models.Subquery(stocks.values('name'))
-    ).annotate(
-      industry_name=models.Subquery(industries.values('name'))
+      code=models.F('stock__code'),
+      name=get_localized_name_expression('stock__names'),
+      industry_name=get_localized_name_expression('stock__industry__names'),
     )
 
     return queryset
@@ -855,17 +2286,21 @@ class PurchasedStockQuerySet(models.QuerySet):
       diff=(models.F('stock__price')-models.F('price'))*models.F('count'),
     )
 
-  def select_targets(self, tree=None):
-    queryset = self.select_related('stock') \
-                   .prefetch_related('stock__locals') \
+  def select_targets(self, tree=None, condition=None):
+    queryset = self.select_related('stock__industry') \
                    ._annotate_names() \
                    ._annotate_diff()
 
-    if tree:
+    if condition is None and tree:
       # Assumption: abstract syntax tree is validated by caller
       visitor = _AnalyzeAndCreateQmodelCondition()
       visitor.visit(tree)
-      queryset = queryset.filter(visitor.condition)
+      condition = visitor.condition
+    # Return empty queryset without executing the query if the condition never matches
+    if condition is EMPTY_CONDITION:
+      queryset = queryset.none()
+    elif condition is not None:
+      queryset = queryset.filter(condition)
 
     return queryset
 
@@ -1070,13 +2505,16 @@ class PurchasedStockMembers(models.TextChoices):
 
     return comp_ops
 
+# Define purchased stock fields to check right operand and comparison operators to check the relationship between variable and value
+_purchased_stock_validation_schema = _ValidationSchema(
+  PurchasedStockMembers.get_field_types(),
+  PurchasedStockMembers.get_comp_ops(),
+  attr_types=PurchasedStockMembers.get_attribute_types(),
+)
+
 @wrap_validation
 def purchased_stock_validator():
-  # Define purchased stock fields to check right operand
-  field_types = PurchasedStockMembers.get_field_types()
-  # Define comparison operators to check the relationship between variable and value
-  comp_ops = PurchasedStockMembers.get_comp_ops()
-  visitor = _ValidateCondition(field_types, comp_ops)
+  visitor = _ValidateCondition(schema=_purchased_stock_validation_schema)
 
   return visitor
 
@@ -1215,6 +2653,77 @@ class _SnapshotRecord:
 
     return header
 
+class SnapshotRecordMembers(models.TextChoices):
+  CODE               = 'code',               gettext_lazy('Stock code')
+  NAME               = 'name',               gettext_lazy('Stock name')
+  INDUSTRY           = 'industry',           gettext_lazy('Stock industry')
+  PRICE              = 'price',              gettext_lazy('Stock price')
+  DIVIDEND           = 'dividend',           gettext_lazy('Dividend')
+  REAL_DIV           = 'real_div',           gettext_lazy('Received dividend')
+  DIV_YIELD          = 'div_yield',          gettext_lazy('Dividend yield')
+  STOCK_YIELD        = 'stock_yield',        gettext_lazy('Dividend yield based on current price')
+  PAYOUT_RATIO       = 'payout_ratio',       gettext_lazy('Payout Ratio')
+  PER                = 'per',                gettext_lazy('Price Earnings Ratio')
+  PBR                = 'pbr',                gettext_lazy('Price Book-value Ratio')
+  EPS                = 'eps',                gettext_lazy('Earnings Per Share')
+  BPS                = 'bps',                gettext_lazy('Book value Per Share')
+  ROE                = 'roe',                gettext_lazy('Return On Equity')
+  ER                 = 'er',                 gettext_lazy('Equity Ratio')
+  MARKET_CAP         = 'market_cap',         gettext_lazy('Market Capitalization')
+  OPERATING_CASHFLOW = 'operating_cashflow', gettext_lazy('Operating Cashflow')
+  PURCHASED_VALUE    = 'purchased_value',    gettext_lazy('Purchased price')
+  COUNT              = 'count',              gettext_lazy('The number of purchased stocks')
+  DIFF               = 'diff',               gettext_lazy('Difference')
+
+  @classmethod
+  def get_attribute_types(cls):
+    for_str = [cls.CODE.value, cls.NAME.value, cls.INDUSTRY.value]
+    attr_types = dict([(key, 'str' if key in for_str else 'number') for key in cls.values])
+
+    return attr_types
+
+  @classmethod
+  def get_field_types(cls):
+    default_case = lambda key: Stock._meta.get_field(key)
+    ignored_case = lambda key: _IgnoredField()
+    rare_cases = {
+      cls.NAME.value:            lambda key: LocalizedStock._meta.get_field('name'),
+      cls.INDUSTRY.value:        lambda key: LocalizedIndustry._meta.get_field('name'),
+      cls.COUNT.value:           lambda key: PurchasedStock._meta.get_field('count'),
+      cls.REAL_DIV.value:        ignored_case,
+      cls.DIV_YIELD.value:       ignored_case,
+      cls.STOCK_YIELD.value:     ignored_case,
+      cls.PURCHASED_VALUE.value: ignored_case,
+      cls.DIFF.value:            ignored_case,
+    }
+    field_types = dict([(key, rare_cases.get(key, default_case)(key)) for key in cls.values])
+
+    return field_types
+
+  @classmethod
+  def get_comp_ops(cls):
+    pattern = {
+      'str': FOR_STRING,
+      'number': FOR_NUMBER,
+    }
+    attr_types = cls.get_attribute_types()
+    comp_ops = {key: pattern[val] for key, val in attr_types.items()}
+
+    return comp_ops
+
+# Define the attributes of snapshot records to check right operand and comparison operators to check the relationship between variable and value
+_snapshot_record_validation_schema = _ValidationSchema(
+  SnapshotRecordMembers.get_field_types(),
+  SnapshotRecordMembers.get_comp_ops(),
+  attr_types=SnapshotRecordMembers.get_attribute_types(),
+)
+
+@wrap_validation
+def snapshot_record_validator():
+  visitor = _ValidateCondition(schema=_snapshot_record_validation_schema)
+
+  return visitor
+
 class Snapshot(models.Model):
   class Meta:
     ordering = ('priority', '-end_date', )
@@ -1397,14 +2906,17 @@ class Snapshot(models.Model):
 
     return out
 
-  def get_each_record(self):
+  def get_each_record(self, condition=''):
+    # Assumption: the condition is validated by snapshot_record_validator
+    predicate = compile_condition(condition).predicate
     records = self.create_records()
     cash = records.pop('cash')
     all_snapshots = (records[key] for key in sorted(records.keys(), key=lambda val: val.zfill(6)))
 
     yield cash
     for snapshot in all_snapshots:
-      yield snapshot
+      if predicate is None or predicate(snapshot):
+        yield snapshot
 
   def update_periodic_task(self, periodic_task, crontab):
     periodic_task.crontab = crontab
@@ -1464,6 +2976,39 @@ class Snapshot(models.Model):
     # Update relevant fields
     #cls.objects.bulk_update(records, fields=['detail'])
 
+class _ArraySlice(models.Func):
+  template = '(%(expressions)s)[1:%(size)s]'
+
+class _ScreenerFieldIndex:
+  def __init__(self):
+    self.version = None
+    self._index = {}
+    self._lock = threading.Lock()
+
+  def _build(self):
+    index = {}
+    # Create inverted index from the referenced fields to the screeners
+    for instance in StockScreener.objects.only('pk', 'condition', 'ordering'):
+      for name in instance.get_referenced_fields():
+        index.setdefault(name, set()).add(instance.pk)
+
+    return index
+
+  def lookup(self, fields):
+    version = get_screener_data_version()
+
+    with self._lock:
+      # Rebuild the index if the screeners have been changed
+      if self.version is None or self.version != version:
+        self._index = self._build()
+        self.version = version
+      index = self._index
+    pks = set().union(*[index.get(name, set()) for name in fields])
+
+    return pks
+
+_screener_field_index = _ScreenerFieldIndex()
+
 class StockScreener(models.Model):
   class Meta:
     ordering = ('priority', 'title')
@@ -1496,24 +3041,355 @@ class StockScreener(models.Model):
     blank=True,
     validators=[stock_ordering_validator],
   )
+  top_n = models.IntegerField(
+    verbose_name=gettext_lazy('The number of stocks to show'),
+    help_text=gettext_lazy('Only the first N stocks in the ordering are shown. 0 means all stocks.'),
+    validators=[MinValueValidator(0)],
+    default=0,
+  )
+  # Materialized result of this screener
+  matched_stocks = models.JSONField(
+    verbose_name=gettext_lazy('Matched stocks'),
+    help_text=gettext_lazy('Primary keys of the matched stocks in screener ordering.'),
+    default=list,
+    blank=True,
+    editable=False,
+  )
+  matched_count = models.IntegerField(
+    verbose_name=gettext_lazy('The number of matched stocks'),
+    default=0,
+    editable=False,
+  )
+  result_key = models.CharField(
+    max_length=64,
+    verbose_name=gettext_lazy('Result key'),
+    help_text=gettext_lazy('Fingerprint of the condition and ordering used for the matched stocks.'),
+    blank=True,
+    editable=False,
+  )
+  refreshed_at = models.DateTimeField(
+    verbose_name=gettext_lazy('Refreshed time'),
+    null=True,
+    blank=True,
+    editable=False,
+  )
 
-  def get_screened_stocks(self):
-    tree = get_tree(self.condition)
-    # Check ordering
+  def get_ordering(self):
     if self.ordering:
       ordering = StockOrderingTypes.separate(self.ordering)
     else:
       ordering = [StockOrderingTypes.CODE_ASC.value]
-    # Get queryset
-    queryset = Stock.objects.select_targets(tree=tree).order_by(*ordering)
+
+    return ordering
+
+  def get_result_key(self):
+    ordering = ','.join(self.get_ordering())
+    target = f'{normalize_condition(self.condition)}\n{ordering}'
+    result_key = hashlib.sha256(target.encode('utf-8')).hexdigest()
+
+    return result_key
+
+  def get_referenced_fields(self):
+    ordering = [str(order).lstrip('-') for order in self.get_ordering()]
+    fields = compile_condition(self.condition).fields | frozenset(ordering)
+
+    return fields
+
+  @property
+  def is_refreshed(self):
+    return self.refreshed_at is not None and self.result_key == self.get_result_key()
+
+  def get_screened_queryset(self):
+    compiled = compile_condition(self.condition)
+    ordering = self.get_ordering()
+    # Use the stock code as a tiebreaker to keep the same order as the shared results
+    queryset = Stock.objects.select_targets(tree=compiled.tree, condition=compiled.condition).order_by(*ordering, 'code')
 
     return queryset
 
+  def get_screened_stocks(self):
+    # Use the materialized result if it matches the current condition and ordering
+    if self.is_refreshed:
+      pks = self.matched_stocks[:self.top_n] if self.top_n > 0 else self.matched_stocks
+      stocks = ScreenedStockList(pks)
+    else:
+      # Share the result with the other users who use the same condition and ordering (only the first N stocks are fetched)
+      pks = get_screened_pks(self.condition, self.get_ordering(), limit=self.top_n if self.top_n > 0 else None)
+      stocks = ScreenedStockList(pks)
+
+    return stocks
+
+  def update_result(self, pks, refreshed_at=None):
+    self.matched_stocks = list(pks)
+    self.matched_count = len(self.matched_stocks)
+    self.result_key = self.get_result_key()
+    self.refreshed_at = refreshed_at or timezone.now()
+
+  @classmethod
+  def refresh_results(cls, queryset=None):
+    if queryset is None:
+      queryset = cls.objects.all()
+    refreshed_at = timezone.now()
+    results = {}
+    records = []
+
+    with transaction.atomic():
+      # Use the same lock as the update of memberships so as not to lose either result
+      for instance in queryset.only('pk', 'condition', 'ordering').order_by('pk').select_for_update():
+        result_key = instance.get_result_key()
+        # Execute the query only once for the same condition and ordering
+        if result_key not in results:
+          results[result_key] = list(instance.get_screened_queryset().values_list('pk', flat=True))
+        instance.update_result(results[result_key], refreshed_at=refreshed_at)
+        records += [instance]
+      # Update relevant fields
+      fields = ['matched_stocks', 'matched_count', 'result_key', 'refreshed_at']
+      cls.objects.bulk_update(records, fields=fields, batch_size=64)
+
+    return len(records)
+
+  @classmethod
+  def update_memberships(cls, pk, fields=None):
+    queryset = cls.objects.filter(refreshed_at__isnull=False)
+    # Skip the screeners which do not refer to the updated fields
+    if fields is not None:
+      queryset = queryset.filter(pk__in=_screener_field_index.lookup(fields))
+    refreshed_at = timezone.now()
+    records = []
+
+    with transaction.atomic():
+      # Lock only the screeners which refer to the changed fields in the same order as refresh_results to avoid deadlocks
+      groups = {}
+
+      for instance in queryset.order_by('pk').select_for_update():
+        if instance.is_refreshed:
+          groups.setdefault(instance.get_result_key(), []).append(instance)
+      if not groups:
+        return 0
+      # Evaluate all conditions against the updated stock in one query
+      annotations = {}
+
+      for idx, instances in enumerate(groups.values()):
+        condition = compile_condition(instances[0].condition).condition
+
+        if condition:
+          matched = models.Case(models.When(condition, then=models.Value(True)), default=models.Value(False))
+        else:
+          matched = models.Value(True)
+        annotations[f'matched_{idx}'] = models.ExpressionWrapper(matched, output_field=models.BooleanField())
+      results = Stock.objects.select_targets().filter(pk=pk).values(**annotations).first() or {}
+
+      for idx, instances in enumerate(groups.values()):
+        pks = instances[0].matched_stocks
+        ordering = instances[0].get_ordering()
+        is_member = pk in pks
+        is_matched = results.get(f'matched_{idx}', False)
+        is_reordered = fields is None or any([str(order).lstrip('-') in fields for order in ordering])
+
+        if is_member == is_matched and not (is_matched and is_reordered):
+          continue
+        if is_matched:
+          # Sort only the matched stocks instead of screening all stocks
+          targets = Stock.objects.select_targets().filter(pk__in=[*pks, pk]).order_by(*ordering, 'code')
+          new_pks = list(targets.values_list('pk', flat=True))
+        else:
+          new_pks = [val for val in pks if val != pk]
+
+        if new_pks == pks:
+          continue
+
+        for instance in instances:
+          instance.update_result(new_pks, refreshed_at=refreshed_at)
+          records += [instance]
+      # Update relevant fields
+      fields = ['matched_stocks', 'matched_count', 'result_key', 'refreshed_at']
+      cls.objects.bulk_update(records, fields=fields, batch_size=64)
+
+    return len(records)
+
+  @classmethod
+  def evaluate_screeners(cls, screeners, top_n=0):
+    groups = {}
+    aggregations = {}
+
+    for instance in screeners:
+      groups.setdefault(instance.get_result_key(), []).append(instance)
+    # Evaluate all conditions in one query by using conditional aggregation
+    for idx, instances in enumerate(groups.values()):
+      compiled = compile_condition(instances[0].condition)
+      # Skip the condition which never matches
+      if compiled.is_unsatisfiable:
+        continue
+      aggregations[f'count_{idx}'] = models.Count('pk', filter=compiled.condition)
+
+      if top_n > 0:
+        # Use the stock code as a tiebreaker to get the same codes between refreshes
+        codes = ArrayAgg('code', filter=compiled.condition, order_by=[*instances[0].get_ordering(), 'code'])
+        aggregations[f'codes_{idx}'] = _ArraySlice(codes, size=int(top_n))
+    results = Stock.objects.select_targets().aggregate(**aggregations) if aggregations else {}
+
+    for idx, instances in enumerate(groups.values()):
+      for instance in instances:
+        instance.live_count = results.get(f'count_{idx}', 0)
+        instance.top_codes = results.get(f'codes_{idx}', None) or []
+
+    return screeners
+
+  def profile(self):
+    results = profile_condition(self.condition, self.get_ordering())
+    instance = ScreenerProfile.objects.create(screener=self, **results)
+    # Keep only the latest records
+    history = getattr(settings, 'SCREENER_PROFILE_HISTORY', 30)
+    pks = self.profiles.values_list('pk', flat=True)[max(history, 1):]
+    ScreenerProfile.objects.filter(pk__in=list(pks)).delete()
+
+    return instance
+
   def get_initial_for_stock_download_form(self):
     out = {
       'condition': mark_safe(self.condition),
       'ordering': self.ordering,
       'allowed_long_condition': True,
+      'screener': self.pk,
     }
 
-    return out
\ No newline at end of file
+    return out
+
+def _walk_plan(node):
+  yield node
+
+  for child in node.get('Plans', []):
+    yield from _walk_plan(child)
+
+def analyze_plan(plan):
+  nodes = list(_walk_plan(plan['Plan']))
+  scans = [node for node in nodes if node['Node Type'].endswith('Scan')]
+  # Count the rows which are read by each scan including the rows removed by its filter
+  get_scanned_rows = lambda node: (
+    node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0) + node.get('Rows Removed by Index Recheck', 0)
+  ) * node.get('Actual Loops', 1)
+  results = {
+    'planning_time': plan.get('Planning Time', None),
+    'execution_time': plan.get('Execution Time', None),
+    'total_rows': int(plan['Plan'].get('Actual Rows', 0)),
+    'scanned_rows': int(sum([get_scanned_rows(node) for node in scans])),
+    'indexes': sorted(set([node['Index Name'] for node in nodes if 'Index Name' in node])),
+    'seq_scans': sorted(set([node['Relation Name'] for node in scans if node['Node Type'] == 'Seq Scan' and 'Relation Name' in node])),
+  }
+
+  return results
+
+def profile_condition(condition, ordering=None):
+  ordering = ordering or [StockOrderingTypes.CODE_ASC.value]
+  # Measure each step without using the cached results
+  start = time.perf_counter()
+  tree = get_tree(condition)
+  parse_time = time.perf_counter() - start
+  start = time.perf_counter()
+
+  if tree is not None:
+    visitor = _ValidateCondition(schema=_stock_validation_schema)
+    visitor.visit(tree)
+    visitor.validate()
+  validate_time = time.perf_counter() - start
+  start = time.perf_counter()
+  compiled = CompiledCondition(tree)
+  q_cond = compiled.condition
+  compile_time = time.perf_counter() - start
+  results = {
+    'condition': condition,
+    'ordering': ','.join([str(order) for order in ordering]),
+    'parse_time': parse_time * 1000,
+    'validate_time': validate_time * 1000,
+    'compile_time': compile_time * 1000,
+    'plan': None,
+  }
+  # The query is not executed if the condition never matches
+  if not compiled.is_unsatisfiable:
+    queryset = Stock.objects.select_targets(tree=compiled.tree, condition=q_cond).order_by(*ordering)
+    plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]
+    results.update(analyze_plan(plan))
+    results['plan'] = plan
+
+  return results
+
+class ScreenerProfile(models.Model):
+  class Meta:
+    ordering = ('-created_at', '-pk')
+
+  screener = models.ForeignKey(
+    StockScreener,
+    verbose_name=gettext_lazy('Stock screener'),
+    on_delete=models.CASCADE,
+    related_name='profiles',
+  )
+  condition = models.TextField(
+    verbose_name=gettext_lazy('Condition'),
+    help_text=gettext_lazy('Condition used for the profile.'),
+    blank=True,
+  )
+  ordering = models.TextField(
+    verbose_name=gettext_lazy('Ordering'),
+    help_text=gettext_lazy('Ordering used for the profile.'),
+    blank=True,
+  )
+  parse_time = models.FloatField(
+    verbose_name=gettext_lazy('Parse time (ms)'),
+    default=0,
+  )
+  validate_time = models.FloatField(
+    verbose_name=gettext_lazy('Validation time (ms)'),
+    default=0,
+  )
+  compile_time = models.FloatField(
+    verbose_name=gettext_lazy('Compile time (ms)'),
+    default=0,
+  )
+  planning_time = models.FloatField(
+    verbose_name=gettext_lazy('Planning time (ms)'),
+    null=True,
+    blank=True,
+  )
+  execution_time = models.FloatField(
+    verbose_name=gettext_lazy('Execution time (ms)'),
+    null=True,
+    blank=True,
+  )
+  total_rows = models.IntegerField(
+    verbose_name=gettext_lazy('The number of matched rows'),
+    default=0,
+  )
+  scanned_rows = models.IntegerField(
+    verbose_name=gettext_lazy('The number of scanned rows'),
+    default=0,
+  )
+  indexes = models.JSONField(
+    verbose_name=gettext_lazy('Used indexes'),
+    default=list,
+    blank=True,
+  )
+  seq_scans = models.JSONField(
+    verbose_name=gettext_lazy('Sequentially scanned tables'),
+    default=list,
+    blank=True,
+  )
+  plan = models.JSONField(
+    verbose_name=gettext_lazy('Query plan'),
+    help_text=gettext_lazy('Result of EXPLAIN (ANALYZE, BUFFERS) in json format.'),
+    null=True,
+    blank=True,
+  )
+  created_at = models.DateTimeField(
+    verbose_name=gettext_lazy('Creation time'),
+    default=timezone.now,
+  )
+
+  def __str__(self):
+    target_time = convert_timezone(self.created_at, is_string=True)
+    out = f'{self.screener.title}({target_time})'
+
+    return out
+
+  @property
+  def uses_index(self):
+    return len(self.indexes) > 0
\ No newline at end of file
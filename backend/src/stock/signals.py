@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django_celery_beat.models import PeriodicTask
+from utils.models import bump_model_data_version
+from .models import (
+  Industry, LocalizedIndustry, Stock, LocalizedStock, StockScreener, Cash, PurchasedStock, Snapshot,
+  bump_stock_data_version, bump_screener_data_version, bump_industry_names_version,
+)
+from .tasks import refresh_screener_results
+
+def update_stock_data_version(sender, **kwargs):
+  bump_stock_data_version()
+
+def update_screener_data_version(sender, **kwargs):
+  bump_screener_data_version()
+
+def update_model_data_version(sender, **kwargs):
+  bump_model_data_version(sender)
+
+def update_owner_names(sender, instance, **kwargs):
+  instance.update_owner_names()
+
+def update_industry_names_version(sender, **kwargs):
+  bump_industry_names_version()
+
+def refresh_screener_result(sender, instance, **kwargs):
+  # Refresh the result in background only if the condition or ordering has been changed
+  if not instance.is_refreshed:
+    transaction.on_commit(lambda: refresh_screener_results.delay(pk=instance.pk))
+
+# The denormalized names are updated before the data version is bumped
+for model in [LocalizedIndustry, LocalizedStock]:
+  post_save.connect(update_owner_names, sender=model, dispatch_uid=f'owner_names_on_save_{model.__name__}')
+  post_delete.connect(update_owner_names, sender=model, dispatch_uid=f'owner_names_on_delete_{model.__name__}')
+post_save.connect(update_industry_names_version, sender=LocalizedIndustry, dispatch_uid='industry_names_version_on_save')
+post_delete.connect(update_industry_names_version, sender=LocalizedIndustry, dispatch_uid='industry_names_version_on_delete')
+for model in [Industry, LocalizedIndustry, Stock, LocalizedStock]:
+  post_save.connect(update_stock_data_version, sender=model, dispatch_uid=f'stock_data_version_on_save_{model.__name__}')
+  post_delete.connect(update_stock_data_version, sender=model, dispatch_uid=f'stock_data_version_on_delete_{model.__name__}')
+# The numbers of records in the list pages depend on these versions
+for model in [Cash, PurchasedStock, Snapshot, PeriodicTask]:
+  post_save.connect(update_model_data_version, sender=model, dispatch_uid=f'model_data_version_on_save_{model.__name__}')
+  post_delete.connect(update_model_data_version, sender=model, dispatch_uid=f'model_data_version_on_delete_{model.__name__}')
+post_save.connect(refresh_screener_result, sender=StockScreener, dispatch_uid='refresh_screener_result_on_save')
+post_save.connect(update_screener_data_version, sender=StockScreener, dispatch_uid='screener_data_version_on_save')
+post_delete.connect(update_screener_data_version, sender=StockScreener, dispatch_uid='screener_data_version_on_delete')
@@ -5,10 +5,17 @@ from django_celery_results.models import TaskResult
 from django_celery_beat.models import CrontabSchedule
 from django.utils.translation import gettext_lazy
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
-from stock.models import Snapshot, convert_timezone, get_user_function
+from utils.models import bump_model_data_version
+from stock.models import (
+  Snapshot, Industry, Stock, StockMembers, StockScreener, IndustryStatistics, StockDailyMetrics,
+  convert_timezone, get_user_function, bump_stock_data_version, bump_industry_names_version,
+)
+from stock.catalog import refresh_catalogs
 from datetime import datetime, timedelta
+import uuid
 
 UserModel = get_user_model()
 
@@ -66,6 +73,8 @@ def register_monthly_report(day_offset):
     instance.update_record()
     records += [instance]
   Snapshot.objects.bulk_create(records)
+  # The signals are not sent by bulk_create
+  bump_model_data_version(Snapshot)
 
 @shared_task(ignore_result=True)
 def update_specific_snapshot(user_pk, snapshot_pk):
@@ -76,8 +85,134 @@ def update_specific_snapshot(user_pk, snapshot_pk):
   except Exception as ex:
     g_logger.error(f'Failed to update the record({ex}).')
 
+def _get_update_run_key(run_id):
+  return f'stock-update-run:{run_id}'
+
+def start_update_run():
+  run_id = uuid.uuid4().hex
+  # Count the number of finished tasks for each run
+  cache.set(_get_update_run_key(run_id), 0, timeout=24*60*60)
+
+  return run_id
+
+def _finish_update_task(run_id, total):
+  key = _get_update_run_key(run_id)
+
+  try:
+    count = cache.incr(key)
+  except ValueError:
+    # The run has already been finished or expired
+    count = -1
+  is_finished = count >= total
+
+  if is_finished:
+    cache.delete(key)
+
+  return is_finished
+
+@shared_task(ignore_result=True)
+def refresh_screener_results(pk=None):
+  queryset = StockScreener.objects.all()
+
+  if pk is not None:
+    queryset = queryset.filter(pk=pk)
+
+  try:
+    count = StockScreener.refresh_results(queryset)
+    g_logger.info(f'The results of {count} screeners are refreshed.')
+  except Exception as ex:
+    g_logger.error(f'Failed to refresh the results of screeners({ex}).')
+
+def _get_screening_values(pk):
+  fields = list(StockMembers.get_attribute_types().keys())
+  values = Stock.objects.select_targets().filter(pk=pk).values(*fields).first()
+
+  return values
+
+def _update_screener_memberships(pk, old_values):
+  new_values = _get_screening_values(pk)
+
+  if old_values is None or new_values is None:
+    # All screeners are affected when the stock is added to or removed from the targets
+    fields = None if old_values != new_values else []
+  else:
+    fields = [key for key, val in new_values.items() if old_values.get(key) != val]
+
+  if fields is None or fields:
+    try:
+      count = StockScreener.update_memberships(pk, fields=fields)
+      g_logger.info(f'The results of {count} screeners are updated.')
+    except Exception as ex:
+      g_logger.error(f'Failed to update the results of screeners({ex}).')
+
+def _refresh_localized_names():
+  try:
+    # The user task may update the localized records without calling save method
+    count = Industry.refresh_names() + Stock.refresh_names()
+    bump_industry_names_version()
+    bump_stock_data_version()
+    g_logger.info(f'The localized names of {count} records are refreshed.')
+  except Exception as ex:
+    g_logger.error(f'Failed to refresh the localized names({ex}).')
+
+def _record_daily_metrics():
+  try:
+    count = StockDailyMetrics.record()
+    g_logger.info(f'The daily metrics of {count} stocks are recorded.')
+  except Exception as ex:
+    g_logger.error(f'Failed to record the daily metrics of stocks({ex}).')
+
+def _refresh_stock_catalogs():
+  try:
+    # Precompute the catalogs after the last update of stock data in the run
+    count = refresh_catalogs()
+    g_logger.info(f'The stock catalogs of {count} languages are refreshed.')
+  except Exception as ex:
+    g_logger.error(f'Failed to refresh the stock catalogs({ex}).')
+
+def _refresh_percentile_ranks():
+  try:
+    count = Stock.refresh_ranks()
+    bump_stock_data_version()
+    g_logger.info(f'The percentile ranks of {count} stocks are refreshed.')
+  except Exception as ex:
+    g_logger.error(f'Failed to refresh the percentile ranks of stocks({ex}).')
+
+def _refresh_industry_statistics():
+  try:
+    count = IndustryStatistics.refresh()
+    # The industry-relative values of stocks are changed
+    bump_stock_data_version()
+    g_logger.info(f'The statistics of {count} industries are refreshed.')
+  except Exception as ex:
+    g_logger.error(f'Failed to refresh the statistics of industries({ex}).')
+
 @shared_task(bind=True)
 def update_stock_records(self, **kwargs):
-  ret = g_updater(logger=g_logger, **kwargs)
+  run_id = kwargs.pop('run_id', None)
+  pk = kwargs.get('pk', None)
+  # The results of all screeners are refreshed at the end of the run instead of updating them per stock
+  is_single = pk is not None and run_id is None
+  old_values = _get_screening_values(pk) if is_single else None
+
+  try:
+    ret = g_updater(logger=g_logger, **kwargs)
+  finally:
+    # The user task may update the records without calling save method
+    # (the tasks of a run bump the version only once at the end so as not to invalidate the caches for each stock)
+    if run_id is None:
+      bump_stock_data_version()
+    # Re-evaluate only the updated stock against the screeners which refer to the changed fields
+    if is_single:
+      _update_screener_memberships(pk, old_values)
+    # Refresh the precomputed values and the results of screeners in one pass after the last task of the run
+    if run_id is not None and _finish_update_task(run_id, kwargs.get('total', 0)):
+      bump_stock_data_version()
+      _refresh_localized_names()
+      _refresh_percentile_ranks()
+      _refresh_industry_statistics()
+      _record_daily_metrics()
+      _refresh_stock_catalogs()
+      refresh_screener_results.delay()
 
   return ret
\ No newline at end of file
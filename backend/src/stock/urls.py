@@ -7,6 +7,7 @@ urlpatterns = [
   path('', views.Dashboard.as_view(), name='dashboard'),
   path('investment-history', views.InvestmentHistory.as_view(), name='investment_history'),
   path('ajax/stock', views.StockAjaxResponse.as_view(), name='ajax_stock'),
+  path('ajax/stock/search', views.StockSearchResponse.as_view(), name='search_stock'),
   # Cash
   path('list/cashes', views.ListCash.as_view(), name='list_cash'),
   path('register/cash', views.RegisterCash.as_view(), name='register_cash'),
@@ -41,6 +42,7 @@ urlpatterns = [
   path('update/stock-screener/<int:pk>', views.UpdateStockScreener.as_view(), name='update_stock_screener'),
   path('delete/stock-screener/<int:pk>', views.DeleteStockScreener.as_view(), name='delete_stock_screener'),
   path('detail/stock-screener/<int:pk>', views.DetailScreenedStock.as_view(), name='detail_stock_screener'),
+  path('profile/stock-screener/<int:pk>', views.ProfileStockScreener.as_view(), name='profile_stock_screener'),
   # Stock
   path('list/stocks', views.ListStock.as_view(), name='list_stock'),
   path('download/stocks', views.DownloadStockPage.as_view(), name='download_stock'),
@@ -9,9 +9,12 @@ from django.views.generic import (
 )
 from django.conf import settings
 from django.core.exceptions import NON_FIELD_ERRORS
+from django.core.paginator import Paginator
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.utils.translation import gettext_lazy
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponseRedirect
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseRedirect, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from django.urls import reverse_lazy, reverse
 from django_celery_beat.models import PeriodicTask
 from utils.views import (
@@ -20,10 +23,13 @@ from utils.views import (
   UpdateViewBasedOnUser,
   CustomDeleteView,
   DjangoBreadcrumbsMixin,
+  CachedCountMixin,
+  RemoteSearchView,
 )
 from account.views import Index
-from . import models, forms
+from . import models, forms, catalog
 from utils.models import streaming_csv_file
+import re
 
 class Dashboard(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
   model = models.Snapshot
@@ -53,13 +59,48 @@ class StockAjaxResponse(View):
   raise_exception = True
   http_method_names = ['get']
 
+  accepts_gzip = re.compile(r'\bgzip\b')
+
+  def get_since(self):
+    try:
+      since = int(self.request.GET.get('since', ''))
+    except ValueError:
+      # Return the whole catalog if the version is not specified
+      since = None
+
+    return since
+
   def get(self, request, *args, **kwargs):
-    data = models.Stock.get_choices_as_list()
-    response = JsonResponse({'qs': data})
+    stock_catalog = catalog.get_catalog()
+    since = self.get_since()
+    is_compressed = bool(self.accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+    etag = stock_catalog.get_etag(since=since, is_compressed=is_compressed)
+    response = get_conditional_response(request, etag=etag, last_modified=stock_catalog.last_modified)
+    # Return the catalog only if the client does not have the latest one
+    if response is None:
+      content = stock_catalog.get_content(since=since, is_compressed=is_compressed)
+      response = HttpResponse(content, content_type='application/json')
+
+      if is_compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stock_catalog.last_modified)
+    patch_vary_headers(response, ['Accept-Encoding', 'Accept-Language'])
+    patch_cache_control(response, no_cache=True)
 
     return response
 
-class ListCash(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
+class StockSearchResponse(LoginRequiredMixin, RemoteSearchView):
+  raise_exception = True
+  search_fields = ['code', 'name']
+  ordering = ['code']
+
+  def get_queryset(self):
+    queryset = models.Stock.objects.filter(skip_task=False).annotate(name=models.get_localized_name_expression('names'))
+
+    return queryset
+
+class ListCash(LoginRequiredMixin, CachedCountMixin, ListView, DjangoBreadcrumbsMixin):
   model = models.Cash
   template_name = 'stock/cashes.html'
   paginate_by = 24
@@ -103,12 +144,13 @@ class DeleteCash(CustomDeleteView, DjangoBreadcrumbsMixin):
   model = models.Cash
   success_url = reverse_lazy('stock:list_cash')
 
-class ListPurchasedStock(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
+class ListPurchasedStock(LoginRequiredMixin, CachedCountMixin, ListView, DjangoBreadcrumbsMixin):
   model = models.PurchasedStock
   template_name = 'stock/purchased_stocks.html'
   form_class = forms.PurchasedStockFilteringForm
   paginate_by = 20
   context_object_name = 'pstocks'
+  count_data_labels = [models.STOCK_DATA_LABEL]
   crumbles = DjangoBreadcrumbsMixin.get_target_crumbles(
     url_name='stock:list_purchased_stock',
     title=gettext_lazy('purchased stock list'),
@@ -211,7 +253,7 @@ class DownloadCsvPurchasedStock(LoginRequiredMixin, FormView):
 
     return response
 
-class ListSnapshot(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
+class ListSnapshot(LoginRequiredMixin, CachedCountMixin, ListView, DjangoBreadcrumbsMixin):
   model = models.Snapshot
   template_name = 'stock/snapshots.html'
   paginate_by = 36
@@ -294,6 +336,11 @@ class DetailSnapshot(LoginRequiredMixin, IsSnapshotOwner, DetailView, DjangoBrea
       parent_view_class=ListSnapshot,
       url_keys=['pk'],
     )
+    # Filter the records of the snapshot in memory
+    params = self.request.GET.copy() or {}
+    form = forms.SnapshotRecordFilteringForm(data=params)
+    context['form'] = form
+    context['records'] = list(instance.get_each_record(condition=form.get_condition()))
 
     return context
 
@@ -379,7 +426,7 @@ class IsOwnSnapshotTask(UserPassesTestMixin):
 
     return is_valid
 
-class ListPeriodicTaskForSnapshot(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
+class ListPeriodicTaskForSnapshot(LoginRequiredMixin, CachedCountMixin, ListView, DjangoBreadcrumbsMixin):
   model = PeriodicTask
   template_name = 'stock/periodic_tasks_for_snapshot.html'
   paginate_by = 36
@@ -448,6 +495,14 @@ class ListStockScreener(LoginRequiredMixin, ListView, DjangoBreadcrumbsMixin):
 
     return queryset
 
+  def get_context_data(self, **kwargs):
+    context = super().get_context_data(**kwargs)
+    top_n = getattr(settings, 'SCREENER_LIST_TOP_N', 3)
+    # Count the matched stocks of the screeners in the current page at once (the evaluated queryset is annotated in place)
+    models.StockScreener.evaluate_screeners(context[self.context_object_name], top_n=top_n)
+
+    return context
+
 class RegisterStockScreener(CreateViewBasedOnUser, DjangoBreadcrumbsMixin):
   model = models.StockScreener
   form_class = forms.StockScreenerForm
@@ -489,13 +544,21 @@ class DetailScreenedStock(LoginRequiredMixin, IsStockScreenerOwner, DetailView,
   model = models.StockScreener
   context_object_name = 'screener'
   template_name = 'stock/screened_stocks.html'
+  paginate_by = 150
 
   def get_context_data(self, **kwargs):
     is_secure = getattr(settings, 'IS_SECURE_COOKIE', True)
     context = super().get_context_data(**kwargs)
     instance = context[self.context_object_name]
     initial = instance.get_initial_for_stock_download_form()
-    context['stocks'] = instance.get_screened_stocks()
+    # Fetch only the stocks of the current page by using LIMIT/OFFSET clause
+    paginator = Paginator(instance.get_screened_stocks(), self.paginate_by)
+    page_obj = paginator.get_page(self.request.GET.get('page'))
+    context['paginator'] = paginator
+    context['page_obj'] = page_obj
+    context['is_paginated'] = page_obj.has_other_pages()
+    context['stocks'] = page_obj.object_list
+    context['profiles'] = instance.profiles.all()[:getattr(settings, 'SCREENER_PROFILE_HISTORY', 30)]
     context['download_form'] = forms.StockDownloadForm(initial=initial)
     context['is_secure'] = 'Secure' if is_secure else ''
 
@@ -509,6 +572,18 @@ class DetailScreenedStock(LoginRequiredMixin, IsStockScreenerOwner, DetailView,
 
     return context
 
+class ProfileStockScreener(LoginRequiredMixin, IsStockScreenerOwner, View):
+  raise_exception = True
+  http_method_names = ['post']
+
+  def post(self, request, *args, **kwargs):
+    instance = models.StockScreener.objects.get(pk=self.kwargs['pk'])
+    instance.profile()
+    url = reverse('stock:detail_stock_screener', kwargs={'pk': instance.pk})
+    response = HttpResponseRedirect(url)
+
+    return response
+
 class ListStock(LoginRequiredMixin, FormView, ListView, DjangoBreadcrumbsMixin):
   http_method_names = ['get']
   model = models.Stock
@@ -530,12 +605,27 @@ class ListStock(LoginRequiredMixin, FormView, ListView, DjangoBreadcrumbsMixin):
 
     return queryset
 
+  def paginate_queryset(self, queryset, page_size):
+    # The screened stocks of the columnar engine are sliced in memory
+    if isinstance(queryset, models.ScreenedStockList):
+      return super().paginate_queryset(queryset, page_size)
+    # Use the cursor instead of the page number to avoid counting and skipping the rows of the previous pages
+    paginator = models.CursorPaginator(queryset, page_size)
+    page_obj = paginator.get_page(self.request.GET.get(self.page_kwarg))
+
+    return (paginator, page_obj, page_obj.object_list, page_obj.has_other_pages())
+
   def get_context_data(self, **kwargs):
     is_secure = getattr(settings, 'IS_SECURE_COOKIE', True)
     context = super().get_context_data(**kwargs)
     context['form'] = self.form
     context['download_form'] = forms.StockDownloadForm()
     context['is_secure'] = 'Secure' if is_secure else ''
+    # Show the query plan of the condition only for staff users
+    if self.request.user.is_staff and self.request.GET.get('explain') == '1' and self.form.is_valid():
+      condition = self.form.cleaned_data.get('condition', '')
+      ordering = self.form.cleaned_data.get('ordering') or [models.StockOrderingTypes.CODE_ASC]
+      context['profiles'] = [models.profile_condition(condition, ordering)]
 
     return context
 
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Lookup
 import csv
+import time
 
 empty_qs = get_user_model().objects.none()
 
@@ -17,4 +20,40 @@ def streaming_csv_file(rows, header=None):
   if header is not None:
     yield writer.writerow(header)
   for record in rows:
-    yield writer.writerow(record)
\ No newline at end of file
+    yield writer.writerow(record)
+
+def _get_version_key(label):
+  return f'data-version:{label}'
+
+def get_data_version(label):
+  key = _get_version_key(label)
+  version = cache.get(key)
+  # Initialize the version if it does not exist
+  if version is None:
+    cache.add(key, time.time_ns(), timeout=None)
+    version = cache.get(key)
+
+  return version
+
+def bump_data_version(label):
+  version = time.time_ns()
+  cache.set(_get_version_key(label), version, timeout=None)
+
+  return version
+
+def get_model_data_label(model):
+  return f'model:{model._meta.label_lower}'
+
+def bump_model_data_version(model):
+  return bump_data_version(get_model_data_label(model))
+
+class ILike(Lookup):
+  # Case-insensitive pattern matching which applies ILIKE to the expression as is to use its trigram index
+  lookup_name = 'ilike'
+  prepare_rhs = False
+
+  def as_sql(self, compiler, connection):
+    lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+    rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+
+    return f'{lhs_sql} ILIKE {rhs_sql}', [*lhs_params, *rhs_params]
@@ -1,9 +1,135 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import QuerySet, Q, F, ExpressionWrapper, BooleanField
+from django.http import JsonResponse
 from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy
-from django.views.generic import CreateView, UpdateView, DeleteView
+from django.views.generic import View, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from crumbles import CrumblesViewMixin, CrumbleDefinition
-from operator import attrgetter, methodcaller
+from operator import attrgetter, methodcaller, or_
+from functools import reduce
+from .models import get_data_version, get_model_data_label, ILike
+import hashlib
+import json
+
+class CachedCountPaginator(Paginator):
+  # Paginator which reuses the number of records until the relevant data is changed
+  def __init__(self, *args, data_labels=None, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.data_labels = list(data_labels or [])
+
+  def get_count_key(self):
+    queryset = self.object_list
+    sql, params = queryset.query.sql_with_params()
+    labels = [get_model_data_label(queryset.model)] + self.data_labels
+    versions = ','.join([f'{label}={get_data_version(label)}' for label in labels])
+    digest = hashlib.sha256(f'{sql}\n{params}\n{versions}'.encode('utf-8')).hexdigest()
+
+    return f'paginator-count:{digest}'
+
+  def estimate_count(self):
+    # Use the number of rows estimated by the query planner
+    plan = json.loads(self.object_list.explain(format='json'))
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+  def get_exact_count(self):
+    threshold = getattr(settings, 'PAGINATOR_ESTIMATE_THRESHOLD', 100000)
+    # Count the records exactly only if the result set is not too large
+    if threshold > 0:
+      count = self.estimate_count()
+
+      if count >= threshold:
+        return count
+
+    return self.object_list.count()
+
+  @cached_property
+  def count(self):
+    if not isinstance(self.object_list, QuerySet):
+      return super().count
+    key = self.get_count_key()
+    count = cache.get(key)
+
+    if count is None:
+      count = self.get_exact_count()
+      cache.set(key, count, timeout=getattr(settings, 'PAGINATOR_COUNT_CACHE_TIMEOUT', 5 * 60))
+
+    return count
+
+class CachedCountMixin:
+  paginator_class = CachedCountPaginator
+  # Labels of the data versions which the number of records depends on except the model of queryset
+  count_data_labels = []
+
+  def get_paginator(self, *args, **kwargs):
+    return super().get_paginator(*args, data_labels=self.count_data_labels, **kwargs)
+
+class RemoteSearchView(View):
+  # Return the records which match the search term for the remote search widget
+  http_method_names = ['get']
+  model = None
+  queryset = None
+  search_fields = []
+  ordering = []
+  value_field = 'pk'
+  paginate_by = 20
+  min_length = 1
+  search_kwarg = 'q'
+  page_kwarg = 'page'
+
+  def get_queryset(self):
+    if self.queryset is not None:
+      queryset = self.queryset.all()
+    else:
+      queryset = self.model._default_manager.all()
+
+    return queryset
+
+  def get_condition(self, pattern):
+    # Use ILIKE instead of UPPER(...) LIKE to search by the trigram indexes of the fields
+    return reduce(or_, [Q(ILike(F(name), pattern)) for name in self.search_fields])
+
+  def search(self, queryset, term):
+    term = connection.ops.prep_for_like_query(term)
+    # Show the records which start with the term before the ones which only contain the term
+    is_prefix = ExpressionWrapper(self.get_condition(f'{term}%'), output_field=BooleanField())
+    queryset = queryset.filter(self.get_condition(f'%{term}%')).alias(is_prefix=is_prefix)
+
+    return queryset.order_by('-is_prefix', *self.ordering, 'pk')
+
+  def get_page_number(self):
+    try:
+      page = max(int(self.request.GET.get(self.page_kwarg, 1)), 1)
+    except (TypeError, ValueError):
+      page = 1
+
+    return page
+
+  def get_label(self, instance):
+    return str(instance)
+
+  def get(self, request, *args, **kwargs):
+    term = request.GET.get(self.search_kwarg, '').strip()
+    page = self.get_page_number()
+
+    if len(term) < self.min_length:
+      records = []
+    else:
+      offset = (page - 1) * self.paginate_by
+      # Get an extra record to check whether the next page exists without counting the matched records
+      records = list(self.search(self.get_queryset(), term)[offset:offset + self.paginate_by + 1])
+    results = [
+      {'pk': getattr(instance, self.value_field), 'label': self.get_label(instance)}
+      for instance in records[:self.paginate_by]
+    ]
+    response = JsonResponse({'results': results, 'page': page, 'has_next': len(records) > self.paginate_by})
+
+    return response
 
 class IsOwner(UserPassesTestMixin):
   owner_name = 'user'
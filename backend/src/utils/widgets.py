@@ -1,4 +1,6 @@
 from django import forms
+from django.core.exceptions import ValidationError
+import copy
 
 class SelectWithDataAttr(forms.Select):
   data_attr_name = ''
@@ -54,6 +56,56 @@ class Datalist(forms.Select):
   def has_error(self, value):
     self._has_error = True
 
+class RemoteSearchDatalist(Datalist):
+  # The selected option is converted into its value by using the dataset
+  use_dataset_attr = True
+  search_url = ''
+  min_length = 1
+  delay = 300
+
+  def __init__(self, attrs=None):
+    if attrs is not None:
+      self.search_url = attrs.pop('search-url', self.search_url)
+      self.min_length = attrs.pop('min-length', self.min_length)
+      self.delay = attrs.pop('delay', self.delay)
+    super().__init__(attrs)
+
+  def get_selected_choices(self, value):
+    values = [val for val in value if val not in ['', None]]
+    queryset = getattr(self.choices, 'queryset', None)
+
+    if not values:
+      choices = []
+    elif queryset is None:
+      choices = [(key, label) for key, label in self.choices if str(key) in values]
+    else:
+      key = self.choices.field.to_field_name or 'pk'
+      # The invalid value does not match any records
+      try:
+        choices = [self.choices.choice(obj) for obj in queryset.filter(**{f'{key}__in': values})]
+      except (ValueError, TypeError, ValidationError):
+        choices = []
+
+    return choices
+
+  def optgroups(self, name, value, attrs=None):
+    # Render only the selected options because the other options are searched on demand
+    widget = copy.copy(self)
+    widget.choices = self.get_selected_choices(value)
+
+    return super(RemoteSearchDatalist, widget).optgroups(name, value, attrs)
+
+  def get_context(self, name, value, attrs):
+    context = super().get_context(name, value, attrs)
+    context['widget']['attrs'].update({
+      'autocomplete': 'off',
+      'data-search-url': str(self.search_url),
+      'data-min-length': self.min_length,
+      'data-delay': self.delay,
+    })
+
+    return context
+
 class DropdownWithInput(forms.Select):
   input_type = 'text'
   template_name = 'widgets/custom_dropdown.html'